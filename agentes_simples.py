@@ -9,22 +9,52 @@ PRINCIPIOS CLAVE:
 2. Solo agregar complejidad cuando sea necesario
 3. Medir el rendimiento antes de hacer más complejo
 4. Mantener transparencia en los pasos del agente
+
+Uso:
+    python agentes_simples.py                      # todos los ejemplos
+    python agentes_simples.py routing agente       # solo algunos
+
+Importar este módulo no hace ninguna llamada de red: el SDK de Gemini se
+importa y configura la primera vez que se necesita un modelo.
 """
 
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+import argparse
 import time
+from dataclasses import dataclass
+from typing import Literal
+
+from base_conocimiento import BaseConocimiento
+from bucle_agente import BucleAgente
+from cache_respuestas import CACHE
+from cascada import MODELO_RAPIDO, Cascada, Nivel, imprimir_cascadas, por_esquema, por_longitud
+from coalescencia import COALESCEDOR
+from compuertas import CompuertaPalabras
+from enrutador_local import EnrutadorLocal
+from evaluador_optimizador import EvaluadorOptimizador
+from evaluador_seguro import ExpresionNoPermitida, evaluar
+from flujo_dag import Detener, FlujoDAG, imprimir_etapas
+from historial import GestorHistorial, resumen_con_llm
+from limitador import LIMITADOR
+from llamadas import enviar_mensaje, generar, generar_stream
+from paralelizacion import ejecutar_en_paralelo, resumen_paralelo
+from plantillas_prompt import Plantilla
+from politica_llamadas import POLITICA, PlazoAgotado, plazo
+from registro_modelos import obtener_modelo
+from salida_estructurada import ErrorEsquema, SalidaEstructurada
+from trazas import TRAZADOR, imprimir_resumen, traza
 
 # ============================================
 # CONFIGURACIÓN INICIAL
 # ============================================
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Modelo base para uso general (se construye al primer uso, no al importar)
+MODELO = "models/gemini-flash-latest"
+
 
-# Modelo base para uso general
-model = genai.GenerativeModel("models/gemini-flash-latest")
+def titulo(texto):
+    print("=" * 60)
+    print(texto)
+    print("=" * 60 + "\n")
 
 
 # ============================================
@@ -38,28 +68,41 @@ def calculadora(operacion: str) -> dict:
     Herramienta simple que realiza operaciones matemáticas.
     El LLM decide cuándo y cómo usarla.
     """
-    resultado = eval(operacion)  # En producción usar ast.literal_eval o similar
-    return {"resultado": resultado}
+    # Nunca eval(): el texto lo escribe el modelo
+    try:
+        return {"resultado": evaluar(operacion)}
+    except (ExpresionNoPermitida, ArithmeticError) as e:
+        return {"error": str(e)}
 
 
-# Crear modelo con acceso a la herramienta
-model_con_tools = genai.GenerativeModel(
-    "models/gemini-flash-latest", tools=[calculadora]
-)
+# Los chats reenvían todo su historial en cada turno: por encima de 8000 tokens
+# los turnos antiguos se resumen (las llamadas a herramientas y sus respuestas
+# se mantienen juntas), y en una tarea larga del agente, sus pasos antiguos.
+# Es la plantilla: cada chat usa historial_chat.nueva_sesion() y las
+# estadísticas de todas las sesiones se suman aquí
+historial_chat = GestorHistorial(presupuesto=8000, resumir=resumen_con_llm())
 
-# El chat con enable_automatic_function_calling=True hace que Gemini
-# ejecute las funciones automáticamente cuando las necesite
-chat = model_con_tools.start_chat(enable_automatic_function_calling=True)
 
-pregunta = (
-    "Si tengo 15 manzanas y compro 8 paquetes de 12 manzanas cada uno, ¿cuántas tengo?"
-)
-response = chat.send_message(pregunta)
+def llm_aumentado(pregunta):
+    """Pregunta al modelo con acceso a la calculadora"""
+    # Crear modelo con acceso a la herramienta
+    model_con_tools = obtener_modelo(MODELO, tools=[calculadora])
+
+    # El chat con enable_automatic_function_calling=True hace que Gemini
+    # ejecute las funciones automáticamente cuando las necesite
+    chat = model_con_tools.start_chat(enable_automatic_function_calling=True)
+    enviar_mensaje(chat, pregunta, historial=historial_chat.nueva_sesion())
 
-# La respuesta final está en el historial después de ejecutar las funciones
-print(f"💡 Respuesta: {chat.history[-1].parts[0].text}\n")
+    # La respuesta final está en el historial después de ejecutar las funciones
+    respuesta = chat.history[-1].parts[0].text
+    print(f"💡 Respuesta: {respuesta}\n")
+    return respuesta
 
-time.sleep(2)  # Pausa por límites de API gratuita
+
+def ejemplo_llm_aumentado():
+    llm_aumentado(
+        "Si tengo 15 manzanas y compro 8 paquetes de 12 manzanas cada uno, ¿cuántas tengo?"
+    )
 
 
 # ============================================
@@ -67,34 +110,105 @@ time.sleep(2)  # Pausa por límites de API gratuita
 # ============================================
 # Concepto: Dividir tareas complejas en pasos secuenciales con validación
 
-print("=" * 60)
-print("PROMPT CHAINING: Generar contenido y traducirlo")
-print("=" * 60 + "\n")
-
-# PASO 1: Generar contenido en español
-print("📝 Paso 1: Generando contenido...")
-response_1 = model.generate_content(
-    "Escribe 3 párrafos cortos sobre la importancia de reciclar. Hazlo motivador."
-)
-contenido_espanol = response_1.text
-print(f"{contenido_espanol}\n")
 
-# Validación (gate): Verificar que el contenido es adecuado
-palabras = len(contenido_espanol.split())
-print(f"✓ Verificación: {palabras} palabras generadas")
+def encadenar_prompts(
+    prompt_inicial="Escribe 3 párrafos cortos sobre la importancia de reciclar. Hazlo motivador.",
+    max_palabras=None,
+):
+    """
+    Generar → Validar → Traducir. Devuelve (contenido, traducción o None).
+    La validación exige 50 palabras; con `max_palabras` también rechaza lo
+    que pase de ese tope (y corta el stream en cuanto lo supera).
+    """
+    model = obtener_modelo(MODELO)
+
+    # PASO 1: Generar contenido en español (en streaming)
+    # La compuerta se evalúa mientras llega el texto: si hay máximo y ya se
+    # pasó, el stream se corta sin esperar al final.
+    print("📝 Paso 1: Generando contenido...")
+    compuerta = CompuertaPalabras(minimo=50, maximo=max_palabras)
+    with traza("Paso 1: Generando contenido"):
+        flujo_1 = generar_stream(model, prompt_inicial)
+        for fragmento in flujo_1:
+            print(fragmento, end="", flush=True)
+            if compuerta.actualizar(flujo_1.texto) is False:
+                flujo_1.cerrar()
+                print("\n✂️ Stream interrumpido: la compuerta ya conoce el resultado")
+                break
+    contenido_espanol = flujo_1.texto
+    print(f"\n\n⏱️ Primer token: {flujo_1.ttft or 0:.2f}s | Total: {flujo_1.latencia_total:.2f}s")
+
+    # Validación (gate): Verificar que el contenido es adecuado
+    aprobado = compuerta.finalizar(contenido_espanol)
+    print(f"✓ Verificación: {compuerta.palabras} palabras generadas")
+
+    if not aprobado:
+        print(f"⚠️ {compuerta.motivo().capitalize()}, workflow interrumpido\n")
+        return contenido_espanol, None
 
-if palabras < 50:
-    print("⚠️ Contenido muy corto, workflow interrumpido\n")
-else:
     # PASO 2: Solo continuamos si la validación pasa
     print("\n🌍 Paso 2: Traduciendo al inglés...")
-    response_2 = model.generate_content(
-        f"Traduce al inglés manteniendo el tono motivador:\n\n{contenido_espanol}"
-    )
-    print(f"{response_2.text}\n")
+    with traza("Paso 2: Traduciendo"):
+        flujo_2 = generar_stream(
+            model,
+            f"Traduce al inglés manteniendo el tono motivador:\n\n{contenido_espanol}",
+        )
+        for fragmento in flujo_2:
+            print(fragmento, end="", flush=True)
+    print(f"\n\n⏱️ Primer token: {flujo_2.ttft or 0:.2f}s | Total: {flujo_2.latencia_total:.2f}s")
     print("✓ Workflow completado: Generar → Validar → Traducir\n")
+    return contenido_espanol, flujo_2.texto
+
+
+# Generar párrafos no necesita el modelo grande casi nunca: Flash-Lite primero,
+# Flash solo si el texto no llega al mínimo de la compuerta
+cascada_articulos = Cascada(
+    "generar",
+    [Nivel("flash-lite", MODELO_RAPIDO), Nivel("flash", MODELO)],
+    por_longitud(minimo=50),
+)
+
+
+def flujo_encadenado(concurrencia=4, max_palabras=None):
+    """
+    La misma cadena como grafo: muchos temas en tubería (generar del i+1
+    mientras se traduce el i). `max_palabras` como en encadenar_prompts.
+    """
+    model = obtener_modelo(MODELO)
+    flujo = FlujoDAG(max_en_vuelo=4 * concurrencia)
+
+    @flujo.nodo("generar", concurrencia=concurrencia)
+    def _generar(prompt):
+        return cascada_articulos.ejecutar(prompt).texto
+
+    @flujo.nodo("validar", depende_de=["generar"])
+    def _validar(texto):
+        compuerta = CompuertaPalabras(minimo=50, maximo=max_palabras)
+        if not compuerta.finalizar(texto):
+            raise Detener(compuerta.motivo())
+        return texto
+
+    @flujo.nodo("traducir", depende_de=["validar"], concurrencia=concurrencia)
+    def _traducir(texto):
+        return generar(model, f"Traduce al inglés manteniendo el tono motivador:\n\n{texto}").text
+
+    return flujo
 
-time.sleep(2)
+
+def ejemplo_prompt_chaining():
+    titulo("PROMPT CHAINING: Generar contenido y traducirlo")
+    encadenar_prompts()
+
+    # Con muchas entradas, la cadena se declara una vez y los temas fluyen en tubería
+    temas = ["reciclar", "ahorrar agua", "usar transporte público", "compostar"]
+    flujo = flujo_encadenado()
+    inicio = time.perf_counter()
+    for r in flujo.procesar(f"Escribe 3 párrafos cortos sobre la importancia de {t}. Hazlo motivador." for t in temas):
+        estado = "✅ traducido" if r.ok else f"⚠️ detenido en {r.detenido_en or 'error'}: {r.motivo}"
+        print(f"  • {temas[r.indice]}: {estado} ({r.latencia:.2f}s)")
+    print(f"⏱️ {len(temas)} temas en {time.perf_counter() - inicio:.2f}s con el DAG")
+    imprimir_etapas(flujo)
+    print()
 
 
 # ============================================
@@ -102,63 +216,110 @@ time.sleep(2)
 # ============================================
 # Concepto: Clasificar la entrada y dirigirla al prompt especializado correcto
 
-print("=" * 60)
-print("ROUTING: Clasificación y respuesta especializada")
-print("=" * 60 + "\n")
+# Ruta rápida local: reglas + modelo TF-IDF; el LLM solo si no hay confianza
+enrutador = EnrutadorLocal(umbral=0.75)
 
+PROMPTS_ESPECIALISTAS = {
+    "TECNICO": "Experto en soporte técnico. Da soluciones paso a paso y técnicas.",
+    "FACTURACION": "Asistente de facturación. Sé empático y explica claramente.",
+    "GENERAL": "Asistente amigable. Responde de forma concisa y útil.",
+}
 
-def procesar_consulta_soporte(consulta):
-    """Clasifica la consulta y la envía al especialista correcto"""
 
-    print(f"📩 Consulta: '{consulta}'\n")
+@dataclass
+class Clasificacion:
+    categoria: Literal["TECNICO", "FACTURACION", "GENERAL"]
 
-    # PASO 1: Clasificar automáticamente
-    response = model.generate_content(
-        f"""Clasifica esta consulta en UNA categoría:
-        - TECNICO (errores, bugs, problemas técnicos)
-        - FACTURACION (pagos, facturas, cargos)
-        - GENERAL (información general)
 
-        Consulta: {consulta}
+# JSON con esquema: la categoría llega validada (o reparada en local)
+salida_clasificacion = SalidaEstructurada(Clasificacion)
 
-        Responde SOLO la categoría en mayúsculas."""
-    )
+# Las instrucciones son siempre las mismas: prefijo registrado una vez, solo cambia la consulta
+plantilla_clasificacion = Plantilla(
+    """Clasifica esta consulta en UNA categoría:
+- TECNICO (errores, bugs, problemas técnicos)
+- FACTURACION (pagos, facturas, cargos)
+- GENERAL (información general)""",
+    "Consulta: {consulta}",
+    modelo=MODELO,
+)
 
-    categoria = response.text.strip()
-    print(f"🔍 Categoría: {categoria}\n")
 
-    # PASO 2: Crear modelo con prompt especializado según categoría
-    prompts = {
-        "TECNICO": "Experto en soporte técnico. Da soluciones paso a paso y técnicas.",
-        "FACTURACION": "Asistente de facturación. Sé empático y explica claramente.",
-        "GENERAL": "Asistente amigable. Responde de forma concisa y útil.",
-    }
+# Una etiqueta de una palabra: Flash-Lite primero; Flash solo si no responde con el JSON pedido
+plantilla_clasificacion_rapida = Plantilla(
+    plantilla_clasificacion.prefijo, plantilla_clasificacion.sufijo, modelo=MODELO_RAPIDO
+)
+cascada_clasificacion = Cascada(
+    "clasificar",
+    [
+        Nivel("flash-lite", MODELO_RAPIDO, funcion=lambda p, **kw: generar(plantilla_clasificacion_rapida.modelo(), p, **kw)),
+        Nivel("flash", MODELO, funcion=lambda p, **kw: generar(plantilla_clasificacion.modelo(), p, **kw)),
+    ],
+    por_esquema(Clasificacion, estricto=True),
+)
+
 
-    instruccion = prompts.get(categoria, prompts["GENERAL"])
-    model_especializado = genai.GenerativeModel(
-        "models/gemini-flash-latest", system_instruction=instruccion
+def clasificar_con_llm(consulta):
+    """Clasificación con Gemini, usada solo cuando el enrutador local duda"""
+    resultado = cascada_clasificacion.ejecutar(
+        plantilla_clasificacion.rellenar(consulta=consulta),
+        generation_config=salida_clasificacion.configuracion(),
     )
+    try:
+        clasificacion = salida_clasificacion.interpretar(resultado.texto or "")
+    except ErrorEsquema as e:
+        # Queda contado en salida_clasificacion.estadisticas()["fallidas"]
+        print(f"⚠️ Clasificación no válida ({e}); se usa GENERAL")
+        return "GENERAL"
+    return clasificacion.categoria
 
-    # PASO 3: Generar respuesta especializada
-    response = model_especializado.generate_content(consulta)
 
-    return categoria, response.text
+def procesar_consulta_soporte(consulta):
+    """Clasifica la consulta y la envía al especialista correcto"""
 
+    print(f"📩 Consulta: '{consulta}'\n")
 
-# Probar con diferentes tipos de consultas
-consultas_ejemplo = [
-    "Mi app se cierra al subir fotos",
-    "¿Por qué me cobraron dos veces?",
-    "¿Cuál es el horario de atención?",
-]
+    # PASO 1: Clasificar (local si es posible, con el LLM si no)
+    with traza("Paso 1: Clasificando") as span:
+        categoria, origen = enrutador.clasificar(consulta, clasificar_con_llm)
+        span.fijar(categoria=categoria, origen=origen)
+    print(f"🔍 Categoría: {categoria} (vía {origen})\n")
+
+    # PASO 2: Elegir el modelo con prompt especializado según categoría
+    instruccion = PROMPTS_ESPECIALISTAS.get(categoria, PROMPTS_ESPECIALISTAS["GENERAL"])
+    # Solo hay tres instrucciones posibles: el registro crea cada modelo una vez
+    model_especializado = obtener_modelo(MODELO, system_instruction=instruccion)
 
-for consulta in consultas_ejemplo:
-    print("-" * 60)
-    categoria, respuesta = procesar_consulta_soporte(consulta)
-    print(f"💬 Respuesta ({categoria}):\n{respuesta}\n")
-    time.sleep(2)
+    # PASO 3: Generar respuesta especializada
+    with traza("Paso 2: Respuesta especializada", categoria=categoria):
+        response = generar(model_especializado, consulta)
+
+    return categoria, response.text
 
-time.sleep(2)
+
+def ejemplo_routing():
+    titulo("ROUTING: Clasificación y respuesta especializada")
+
+    # Probar con diferentes tipos de consultas
+    # (para miles de tickets, clasificacion_lote.clasificar_lote empaqueta
+    #  muchas consultas en una sola llamada en lugar de una por ticket)
+    consultas_ejemplo = [
+        "Mi app se cierra al subir fotos",
+        "¿Por qué me cobraron dos veces?",
+        "¿Cuál es el horario de atención?",
+    ]
+
+    for consulta in consultas_ejemplo:
+        print("-" * 60)
+        categoria, respuesta = procesar_consulta_soporte(consulta)
+        print(f"💬 Respuesta ({categoria}):\n{respuesta}\n")
+
+    stats = enrutador.estadisticas()
+    print(
+        f"⚡ Ruta rápida: {stats['tasa_ruta_rapida']:.0%} de las consultas sin LLM "
+        f"({stats['reglas']} por reglas, {stats['modelo_local']} por modelo local, "
+        f"{stats['llm']} con LLM); ahorro estimado {stats['tiempo_ahorrado_estimado']:.1f}s\n"
+    )
 
 
 # ============================================
@@ -166,11 +327,7 @@ time.sleep(2)
 # ============================================
 # Concepto: Obtener múltiples perspectivas en paralelo para mayor confianza
 
-print("=" * 60)
-print("PARALLELIZATION: Múltiples perspectivas")
-print("=" * 60 + "\n")
-
-codigo_ejemplo = """
+CODIGO_EJEMPLO = """
 def procesar_datos(datos):
     resultado = []
     for item in datos:
@@ -179,23 +336,57 @@ def procesar_datos(datos):
     return resultado
 """
 
-print(f"Código a revisar:\n{codigo_ejemplo}\n")
-
-# Crear revisiones desde 3 perspectivas diferentes
-perspectivas = [
+# Revisiones desde 3 perspectivas diferentes
+PERSPECTIVAS = [
     ("🔒 Seguridad", "Busca SOLO vulnerabilidades de seguridad. Sé breve."),
     ("⚡ Performance", "Busca SOLO problemas de rendimiento. Sé breve."),
     ("📖 Legibilidad", "Evalúa SOLO legibilidad y mantenibilidad. Sé breve."),
 ]
 
-for nombre, enfoque in perspectivas:
-    print(f"{nombre}:")
-    response = model.generate_content(f"{enfoque}\n\nCódigo:\n{codigo_ejemplo}")
-    print(f"{response.text}\n")
-    time.sleep(2)
 
-print("✓ Revisión completa desde múltiples ángulos\n")
-time.sleep(2)
+# Una plantilla por perspectiva: el enfoque es el prefijo estable, el código el sufijo
+_plantillas_revision = {}
+
+
+def plantilla_revision(enfoque):
+    if enfoque not in _plantillas_revision:
+        _plantillas_revision[enfoque] = Plantilla(enfoque, "Código:\n{codigo}", modelo=MODELO)
+    return _plantillas_revision[enfoque]
+
+
+def revisar_codigo(codigo, perspectivas=PERSPECTIVAS):
+    """Revisa el código desde todas las perspectivas a la vez"""
+    plantillas = [(nombre, plantilla_revision(enfoque)) for nombre, enfoque in perspectivas]
+
+    # Cada perspectiva es una rama independiente: se envían todas a la vez
+    ramas = [
+        (nombre, lambda plantilla=plantilla: plantilla.generar(codigo=codigo).text)
+        for nombre, plantilla in plantillas
+    ]
+
+    inicio = time.perf_counter()
+    resultados = ejecutar_en_paralelo(ramas, timeout=60)
+    tiempo_total = time.perf_counter() - inicio
+
+    # Los resultados llegan en el mismo orden que las perspectivas
+    for resultado in resultados:
+        print(f"{resultado.nombre} ({resultado.latencia:.1f}s):")
+        if resultado.ok:
+            print(f"{resultado.valor}\n")
+        elif resultado.agotado:
+            print("⏱️ Sin respuesta a tiempo, se continúa con las demás\n")
+        else:
+            print(f"❌ Error: {resultado.error}\n")
+
+    print(resumen_paralelo(resultados, tiempo_total))
+    print("✓ Revisión completa desde múltiples ángulos\n")
+    return resultados
+
+
+def ejemplo_paralelizacion():
+    titulo("PARALLELIZATION: Múltiples perspectivas")
+    print(f"Código a revisar:\n{CODIGO_EJEMPLO}\n")
+    revisar_codigo(CODIGO_EJEMPLO)
 
 
 # ============================================
@@ -203,50 +394,37 @@ time.sleep(2)
 # ============================================
 # Concepto: Un LLM genera, otro evalúa, y el primero mejora basado en feedback
 
-print("=" * 60)
-print("EVALUATOR-OPTIMIZER: Generación iterativa mejorada")
-print("=" * 60 + "\n")
-
-tema = "el impacto de las redes sociales en los jóvenes"
 
-# PASO 1: Generar versión inicial
-print(f"📝 Generando título sobre '{tema}'...")
-response = model.generate_content(
-    f"Crea un título atractivo para un artículo sobre {tema}. Solo el título."
+# Generar → Evaluar → Mejorar hasta puntaje ≥ 8, con dos candidatos por ronda
+# y parada temprana por meseta o presupuesto
+optimizador = EvaluadorOptimizador(
+    umbral=8, max_rondas=4, paciencia=2, candidatos=2, max_tokens=20000, max_tiempo=120
 )
-titulo_v1 = response.text.strip()
-print(f"\n✏️ Título v1: {titulo_v1}\n")
 
-# PASO 2: Evaluar la primera versión
-print("🔍 Evaluando título...")
-response = model.generate_content(
-    f"""Evalúa este título de 1-10 considerando:
-    - Claridad
-    - Atractivo
-    - Relevancia
 
-    Título: {titulo_v1}
-
-    Formato: Puntuación (1-10) y una sugerencia breve de mejora."""
-)
-evaluacion = response.text
-print(f"{evaluacion}\n")
+def evaluar_y_optimizar(tema):
+    """Itera hasta que el evaluador dé ≥ 8. Devuelve el ResultadoOptimizacion"""
+    print(f"📝 Generando títulos sobre '{tema}'...\n")
+    resultado = optimizador.optimizar(
+        f"Crea un título atractivo para un artículo sobre {tema}. Solo el título."
+    )
 
-# PASO 3: Optimizar basado en la evaluación
-print("✨ Optimizando título...")
-response = model.generate_content(
-    f"""Mejora este título basándote en la evaluación:
+    # La nota sale del JSON del evaluador, sin una llamada extra para leerla
+    for candidato in resultado.historial:
+        print(f"  Ronda {candidato.ronda}: {candidato.puntuacion:.0f}/10  {candidato.texto}")
 
-    Título original: {titulo_v1}
-    Evaluación: {evaluacion}
+    print(f"\n✅ Mejor título: {resultado.mejor.texto} ({resultado.mejor.puntuacion:.0f}/10)")
+    print(
+        f"⏹️ Parada por {resultado.motivo} tras {resultado.rondas} ronda(s): "
+        f"{resultado.llamadas} llamadas, {resultado.tokens} tokens, {resultado.tiempo:.1f}s"
+    )
+    print("✓ Ciclo completo: Generar → Evaluar → Optimizar\n")
+    return resultado
 
-    Dame solo el título mejorado, nada más."""
-)
-titulo_v2 = response.text.strip()
-print(f"\n✅ Título v2: {titulo_v2}\n")
-print("✓ Ciclo completo: Generar → Evaluar → Optimizar\n")
 
-time.sleep(2)
+def ejemplo_evaluador_optimizador():
+    titulo("EVALUATOR-OPTIMIZER: Generación iterativa mejorada")
+    evaluar_y_optimizar("el impacto de las redes sociales en los jóvenes")
 
 
 # ============================================
@@ -254,25 +432,23 @@ time.sleep(2)
 # ============================================
 # Concepto: El agente decide qué herramientas usar y en qué orden
 
-print("=" * 60)
-print("AGENTE AUTÓNOMO: Decisiones independientes")
-print("=" * 60 + "\n")
+# Base de conocimientos indexada (se carga en la primera búsqueda)
+base_conocimiento = BaseConocimiento()
 
 
 # Definir herramientas que el agente puede usar
 def buscar_informacion(tema: str) -> dict:
-    """Simula búsqueda en base de conocimientos"""
-    datos = {
-        "velocidad luz": "299,792 km/s en el vacío",
-        "temperatura sol": "5,500°C en la superficie",
-        "distancia tierra luna": "384,400 km promedio",
-    }
-    return {"informacion": datos.get(tema.lower(), "No disponible")}
+    """Busca en la base de conocimientos (tolera variaciones del tema)"""
+    informacion = base_conocimiento.consultar(tema)
+    return {"informacion": informacion or "No disponible"}
 
 
 def calcular(expresion: str) -> dict:
     """Realiza cálculos matemáticos"""
-    return {"resultado": eval(expresion)}
+    try:
+        return {"resultado": evaluar(expresion)}
+    except (ExpresionNoPermitida, ArithmeticError) as e:
+        return {"error": str(e)}
 
 
 def convertir_unidades(valor: float, de: str, a: str) -> dict:
@@ -291,10 +467,18 @@ def convertir_unidades(valor: float, de: str, a: str) -> dict:
     )
 
 
-# Crear agente con todas las herramientas
-model_agente = genai.GenerativeModel(
-    "models/gemini-flash-latest",
-    tools=[buscar_informacion, calcular, convertir_unidades],
+HERRAMIENTAS_AGENTE = [buscar_informacion, calcular, convertir_unidades]
+
+
+# Bucle propio: las herramientas pedidas en un mismo turno se ejecutan a la vez
+# y las tres son puras, así que se memorizan por argumentos
+agente = BucleAgente(
+    HERRAMIENTAS_AGENTE,
+    puras=[h.__name__ for h in HERRAMIENTAS_AGENTE],
+    modelo=MODELO,
+    max_pasos=8,
+    max_tiempo=60,
+    historial=historial_chat,
 )
 
 
@@ -304,50 +488,95 @@ def ejecutar_agente(tarea):
     Este es el patrón más flexible pero también el más impredecible.
     """
     print(f"🤖 Tarea asignada: {tarea}\n")
-
-    chat = model_agente.start_chat(enable_automatic_function_calling=True)
-    response = chat.send_message(tarea)
+    resultado = agente.ejecutar(tarea)
 
     # Mostrar qué herramientas decidió usar el agente
     print("🔧 Herramientas usadas por el agente:")
-    for mensaje in chat.history[-10:]:
-        for part in mensaje.parts:
-            if hasattr(part, "function_call"):
-                nombre = part.function_call.name
-                params = (
-                    dict(part.function_call.args) if part.function_call.args else {}
-                )
-                print(f"  • {nombre}{params}")
-            if hasattr(part, "function_response"):
-                resultado = dict(part.function_response.response)
-                print(f"    → {resultado}")
-
-    print(f"\n✅ Resultado final:\n{chat.history[-1].parts[0].text}\n")
-    return response
-
-
-# Tarea compleja que requiere múltiples pasos
-tarea = """
-¿Cuántas millas recorre la luz en un segundo?
-
-Necesitas:
-1. Buscar la velocidad de la luz
-2. Convertir de kilómetros a millas
-"""
+    for llamada in resultado.llamadas:
+        origen = "caché" if llamada.desde_cache else f"{llamada.latencia * 1e3:.0f} ms"
+        print(f"  • [paso {llamada.paso}] {llamada.nombre}{llamada.args} ({origen})")
+        print(f"    → {llamada.resultado}")
+
+    if resultado.texto is None:
+        print(f"\n⚠️ Presupuesto agotado ({resultado.motivo}) tras {resultado.pasos} pasos\n")
+    else:
+        print(f"\n✅ Resultado final ({resultado.pasos} pasos, {resultado.tiempo:.1f}s):\n{resultado.texto}\n")
+    return resultado
 
-ejecutar_agente(tarea)
+
+def ejemplo_agente_autonomo():
+    titulo("AGENTE AUTÓNOMO: Decisiones independientes")
+
+    # Tarea compleja que requiere múltiples pasos
+    tarea = """
+    ¿Cuántas millas recorre la luz en un segundo?
+
+    Necesitas:
+    1. Buscar la velocidad de la luz
+    2. Convertir de kilómetros a millas
+    """
+
+    ejecutar_agente(tarea)
+
+
+def mostrar_estadisticas():
+    # El limitador compartido sustituye a las pausas fijas entre llamadas
+    stats = LIMITADOR.estadisticas()
+    print(
+        f"🚦 Limitador: {stats['solicitudes']} solicitudes, "
+        f"{stats['tiempo_limitado']:.1f}s esperando cupo, "
+        f"{stats['reintentos']} reintentos por cuota, "
+        f"cola máxima {stats['max_en_cola']}\n"
+    )
+    if CACHE is not None:
+        stats = CACHE.estadisticas()
+        print(
+            f"🗄️ Caché: {stats['aciertos_memoria'] + stats['aciertos_disco']} aciertos, "
+            f"{stats['fallos']} fallos ({stats['tasa_aciertos']:.0%} sin tocar la red)\n"
+        )
+    if COALESCEDOR is not None and COALESCEDOR.estadisticas()["compartidas"]:
+        stats = COALESCEDOR.estadisticas()
+        print(
+            f"🤝 Coalescencia: {stats['compartidas']} llamadas idénticas en vuelo compartidas "
+            f"({stats['tasa_ahorro']:.0%} ahorradas), {stats['errores_compartidos']} errores compartidos\n"
+        )
+    stats = optimizador.estadisticas()
+    if stats["tareas"]:
+        print(
+            f"🎯 Evaluador-optimizador: {stats['aceptadas']}/{stats['tareas']} aceptados, "
+            f"{stats['llamadas_por_aceptado'] or 0:.1f} llamadas por resultado aceptado\n"
+        )
+    stats = POLITICA.estadisticas()
+    if stats["duplicados"] or stats["plazos_agotados"]:
+        print(
+            f"🪂 Cobertura: {stats['duplicados']} duplicados ({stats['tasa_duplicados']:.0%}), "
+            f"{stats['ganados_por_duplicado']} ganaron; {stats['plazos_agotados']} plazos agotados\n"
+        )
+    cascadas = [cascada_articulos, cascada_clasificacion]
+    if any(c.estadisticas()["llamadas"] for c in cascadas):
+        print("🪜 Cascadas de modelos (el barato primero):")
+        imprimir_cascadas(cascadas)
+        print()
+    reparadas = [salida_clasificacion.estadisticas(), optimizador.salida.estadisticas()]
+    if any(stats["respuestas"] for stats in reparadas):
+        print(
+            f"🧩 Salida estructurada: {sum(s['respuestas'] for s in reparadas)} respuestas JSON, "
+            f"{sum(s['reasks_evitados'] for s in reparadas)} reparadas en local (re-asks evitados), "
+            f"{sum(s['reintentos'] for s in reparadas)} reintentos\n"
+        )
+    imprimir_resumen()
 
 
 # ============================================
 # RESUMEN COMPARATIVO
 # ============================================
 
-print("=" * 60)
-print("CUÁNDO USAR CADA PATRÓN")
-print("=" * 60 + "\n")
 
-print(
-    """
+def mostrar_resumen():
+    titulo("CUÁNDO USAR CADA PATRÓN")
+
+    print(
+        """
 📊 WORKFLOWS (Predefinidos):
    ✓ Cuándo: Los pasos son conocidos y fijos
    ✓ Ventaja: Predecible, fácil de debugear, transparente
@@ -365,15 +594,17 @@ print(
 
    La mayoría de problemas se resuelven mejor con workflows simples.
 """
-)
+    )
 
 
 # ============================================
 # EJERCICIOS PROPUESTOS
 # ============================================
 
-print(
-    """
+
+def mostrar_ejercicios():
+    print(
+        """
 EJERCICIOS PARA PRACTICAR:
 ==========================
 
@@ -414,4 +645,64 @@ No olvides crear .env con: GEMINI_API_KEY=tu_clave_aqui
 
 Obtén tu clave en: https://aistudio.google.com/app/apikey
 """
-)
+    )
+
+
+# ============================================
+# PUNTO DE ENTRADA
+# ============================================
+
+EJEMPLOS = {
+    "aumentado": ejemplo_llm_aumentado,
+    "chaining": ejemplo_prompt_chaining,
+    "routing": ejemplo_routing,
+    "paralelizacion": ejemplo_paralelizacion,
+    "evaluador": ejemplo_evaluador_optimizador,
+    "agente": ejemplo_agente_autonomo,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Patrones de agentes con Gemini")
+    parser.add_argument(
+        "ejemplos",
+        nargs="*",
+        metavar="EJEMPLO",
+        help=f"ejemplos a ejecutar (por defecto, todos): {', '.join(EJEMPLOS)}",
+    )
+    parser.add_argument(
+        "--plazo",
+        type=float,
+        default=300,
+        help="segundos máximos por ejemplo; todos sus pasos comparten ese plazo (300)",
+    )
+    parser.add_argument(
+        "--cobertura",
+        action="store_true",
+        help="duplicar las llamadas más lentas que el p95 (máx. 10%% de duplicados)",
+    )
+    args = parser.parse_args(argv)
+    if args.cobertura:
+        POLITICA.configurar(cobertura=True)
+
+    desconocidos = [e for e in args.ejemplos if e not in EJEMPLOS]
+    if desconocidos:
+        parser.error(f"ejemplos desconocidos: {', '.join(desconocidos)}")
+
+    for nombre in args.ejemplos or EJEMPLOS:
+        # Un span raíz por ejemplo: sus pasos y llamadas cuelgan de él
+        with traza(f"Ejemplo: {nombre}"), plazo(args.plazo):
+            try:
+                EJEMPLOS[nombre]()
+            except PlazoAgotado as e:
+                print(f"⏱️ {nombre}: {e} ({args.plazo:.0f}s), se pasa al siguiente ejemplo\n")
+
+    mostrar_estadisticas()
+    TRAZADOR.volcar()
+    if not args.ejemplos:
+        mostrar_resumen()
+        mostrar_ejercicios()
+
+
+if __name__ == "__main__":
+    main()
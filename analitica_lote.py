@@ -0,0 +1,276 @@
+"""
+ANALÍTICA POR LOTES (respuestas y lecturas de sensores)
+
+Las cuentas del EJEMPLO 3 (líneas, caracteres, ¿menciona 'plástico'?) y el
+promedio del EJEMPLO 5, pero sobre millones de registros:
+
+- metricas_respuestas: líneas y caracteres de muchas respuestas a la vez,
+  contando sobre un único buffer de bytes con NumPy.
+- matriz_palabras_clave: matriz (respuestas × términos) de apariciones, con
+  cada respuesta normalizada una sola vez para todos los términos.
+- medias_moviles / ventanas_sobre_umbral: medias por ventana con sumas
+  acumuladas y detección de cruces de umbral, de modo que el paso del LLM
+  solo se ejecuta para las ventanas que cruzan.
+- Lectura por bloques desde disco (JSONL, .npy con mmap o texto), sin cargar
+  todo en memoria.
+
+Requiere numpy (pip install numpy).
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+
+from normalizacion import normalizar
+
+# ============================================
+# RESPUESTAS: líneas, caracteres y palabras clave
+# ============================================
+
+
+def metricas_respuestas(textos: Sequence[str]) -> dict[str, np.ndarray]:
+    """
+    Líneas y caracteres de cada respuesta (igual que len(t.split('\\n')) y len(t)).
+
+    Todas las respuestas se codifican en un solo buffer UTF-8 y se cuentan
+    saltos de línea y caracteres (bytes que no son de continuación) por tramo.
+    """
+    n = len(textos)
+    if n == 0:
+        return {"lineas": np.zeros(0, np.int64), "caracteres": np.zeros(0, np.int64)}
+    codificados = [t.encode("utf-8") for t in textos]
+    longitudes = np.fromiter(map(len, codificados), np.int64, n)
+    buffer = np.frombuffer(b"".join(codificados), np.uint8)
+    inicios = np.concatenate(([0], np.cumsum(longitudes)[:-1]))
+
+    def _por_tramo(mascara: np.ndarray) -> np.ndarray:
+        # Suma acumulada evaluada en los bordes: vale también para tramos vacíos
+        acumulado = np.concatenate(([0], np.cumsum(mascara, dtype=np.int64)))
+        return acumulado[inicios + longitudes] - acumulado[inicios]
+
+    return {
+        "lineas": _por_tramo(buffer == 0x0A) + 1,
+        "caracteres": _por_tramo((buffer & 0xC0) != 0x80),
+    }
+
+
+class BuscadorTerminos:
+    """
+    Busca muchos términos a la vez (subcadena, sin mayúsculas).
+
+    Cada texto se normaliza una sola vez (no una vez por término, como en
+    `termino in texto.lower()`) y los términos repetidos se buscan una vez.
+    """
+
+    def __init__(self, terminos: Sequence[str], sin_acentos: bool = False):
+        self.terminos = list(terminos)
+        self.sin_acentos = sin_acentos
+        claves = [self._normalizar(t) for t in self.terminos]
+        self._unicos = list(dict.fromkeys(claves))
+        # Columna de la matriz final -> columna entre los términos únicos
+        self._columna = np.array([self._unicos.index(c) for c in claves], dtype=np.int64)
+
+    def _normalizar(self, texto: str) -> str:
+        return normalizar(texto) if self.sin_acentos else texto.lower()
+
+    def matriz(self, textos: Iterable[str]) -> np.ndarray:
+        normalizados = [self._normalizar(t) for t in textos]
+        n = len(normalizados)
+        unicos = np.empty((n, len(self._unicos)), dtype=bool)
+        for j, termino in enumerate(self._unicos):
+            unicos[:, j] = np.fromiter((termino in t for t in normalizados), bool, n)
+        return unicos[:, self._columna]
+
+
+def matriz_palabras_clave(textos: Iterable[str], terminos: Sequence[str], sin_acentos: bool = False) -> np.ndarray:
+    """bool[n_textos, n_terminos]: ¿el texto menciona el término?"""
+    return BuscadorTerminos(terminos, sin_acentos).matriz(textos)
+
+
+# ============================================
+# LECTURA POR BLOQUES DESDE DISCO
+# ============================================
+
+
+def bloques_respuestas(ruta: str, campo: str = "texto", tamano_bloque: int = 50_000) -> Iterator[list[str]]:
+    """Respuestas de un JSONL (una por línea, en `campo`), en bloques"""
+    bloque: list[str] = []
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            bloque.append(json.loads(linea).get(campo, ""))
+            if len(bloque) >= tamano_bloque:
+                yield bloque
+                bloque = []
+    if bloque:
+        yield bloque
+
+
+def bloques_lecturas(ruta: str, tamano_bloque: int = 1_000_000) -> Iterator[np.ndarray]:
+    """Lecturas numéricas de un .npy (con mmap) o de un texto con un valor por línea"""
+    if ruta.endswith(".npy"):
+        datos = np.load(ruta, mmap_mode="r")
+        for inicio in range(0, len(datos), tamano_bloque):
+            yield np.asarray(datos[inicio : inicio + tamano_bloque], dtype=np.float64)
+        return
+    with open(ruta, encoding="utf-8") as archivo:
+        while True:
+            lineas = [l for _, l in zip(range(tamano_bloque), archivo)]
+            if not lineas:
+                return
+            yield np.array([float(l) for l in lineas if l.strip()], dtype=np.float64)
+
+
+@dataclass
+class ResumenRespuestas:
+    terminos: list[str]
+    respuestas: int = 0
+    lineas: int = 0
+    caracteres: int = 0
+    max_caracteres: int = 0
+    apariciones: np.ndarray = field(default=None)  # respuestas que mencionan cada término
+    coapariciones: np.ndarray = field(default=None)  # término × término
+
+    @property
+    def media_caracteres(self) -> float:
+        return self.caracteres / self.respuestas if self.respuestas else 0.0
+
+
+def analizar_respuestas(
+    bloques: Iterable[Sequence[str]], terminos: Sequence[str], sin_acentos: bool = False
+) -> ResumenRespuestas:
+    """Agrega métricas y apariciones sobre un flujo de bloques (memoria acotada al bloque)"""
+    buscador = BuscadorTerminos(terminos, sin_acentos)
+    k = len(buscador.terminos)
+    resumen = ResumenRespuestas(list(terminos), apariciones=np.zeros(k, np.int64), coapariciones=np.zeros((k, k), np.int64))
+    for bloque in bloques:
+        metricas = metricas_respuestas(bloque)
+        matriz = buscador.matriz(bloque).astype(np.int64)
+        resumen.respuestas += len(bloque)
+        resumen.lineas += int(metricas["lineas"].sum())
+        resumen.caracteres += int(metricas["caracteres"].sum())
+        resumen.max_caracteres = max(resumen.max_caracteres, int(metricas["caracteres"].max(initial=0)))
+        resumen.apariciones += matriz.sum(axis=0)
+        resumen.coapariciones += matriz.T @ matriz
+    return resumen
+
+
+# ============================================
+# LECTURAS: medias móviles y umbrales
+# ============================================
+
+
+def medias_moviles(lecturas: np.ndarray, ventana: int, paso: int = 1) -> np.ndarray:
+    """Media de cada ventana de `ventana` lecturas, cada `paso` lecturas (sumas acumuladas)"""
+    lecturas = np.asarray(lecturas, dtype=np.float64)
+    if len(lecturas) < ventana:
+        return np.zeros(0)
+    acumulado = np.concatenate(([0.0], np.cumsum(lecturas)))
+    return (acumulado[ventana:] - acumulado[:-ventana])[::paso] / ventana
+
+
+@dataclass
+class Cruce:
+    inicio: int  # índice de la primera lectura de la ventana
+    media: float
+
+
+def ventanas_sobre_umbral(
+    bloques: Iterable[np.ndarray], ventana: int, umbral: float, paso: Optional[int] = None
+) -> Iterator[Cruce]:
+    """
+    Recorre lecturas por bloques y emite solo las ventanas en las que la media
+    CRUZA el umbral hacia arriba (no todas las que están por encima), así cada
+    episodio de calor dispara un único paso posterior.
+
+    Por defecto las ventanas no se solapan (paso = ventana, como "la semana").
+    """
+    paso = paso or ventana
+    arrastre = np.zeros(0)  # cola del bloque anterior que aún no forma ventana completa
+    desplazamiento = 0  # índice global de arrastre[0]
+    sobre_antes = False
+    for bloque in bloques:
+        datos = np.concatenate((arrastre, bloque))
+        medias = medias_moviles(datos, ventana, paso)
+        if len(medias):
+            sobre = medias > umbral
+            previo = np.concatenate(([sobre_antes], sobre[:-1]))
+            for i in np.flatnonzero(sobre & ~previo):
+                yield Cruce(desplazamiento + int(i) * paso, float(medias[i]))
+            sobre_antes = bool(sobre[-1])
+            consumido = len(medias) * paso
+        else:
+            consumido = 0
+        arrastre = datos[consumido:]
+        desplazamiento += consumido
+
+
+def disparar_por_cruces(
+    cruces: Iterable[Cruce], paso_llm: Callable[[Cruce], object], max_llamadas: Optional[int] = None
+) -> list[tuple[Cruce, object]]:
+    """Ejecuta el paso del LLM solo para las ventanas que cruzaron el umbral"""
+    resultados = []
+    for cruce in cruces:
+        if max_llamadas is not None and len(resultados) >= max_llamadas:
+            break
+        resultados.append((cruce, paso_llm(cruce)))
+    return resultados
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+    import time
+
+    # --- Respuestas: 50 000 respuestas simuladas, 40 términos ---
+    azar = random.Random(0)
+    vocabulario = "el plástico reciclaje agua energía botella bolsa compost vidrio papel solar \n".split(" ")
+    textos = [" ".join(azar.choices(vocabulario, k=azar.randint(20, 80))) for _ in range(50_000)]
+    terminos = ["plástico", "reciclaje", "agua", "energía", "botella", "bolsa", "compost", "vidrio"] * 5
+
+    inicio = time.perf_counter()
+    lineas = [len(t.split("\n")) for t in textos]
+    caracteres = [len(t) for t in textos]
+    menciones = [[termino in t.lower() for termino in terminos] for t in textos]
+    bucle = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    metricas = metricas_respuestas(textos)
+    matriz = matriz_palabras_clave(textos, terminos)
+    vector = time.perf_counter() - inicio
+
+    assert metricas["lineas"].tolist() == lineas and metricas["caracteres"].tolist() == caracteres
+    assert matriz.tolist() == menciones
+    print(f"Respuestas ({len(textos):,} × {len(terminos)} términos): bucle {bucle:.2f}s, lotes {vector:.2f}s (x{bucle / vector:.1f})")
+
+    # --- Lecturas: 10 millones de temperaturas en .npy, leídas por bloques ---
+    n = 10_000_000
+    t = np.arange(n)
+    temperaturas = 24 + 3 * np.sin(t / 5000) + np.random.default_rng(0).normal(0, 0.5, n)
+    ruta = os.path.join(tempfile.mkdtemp(), "temperaturas.npy")
+    np.save(ruta, temperaturas)
+
+    muestra = temperaturas[:700_000].tolist()
+    inicio = time.perf_counter()
+    medias_bucle = [sum(muestra[i : i + 7]) / 7 for i in range(0, len(muestra) - 6, 7)]
+    bucle = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    medias = medias_moviles(temperaturas[:700_000], 7, 7)
+    vector = time.perf_counter() - inicio
+    assert np.allclose(medias, medias_bucle)
+    print(f"Medias semanales (700 000 lecturas): bucle {bucle * 1e3:.0f} ms, NumPy {vector * 1e3:.1f} ms")
+
+    inicio = time.perf_counter()
+    semanas_calor = int((medias_moviles(temperaturas, 7, 7) > 26).sum())
+    llamadas = disparar_por_cruces(
+        ventanas_sobre_umbral(bloques_lecturas(ruta, 1_000_000), ventana=7, umbral=26),
+        paso_llm=lambda cruce: f"consejos para {cruce.media:.1f}°C",  # aquí iría consultar_llm
+    )
+    print(
+        f"{n:,} lecturas en {time.perf_counter() - inicio:.2f}s: {semanas_calor:,} semanas sobre 26°C, "
+        f"pero solo {len(llamadas):,} cruces disparan el LLM"
+    )
@@ -0,0 +1,651 @@
+"""
+BACKENDS DE LLM INTERCAMBIABLES
+
+Todos los ejemplos obtienen sus modelos del registro (registro_modelos.py),
+y el registro los pide al backend activo. Hay dos implementaciones:
+
+- BackendGemini: google.generativeai de verdad.
+- BackendMock: local y determinista, para pruebas de carga sin red ni cuota.
+  Latencia configurable (constante, log-normal, Pareto), tasas de error,
+  respuestas fijas o guionizadas (incluidas llamadas a funciones), streaming,
+  chats y variante async.
+
+Ambos devuelven objetos con la misma forma que GenerativeModel
+(generate_content, generate_content_async, start_chat), así que el resto del
+código no cambia. Se elige con usar_backend(...) o con LLM_BACKEND=mock.
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, Protocol, Sequence, Union
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+from limitador import estimar_tokens
+from registro_modelos import MODELO_POR_DEFECTO, REGISTRO
+
+
+# ============================================
+# PROTOCOLO
+# ============================================
+
+
+class ModeloLLM(Protocol):
+    """Lo que el resto del código espera de un modelo (subconjunto de GenerativeModel)"""
+
+    model_name: str
+
+    def generate_content(self, contents: Any, **kwargs) -> Any: ...
+
+    async def generate_content_async(self, contents: Any, **kwargs) -> Any: ...
+
+    def start_chat(self, history: Optional[list] = None, **kwargs) -> Any: ...
+
+
+class BackendLLM(Protocol):
+    nombre: str
+
+    def crear_modelo(
+        self,
+        nombre: str = MODELO_POR_DEFECTO,
+        system_instruction: Optional[str] = None,
+        tools: Optional[Sequence] = None,
+    ) -> ModeloLLM: ...
+
+    def crear_modelo_cacheado(
+        self,
+        nombre: str = MODELO_POR_DEFECTO,
+        system_instruction: Optional[str] = None,
+        contenidos: Optional[list] = None,
+        ttl: float = 3600,
+    ) -> ModeloLLM: ...
+
+    def generar(self, prompt: Any, **kwargs) -> Any: ...
+
+    async def generar_async(self, prompt: Any, **kwargs) -> Any: ...
+
+    def chat(self, **kwargs) -> Any: ...
+
+
+class _BackendBase:
+    """Atajos comunes construidos sobre crear_modelo()"""
+
+    nombre = "base"
+
+    def crear_modelo(self, nombre=MODELO_POR_DEFECTO, system_instruction=None, tools=None):
+        raise NotImplementedError
+
+    def crear_modelo_cacheado(self, nombre=MODELO_POR_DEFECTO, system_instruction=None, contenidos=None, ttl=3600):
+        """Modelo sobre un prefijo guardado en el servidor (context caching)"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _separar(kwargs: dict) -> tuple[dict, dict]:
+        claves_modelo = ("nombre", "system_instruction", "tools")
+        del_modelo = {k: kwargs.pop(k) for k in claves_modelo if k in kwargs}
+        return del_modelo, kwargs
+
+    def generar(self, prompt, **kwargs):
+        del_modelo, resto = self._separar(kwargs)
+        return self.crear_modelo(**del_modelo).generate_content(prompt, **resto)
+
+    async def generar_async(self, prompt, **kwargs):
+        del_modelo, resto = self._separar(kwargs)
+        return await self.crear_modelo(**del_modelo).generate_content_async(prompt, **resto)
+
+    def chat(self, historial=None, **kwargs):
+        del_modelo, resto = self._separar(kwargs)
+        return self.crear_modelo(**del_modelo).start_chat(history=historial or [], **resto)
+
+
+# ============================================
+# GEMINI
+# ============================================
+
+
+class BackendGemini(_BackendBase):
+    """google.generativeai, configurado con GEMINI_API_KEY la primera vez"""
+
+    nombre = "gemini"
+
+    def __init__(self):
+        self._configurado = False
+        self._lock = threading.Lock()
+
+    def _genai(self):
+        import google.generativeai as genai
+
+        with self._lock:
+            if not self._configurado:
+                # .env ya está cargado (configuracion.py)
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                self._configurado = True
+        return genai
+
+    def crear_modelo(self, nombre=MODELO_POR_DEFECTO, system_instruction=None, tools=None):
+        kwargs = {}
+        if system_instruction is not None:
+            kwargs["system_instruction"] = system_instruction
+        if tools:
+            kwargs["tools"] = list(tools)
+        return self._genai().GenerativeModel(nombre, **kwargs)
+
+    def crear_modelo_cacheado(self, nombre=MODELO_POR_DEFECTO, system_instruction=None, contenidos=None, ttl=3600):
+        # La API rechaza prefijos por debajo de un mínimo de tokens (400 "too small")
+        genai = self._genai()
+        cache = genai.caching.CachedContent.create(
+            model=nombre,
+            system_instruction=system_instruction,
+            contents=contenidos,
+            ttl=datetime.timedelta(seconds=ttl),
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=cache)
+
+
+# ============================================
+# MOCK: piezas con la forma de las respuestas de Gemini
+# ============================================
+
+
+# Como en los protos de Gemini, los campos sin rellenar existen pero son falsos
+
+
+@dataclass
+class LlamadaFuncionMock:
+    name: str = ""
+    args: dict = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.name)
+
+
+@dataclass
+class RespuestaFuncionMock:
+    name: str = ""
+    response: dict = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.name)
+
+
+@dataclass
+class ParteMock:
+    text: str = ""
+    function_call: LlamadaFuncionMock = field(default_factory=LlamadaFuncionMock)
+    function_response: RespuestaFuncionMock = field(default_factory=RespuestaFuncionMock)
+
+
+@dataclass
+class ContenidoMock:
+    role: str
+    parts: list
+
+
+@dataclass
+class UsoMock:
+    prompt_token_count: int = 0
+    candidates_token_count: int = 0
+    cached_content_token_count: int = 0
+
+    @property
+    def total_token_count(self) -> int:
+        return self.prompt_token_count + self.candidates_token_count
+
+
+@dataclass
+class CandidatoMock:
+    content: ContenidoMock
+    finish_reason: str = "STOP"
+
+
+class RespuestaMock:
+    """Se comporta como GenerateContentResponse en lo que usan los ejemplos"""
+
+    def __init__(self, partes: list[ParteMock], uso: UsoMock):
+        self.candidates = [CandidatoMock(ContenidoMock("model", partes))]
+        self.usage_metadata = uso
+
+    @property
+    def parts(self) -> list[ParteMock]:
+        return self.candidates[0].content.parts
+
+    @property
+    def text(self) -> str:
+        textos = [p.text for p in self.parts if p.text]
+        if not textos:
+            # Igual que Gemini: pedir .text de una respuesta sin texto es un error
+            raise ValueError("La respuesta no contiene texto (¿llamada a función?)")
+        return "".join(textos)
+
+
+class ErrorCuotaSimulado(Exception):
+    """Imita google.api_core.exceptions.ResourceExhausted (429)"""
+
+    code = 429
+
+
+class ErrorServidorSimulado(Exception):
+    """Imita un 500/503 del servicio"""
+
+    code = 503
+
+
+class ErrorPlazoSimulado(Exception):
+    """Imita google.api_core.exceptions.DeadlineExceeded (504): venció request_options["timeout"]"""
+
+    code = 504
+
+
+# ============================================
+# MOCK: latencias
+# ============================================
+
+Latencia = Callable[[random.Random], float]
+
+
+def latencia_constante(segundos: float) -> Latencia:
+    return lambda rng: segundos
+
+
+def latencia_uniforme(minimo: float, maximo: float) -> Latencia:
+    return lambda rng: rng.uniform(minimo, maximo)
+
+
+def latencia_lognormal(mediana: float, sigma: float = 0.5) -> Latencia:
+    """Distribución típica de latencias de red: cola derecha moderada"""
+    import math
+
+    mu = math.log(mediana)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def latencia_pareto(minimo: float, alfa: float = 2.0, maximo: Optional[float] = None) -> Latencia:
+    """Cola pesada: la mayoría rápidas, unas pocas muy lentas"""
+
+    def _muestra(rng: random.Random) -> float:
+        valor = minimo * rng.paretovariate(alfa)
+        return min(valor, maximo) if maximo is not None else valor
+
+    return _muestra
+
+
+# ============================================
+# MOCK: respuestas
+# ============================================
+
+# Una respuesta guionizada puede ser:
+#   "texto"                                         -> parte de texto
+#   {"function_call": {"name": ..., "args": {...}}} -> llamada a función
+#   [ ...varias de las anteriores... ]             -> varias partes
+#   Exception                                       -> se lanza
+EspecRespuesta = Union[str, dict, list, BaseException]
+
+
+def texto_de_contenidos(contenidos: Any) -> str:
+    """Aplana prompts, historiales y partes a texto (para elegir respuesta y contar tokens)"""
+    if contenidos is None:
+        return ""
+    if isinstance(contenidos, str):
+        return contenidos
+    if isinstance(contenidos, dict):
+        if "parts" in contenidos:
+            return texto_de_contenidos(contenidos["parts"])
+        if "text" in contenidos:
+            return str(contenidos["text"])
+        return json.dumps(contenidos, ensure_ascii=False, default=str)
+    if isinstance(contenidos, (list, tuple)):
+        return "\n".join(texto_de_contenidos(c) for c in contenidos)
+    if hasattr(contenidos, "parts"):
+        return texto_de_contenidos(list(contenidos.parts))
+    partes = []
+    if getattr(contenidos, "text", None):
+        partes.append(contenidos.text)
+    for atributo in ("function_call", "function_response"):
+        valor = getattr(contenidos, atributo, None)
+        if valor:
+            partes.append(f"{atributo}:{getattr(valor, 'name', '')}")
+    return " ".join(partes) if partes else str(contenidos)
+
+
+def _a_partes(espec: EspecRespuesta) -> list[ParteMock]:
+    if isinstance(espec, BaseException):
+        raise espec
+    if isinstance(espec, str):
+        return [ParteMock(text=espec)]
+    if isinstance(espec, dict):
+        if "function_call" in espec:
+            llamada = espec["function_call"]
+            return [ParteMock(function_call=LlamadaFuncionMock(llamada["name"], dict(llamada.get("args", {}))))]
+        if "text" in espec:
+            return [ParteMock(text=espec["text"])]
+        # Cualquier otro dict se devuelve como JSON (salida estructurada)
+        return [ParteMock(text=json.dumps(espec, ensure_ascii=False))]
+    if isinstance(espec, list):
+        return [parte for item in espec for parte in _a_partes(item)]
+    return [ParteMock(text=str(espec))]
+
+
+class BackendMock(_BackendBase):
+    """
+    Backend local determinista.
+
+    respuestas:
+        - None: eco breve del prompt.
+        - dict {subcadena: espec}: la primera subcadena contenida en el prompt.
+        - list: guion que se consume en orden (y se repite al terminar).
+        - callable(prompt_texto, modelo) -> espec.
+    latencia: función rng -> segundos (ver latencia_*), o un dict
+        {nombre_modelo: función} con "*" para el resto (modelos rápidos y lentos).
+    tasa_error / tasa_error_cuota: probabilidad de ErrorServidorSimulado / ErrorCuotaSimulado.
+    fraccion_ttft: parte de la latencia que pasa antes del primer fragmento en streaming.
+    latencia_por_token: segundos extra por token de entrada no cacheado (prefill).
+    min_tokens_cache: tamaño mínimo de un prefijo cacheable, como en la API. Los
+        contenidos cacheados explícitamente y las system_instruction repetidas
+        de ese tamaño (caché implícita) cuentan como cached_content_token_count.
+    """
+
+    nombre = "mock"
+
+    def __init__(
+        self,
+        respuestas: Union[None, dict, list, Callable[..., EspecRespuesta]] = None,
+        latencia: Union[Latencia, dict[str, Latencia]] = latencia_constante(0.0),
+        tasa_error: float = 0.0,
+        tasa_error_cuota: float = 0.0,
+        fraccion_ttft: float = 0.3,
+        semilla: Optional[int] = 0,
+        latencia_por_token: float = 0.0,
+        min_tokens_cache: int = 1024,
+    ):
+        self.respuestas = respuestas
+        self.latencia = latencia
+        self.tasa_error = tasa_error
+        self.tasa_error_cuota = tasa_error_cuota
+        self.fraccion_ttft = fraccion_ttft
+        self.latencia_por_token = latencia_por_token
+        self.min_tokens_cache = min_tokens_cache
+        self._prefijos_vistos: set[str] = set()
+        self._caches_creadas = 0
+        self._rng = random.Random(semilla)
+        self._guion = itertools.cycle(respuestas) if isinstance(respuestas, list) else None
+        self._lock = threading.Lock()
+        self.reiniciar_estadisticas()
+
+    def reiniciar_estadisticas(self) -> None:
+        with self._lock:
+            self.stats = {
+                "llamadas": 0,
+                "tokens_entrada": 0,
+                "tokens_salida": 0,
+                "tokens_cacheados": 0,
+                "errores": 0,
+                "tiempo_simulado": 0.0,
+            }
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def crear_modelo(self, nombre=MODELO_POR_DEFECTO, system_instruction=None, tools=None):
+        return ModeloMock(self, nombre, system_instruction, tools)
+
+    def crear_modelo_cacheado(self, nombre=MODELO_POR_DEFECTO, system_instruction=None, contenidos=None, ttl=3600):
+        tokens = estimar_tokens(system_instruction) + (estimar_tokens(texto_de_contenidos(contenidos)) if contenidos else 0)
+        if tokens < self.min_tokens_cache:
+            raise ValueError(f"400 Cached content is too small: {tokens} < {self.min_tokens_cache} tokens (simulado)")
+        with self._lock:
+            self._caches_creadas += 1
+            numero = self._caches_creadas
+        modelo = ModeloMock(self, nombre, system_instruction)
+        modelo.cached_content = f"cachedContents/mock-{numero}"
+        modelo._tokens_cacheados = tokens
+        return modelo
+
+    # --- usado por ModeloMock ---
+
+    def _tokens_en_cache(self, modelo: "ModeloMock") -> int:
+        """Parte de la entrada que el servidor ya tiene: caché explícita o prefijo repetido"""
+        if modelo.cached_content:
+            return modelo._tokens_cacheados
+        instruccion = modelo._system_instruction
+        tokens = estimar_tokens(instruccion)
+        if not instruccion or tokens < self.min_tokens_cache:
+            return 0
+        with self._lock:
+            visto = instruccion in self._prefijos_vistos
+            self._prefijos_vistos.add(instruccion)
+        return tokens if visto else 0
+
+    def _sortear(self, modelo: str = MODELO_POR_DEFECTO) -> tuple[float, Optional[BaseException]]:
+        """Latencia y error (si toca) de la próxima llamada"""
+        distribucion = self.latencia
+        if isinstance(distribucion, dict):
+            distribucion = distribucion.get(modelo) or distribucion.get("*", latencia_constante(0.0))
+        with self._lock:
+            latencia = max(0.0, distribucion(self._rng))
+            azar = self._rng.random()
+        if azar < self.tasa_error_cuota:
+            return latencia * 0.1, ErrorCuotaSimulado("429 Resource has been exhausted (simulado)")
+        if azar < self.tasa_error_cuota + self.tasa_error:
+            return latencia, ErrorServidorSimulado("503 Service unavailable (simulado)")
+        return latencia, None
+
+    def _elegir(self, prompt: str, modelo: "ModeloMock") -> list[ParteMock]:
+        if self.respuestas is None:
+            return [ParteMock(text=f"Respuesta simulada a: {prompt.strip()[:60]}")]
+        if self._guion is not None:
+            with self._lock:
+                espec = next(self._guion)
+        elif isinstance(self.respuestas, dict):
+            espec = next(
+                (r for clave, r in self.respuestas.items() if clave in prompt),
+                self.respuestas.get("*", f"Respuesta simulada a: {prompt.strip()[:60]}"),
+            )
+        else:
+            espec = self.respuestas(prompt, modelo)
+        return _a_partes(espec)
+
+    def _registrar(self, entrada: int, salida: int, latencia: float, error: bool, cacheados: int = 0) -> None:
+        with self._lock:
+            self.stats["llamadas"] += 1
+            self.stats["tokens_entrada"] += entrada
+            self.stats["tokens_cacheados"] += cacheados
+            self.stats["tokens_salida"] += salida
+            self.stats["tiempo_simulado"] += latencia
+            self.stats["errores"] += int(error)
+
+
+class ModeloMock:
+    """Equivalente local de GenerativeModel"""
+
+    def __init__(self, backend: BackendMock, nombre: str, system_instruction=None, tools=None):
+        self.backend = backend
+        self.model_name = nombre
+        self._system_instruction = system_instruction
+        self._tools = list(tools) if tools else None
+        self.herramientas = {f.__name__: f for f in self._tools or [] if callable(f)}
+        self.cached_content: Optional[str] = None
+        self._tokens_cacheados = 0
+
+    def _preparar(
+        self, contents: Any, request_options: Optional[dict] = None
+    ) -> tuple[str, tuple[int, int], float, Optional[BaseException]]:
+        prompt = texto_de_contenidos(contents)
+        cacheados = self.backend._tokens_en_cache(self)
+        entrada = estimar_tokens(prompt) + (
+            self._tokens_cacheados if self.cached_content else estimar_tokens(self._system_instruction)
+        )
+        latencia, error = self.backend._sortear(self.model_name)
+        latencia += self.backend.latencia_por_token * (entrada - cacheados)
+        # Como en el SDK, la petición se corta al vencer su timeout y libera el hilo
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and latencia > timeout:
+            latencia = max(0.0, timeout)
+            error = ErrorPlazoSimulado(f"504 Deadline Exceeded tras {latencia:.2f}s (simulado)")
+        return prompt, (entrada, cacheados), latencia, error
+
+    def _responder(self, prompt: str, tokens: tuple[int, int], latencia: float, error) -> RespuestaMock:
+        entrada, cacheados = tokens
+        if error is not None:
+            self.backend._registrar(entrada, 0, latencia, True, cacheados)
+            raise error
+        partes = self.backend._elegir(prompt, self)
+        salida = estimar_tokens([p.text for p in partes if p.text])
+        self.backend._registrar(entrada, salida, latencia, False, cacheados)
+        return RespuestaMock(partes, UsoMock(entrada, salida, cacheados))
+
+    def generate_content(self, contents, stream: bool = False, request_options: Optional[dict] = None, **kwargs):
+        prompt, tokens, latencia, error = self._preparar(contents, request_options)
+        if stream:
+            return self._stream(prompt, tokens, latencia, error)
+        time.sleep(latencia)
+        return self._responder(prompt, tokens, latencia, error)
+
+    def _stream(self, prompt, tokens, latencia, error) -> Iterator[RespuestaMock]:
+        time.sleep(latencia * self.backend.fraccion_ttft)
+        respuesta = self._responder(prompt, tokens, latencia, error)
+        if any(p.function_call for p in respuesta.parts):
+            yield respuesta
+            return
+        palabras = respuesta.text.split(" ")
+        pausa = latencia * (1 - self.backend.fraccion_ttft) / max(1, len(palabras))
+        for i, palabra in enumerate(palabras):
+            if i:
+                time.sleep(pausa)
+            fragmento = palabra if i == len(palabras) - 1 else palabra + " "
+            # El último fragmento lleva el uso total, como en Gemini
+            uso = respuesta.usage_metadata if i == len(palabras) - 1 else UsoMock()
+            yield RespuestaMock([ParteMock(text=fragmento)], uso)
+
+    async def generate_content_async(self, contents, request_options: Optional[dict] = None, **kwargs):
+        prompt, tokens, latencia, error = self._preparar(contents, request_options)
+        await asyncio.sleep(latencia)
+        return self._responder(prompt, tokens, latencia, error)
+
+    def start_chat(self, history: Optional[list] = None, enable_automatic_function_calling: bool = False):
+        return ChatMock(self, list(history or []), enable_automatic_function_calling)
+
+
+class ChatMock:
+    """Equivalente local de ChatSession, con ejecución automática de herramientas opcional"""
+
+    MAX_VUELTAS_HERRAMIENTAS = 10
+
+    def __init__(self, modelo: ModeloMock, historial: list, automatico: bool):
+        self.model = self.modelo = modelo
+        self.history = historial
+        self.automatico = automatico
+
+    @staticmethod
+    def _contenido_usuario(mensaje: Any) -> ContenidoMock:
+        if isinstance(mensaje, ContenidoMock):
+            return mensaje
+        if isinstance(mensaje, list):
+            partes = [p if isinstance(p, ParteMock) else _parte_desde(p) for p in mensaje]
+            return ContenidoMock("user", partes)
+        return ContenidoMock("user", [_parte_desde(mensaje)])
+
+    def send_message(self, mensaje: Any, **kwargs) -> RespuestaMock:
+        self.history.append(self._contenido_usuario(mensaje))
+        respuesta = self.modelo.generate_content(self.history, **kwargs)
+        self.history.append(respuesta.candidates[0].content)
+
+        for _ in range(self.MAX_VUELTAS_HERRAMIENTAS):
+            llamadas = [p.function_call for p in respuesta.parts if p.function_call]
+            if not (self.automatico and llamadas):
+                break
+            resultados = []
+            for llamada in llamadas:
+                funcion = self.modelo.herramientas.get(llamada.name)
+                resultado = funcion(**llamada.args) if funcion else {"error": "herramienta desconocida"}
+                resultados.append(ParteMock(function_response=RespuestaFuncionMock(llamada.name, resultado)))
+            self.history.append(ContenidoMock("user", resultados))
+            respuesta = self.modelo.generate_content(self.history, **kwargs)
+            self.history.append(respuesta.candidates[0].content)
+        return respuesta
+
+    async def send_message_async(self, mensaje: Any, **kwargs) -> RespuestaMock:
+        self.history.append(self._contenido_usuario(mensaje))
+        respuesta = await self.modelo.generate_content_async(self.history, **kwargs)
+        self.history.append(respuesta.candidates[0].content)
+        return respuesta
+
+
+def _parte_desde(valor: Any) -> ParteMock:
+    """Acepta texto, dicts al estilo de la API o partes de otro tipo"""
+    if isinstance(valor, ParteMock):
+        return valor
+    if isinstance(valor, str):
+        return ParteMock(text=valor)
+    if isinstance(valor, dict):
+        if "function_response" in valor:
+            r = valor["function_response"]
+            return ParteMock(function_response=RespuestaFuncionMock(r["name"], dict(r.get("response", {}))))
+        if "function_call" in valor:
+            c = valor["function_call"]
+            return ParteMock(function_call=LlamadaFuncionMock(c["name"], dict(c.get("args", {}))))
+        return ParteMock(text=str(valor.get("text", "")))
+    return ParteMock(text=texto_de_contenidos(valor))
+
+
+# ============================================
+# BACKEND ACTIVO
+# ============================================
+
+_backend_activo: Optional[BackendLLM] = None
+_lock_activo = threading.Lock()
+
+
+def backend_activo() -> BackendLLM:
+    """El backend en uso; por defecto según LLM_BACKEND (gemini | mock)"""
+    global _backend_activo
+    with _lock_activo:
+        if _backend_activo is None:
+            _backend_activo = BackendMock() if os.getenv("LLM_BACKEND") == "mock" else BackendGemini()
+        return _backend_activo
+
+
+def usar_backend(backend: BackendLLM) -> BackendLLM:
+    """Cambia el backend de todo el proceso y vacía el registro de modelos"""
+    global _backend_activo
+    with _lock_activo:
+        _backend_activo = backend
+    REGISTRO.limpiar()
+    return backend
+
+
+if __name__ == "__main__":
+    # Medición de rendimiento y latencia de cola en local, sin red
+    from paralelizacion import ejecutar_en_paralelo
+
+    mock = BackendMock(
+        respuestas={"Clasifica": "TECNICO", "*": "Respuesta de prueba"},
+        latencia=latencia_lognormal(0.3, 0.6),
+        tasa_error=0.02,
+    )
+    modelo = mock.crear_modelo()
+    ramas = [(f"llamada {i}", lambda: modelo.generate_content("Clasifica esto")) for i in range(200)]
+
+    inicio = time.perf_counter()
+    resultados = ejecutar_en_paralelo(ramas, max_concurrencia=50)
+    total = time.perf_counter() - inicio
+
+    latencias = sorted(r.latencia for r in resultados)
+    p = lambda q: latencias[min(len(latencias) - 1, int(q * len(latencias)))]  # noqa: E731
+    print(f"{len(resultados)} llamadas en {total:.2f}s -> {len(resultados) / total:.0f} llamadas/s")
+    print(f"p50={p(0.5):.3f}s p95={p(0.95):.3f}s p99={p(0.99):.3f}s")
+    print(f"errores={sum(not r.ok for r in resultados)} | {mock.estadisticas()}")
+
+    # Guion con llamada a función y chat con herramientas automáticas
+    def sumar(a: float, b: float) -> dict:
+        return {"resultado": a + b}
+
+    guion = BackendMock(respuestas=[{"function_call": {"name": "sumar", "args": {"a": 2, "b": 3}}}, "La suma es 5"])
+    chat = guion.crear_modelo(tools=[sumar]).start_chat(enable_automatic_function_calling=True)
+    print(chat.send_message("¿Cuánto es 2 + 3?").text, "|", len(chat.history), "mensajes en el historial")
@@ -0,0 +1,204 @@
+"""
+BASE DE CONOCIMIENTO INDEXADA
+
+Respaldo de la herramienta `buscar_informacion`. En lugar de un dict con
+coincidencia exacta, los datos se cargan desde un archivo (JSONL o CSV) en un
+índice invertido:
+
+- Normalización: minúsculas, sin tildes, sin palabras vacías.
+- Atajo exacto por tema/alias normalizado.
+- Ranking BM25 y corrección difusa de palabras desconocidas.
+- Cada palabra de la consulta (salvo las vacías) debe aparecer en el tema:
+  "temperatura de Marte" no devuelve la del Sol, sino nada.
+- Carga perezosa: el índice se construye en la primera búsqueda y los textos
+  de respuesta se leen del archivo mapeado en memoria (mmap) solo al devolverlos.
+
+Formato JSONL: {"tema": "...", "alias": ["..."], "informacion": "..."}
+Formato CSV: columnas tema, alias (separados por "|"), informacion
+"""
+
+import csv
+import difflib
+import json
+import math
+import mmap
+import os
+import threading
+from array import array
+from collections import defaultdict
+from typing import Optional
+
+from normalizacion import tokenizar
+
+RUTA_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conocimiento.jsonl")
+
+
+class BaseConocimiento:
+    """Índice invertido BM25 sobre un archivo de datos"""
+
+    def __init__(
+        self,
+        ruta: str = RUTA_POR_DEFECTO,
+        k1: float = 1.2,
+        b: float = 0.75,
+        cobertura_minima: float = 1.0,
+    ):
+        self.ruta = ruta
+        self.k1 = k1
+        self.b = b
+        self.cobertura_minima = cobertura_minima
+        self._lock = threading.Lock()
+        self._cargado = False
+
+    # ---------- carga perezosa ----------
+
+    def _leer_registro(self, linea: bytes) -> Optional[dict]:
+        texto = linea.decode("utf-8").strip()
+        if not texto:
+            return None
+        if self.ruta.endswith(".csv"):
+            tema, alias, informacion = next(csv.reader([texto]))
+            return {"tema": tema, "alias": alias.split("|") if alias else [], "informacion": informacion}
+        return json.loads(texto)
+
+    def _cargar(self) -> None:
+        with self._lock:
+            if self._cargado:
+                return
+            self._postings: dict[str, array] = defaultdict(lambda: array("I"))
+            self._longitudes = array("H")
+            self._offsets = array("Q")
+            self._exactos: dict[str, int] = {}
+            self._por_prefijo: dict[str, set] = defaultdict(set)
+
+            with open(self.ruta, "rb") as archivo:
+                cabecera_csv = self.ruta.endswith(".csv")
+                offset = 0
+                for linea in archivo:
+                    inicio, offset = offset, offset + len(linea)
+                    if cabecera_csv:
+                        cabecera_csv = False
+                        continue
+                    registro = self._leer_registro(linea)
+                    if registro is None:
+                        continue
+                    doc = len(self._offsets)
+                    self._offsets.append(inicio)
+
+                    frases = [registro["tema"], *registro.get("alias", [])]
+                    tokens = set()
+                    for frase in frases:
+                        clave = " ".join(tokenizar(frase))
+                        self._exactos.setdefault(clave, doc)
+                        tokens.update(tokenizar(frase))
+                    for token in tokens:
+                        self._postings[token].append(doc)
+                        self._por_prefijo[token[:2]].add(token)
+                    self._longitudes.append(min(len(tokens), 65535))
+
+            self._postings = dict(self._postings)
+            total = len(self._offsets)
+            self._promedio = sum(self._longitudes) / total if total else 0.0
+            self._idf = {
+                t: math.log(1 + (total - len(p) + 0.5) / (len(p) + 0.5))
+                for t, p in self._postings.items()
+            }
+            self._mapa = b""
+            if total:
+                with open(self.ruta, "rb") as archivo:
+                    # El mapa sigue válido después de cerrar el archivo
+                    self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            self._cargado = True
+
+    def _registro(self, doc: int) -> dict:
+        inicio = self._offsets[doc]
+        fin = self._mapa.find(b"\n", inicio)
+        return self._leer_registro(self._mapa[inicio : fin if fin != -1 else None])
+
+    # ---------- búsqueda ----------
+
+    def _corregir(self, token: str) -> Optional[str]:
+        """Palabra conocida más parecida (p. ej. 'velocidd' -> 'velocidad')"""
+        if token in self._postings:
+            return token
+        candidatos = self._por_prefijo.get(token[:2], ())
+        parecidos = difflib.get_close_matches(token, candidatos, n=1, cutoff=0.8)
+        return parecidos[0] if parecidos else None
+
+    def buscar(self, consulta: str, limite: int = 1) -> list[tuple[dict, float]]:
+        """Los `limite` registros mejor puntuados como (registro, puntuación)"""
+        self._cargar()
+
+        clave = " ".join(tokenizar(consulta))
+        if clave in self._exactos:
+            return [(self._registro(self._exactos[clave]), float("inf"))]
+
+        terminos = {t for t in (self._corregir(t) for t in tokenizar(consulta)) if t}
+        if not terminos:
+            return []
+
+        puntuaciones: dict[int, float] = defaultdict(float)
+        coincidencias: dict[int, int] = defaultdict(int)
+        for termino in terminos:
+            idf = self._idf[termino]
+            for doc in self._postings[termino]:
+                longitud = self._longitudes[doc]
+                # tf = 1 en temas cortos; se deja la fórmula BM25 completa
+                puntuaciones[doc] += idf * (self.k1 + 1) / (
+                    1 + self.k1 * (1 - self.b + self.b * longitud / self._promedio)
+                )
+                coincidencias[doc] += 1
+
+        # Una palabra desconocida (sin corrección) también cuenta: "marte" deja fuera a todos
+        necesarios = math.ceil(len(set(tokenizar(consulta))) * self.cobertura_minima)
+        mejores = sorted(
+            (doc for doc in puntuaciones if coincidencias[doc] >= necesarios),
+            key=puntuaciones.get,
+            reverse=True,
+        )[:limite]
+        return [(self._registro(doc), puntuaciones[doc]) for doc in mejores]
+
+    def consultar(self, tema: str) -> Optional[str]:
+        """La información del mejor resultado, o None"""
+        resultados = self.buscar(tema)
+        return resultados[0][0]["informacion"] if resultados else None
+
+    def __len__(self) -> int:
+        self._cargar()
+        return len(self._offsets)
+
+
+if __name__ == "__main__":
+    # Escalabilidad con datos sintéticos: python base_conocimiento.py [entradas]
+    import random
+    import sys
+    import tempfile
+    import time
+
+    base = BaseConocimiento()
+    for consulta in ["velocidad luz", "Velocidad de la luz", "speed of light", "temperatura del Sol",
+                     "distancia entre la tierra y la luna", "velocidd del sonido", "capital de Francia",
+                     "temperatura de Marte", "velocidad del viento"]:
+        print(f"{consulta!r:40} -> {base.consultar(consulta)}")
+
+    entradas = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    palabras = [f"termino{i}" for i in range(50_000)]
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False, encoding="utf-8") as tmp:
+        for i in range(entradas):
+            tema = " ".join(random.sample(palabras, 3))
+            tmp.write(json.dumps({"tema": tema, "alias": [], "informacion": f"dato {i}"}) + "\n")
+            if i == entradas // 2:
+                objetivo = tema
+
+    inicio = time.perf_counter()
+    grande = BaseConocimiento(tmp.name)
+    print(f"\nInstanciar: {(time.perf_counter() - inicio) * 1e3:.3f} ms (carga perezosa)")
+    inicio = time.perf_counter()
+    print(f"Construir índice de {len(grande):,} entradas: {time.perf_counter() - inicio:.1f} s")
+
+    consultas = [" ".join(objetivo.split()[::-1])] + [" ".join(random.sample(palabras, 2)) for _ in range(999)]
+    inicio = time.perf_counter()
+    for consulta in consultas:
+        grande.buscar(consulta)
+    print(f"Búsqueda BM25: {(time.perf_counter() - inicio) / len(consultas) * 1e3:.3f} ms/consulta")
+    os.unlink(tmp.name)
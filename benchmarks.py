@@ -0,0 +1,312 @@
+"""
+BENCHMARKS DE LOS PATRONES DE AGENTES
+
+"Medir el rendimiento antes de hacer más complejo": este script ejecuta los
+seis patrones de agentes_simples.py contra el backend simulado (latencia
+fija, sin red ni cuota) y mide por patrón:
+
+- latencia p50 / p95 / p99 por tarea
+- llamadas al modelo y tokens por tarea
+- rendimiento (tareas por segundo)
+
+Los resultados se guardan en JSON para compararlos entre commits:
+
+    python benchmarks.py --salida base.json
+    python benchmarks.py --comparar base.json      # sale con código 1 si hay regresión
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Optional
+
+import agentes_simples
+import llamadas
+from backends import (
+    BackendMock,
+    backend_activo,
+    latencia_constante,
+    latencia_lognormal,
+    usar_backend,
+)
+from enrutador_local import EnrutadorLocal
+from limitador import LIMITADOR
+
+# ============================================
+# RESPUESTAS SIMULADAS POR PATRÓN
+# ============================================
+
+PARRAFOS = " ".join(
+    ["Reciclar reduce residuos, ahorra energía y protege los recursos naturales."] * 12
+)
+TRADUCCION = " ".join(
+    ["Recycling reduces waste, saves energy and protects natural resources."] * 12
+)
+
+
+def responder_escenario(prompt: str, modelo) -> object:
+    """Respuestas plausibles para cada paso, de modo que los flujos completen"""
+    herramientas = getattr(modelo, "herramientas", {})
+    ya_respondidas = prompt.count("function_response:")
+
+    if "calculadora" in herramientas:
+        if ya_respondidas == 0:
+            return {"function_call": {"name": "calculadora", "args": {"operacion": "15 + 8 * 12"}}}
+        return "Tienes 111 manzanas."
+
+    if "buscar_informacion" in herramientas:
+        pasos = [
+            {"function_call": {"name": "buscar_informacion", "args": {"tema": "velocidad de la luz"}}},
+            {"function_call": {"name": "convertir_unidades", "args": {"valor": 299792, "de": "km", "a": "millas"}}},
+        ]
+        if ya_respondidas < len(pasos):
+            return pasos[ya_respondidas]
+        return "La luz recorre unas 186282 millas por segundo."
+
+    # Antes que "Crea un título": estos prompts citan la tarea original
+    if prompt.startswith("Evalúa de 1 a 10"):
+        nota = 8 if "moldean" in prompt else 6
+        return json.dumps({"puntuacion": nota, "sugerencia": "hazlo más concreto"})
+    if prompt.startswith("Mejora este resultado"):
+        return "Cómo las redes sociales moldean a los jóvenes"
+    # Las instrucciones del routing viajan como system_instruction (plantillas_prompt)
+    if "Clasifica esta consulta" in (getattr(modelo, "_system_instruction", None) or "") + prompt:
+        return "GENERAL"
+    if "Escribe 3 párrafos" in prompt:
+        return PARRAFOS
+    if "Traduce al inglés" in prompt:
+        return TRADUCCION
+    if "Crea un título" in prompt:
+        return "Redes sociales y juventud: lo que nadie te cuenta"
+    return "Revisión simulada: sin problemas graves. Considera añadir pruebas y validar entradas."
+
+
+# ============================================
+# TAREAS
+# ============================================
+
+CONSULTAS_SOPORTE = [
+    "Mi app se cierra al subir fotos",
+    "¿Por qué me cobraron dos veces?",
+    "¿Cuál es el horario de atención?",
+    "Quiero saber más sobre ustedes",  # ambigua: suele ir al LLM
+]
+
+PATRONES: dict[str, Callable[[int], object]] = {
+    "aumentado": lambda i: agentes_simples.llm_aumentado(
+        "Si tengo 15 manzanas y compro 8 paquetes de 12 manzanas cada uno, ¿cuántas tengo?"
+    ),
+    "chaining": lambda i: agentes_simples.encadenar_prompts(),
+    "routing": lambda i: agentes_simples.procesar_consulta_soporte(
+        CONSULTAS_SOPORTE[i % len(CONSULTAS_SOPORTE)]
+    ),
+    "paralelizacion": lambda i: agentes_simples.revisar_codigo(agentes_simples.CODIGO_EJEMPLO),
+    "evaluador": lambda i: agentes_simples.evaluar_y_optimizar(
+        "el impacto de las redes sociales en los jóvenes"
+    ),
+    "agente": lambda i: agentes_simples.ejecutar_agente(
+        "¿Cuántas millas recorre la luz en un segundo?"
+    ),
+}
+
+
+@contextlib.contextmanager
+def entorno_aislado(mock: BackendMock):
+    """Backend simulado, sin caché, sin límite de cuota y sin tocar archivos del usuario"""
+    cache, enrutador = llamadas.CACHE, agentes_simples.enrutador
+    cuota = (LIMITADOR.rpm, LIMITADOR.tpm)
+    backend_previo = backend_activo()
+    usar_backend(mock)
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+    llamadas.CACHE = None  # la caché convertiría cada repetición en un acierto
+    agentes_simples.enrutador = EnrutadorLocal(registro=None)
+    try:
+        yield
+    finally:
+        llamadas.CACHE, agentes_simples.enrutador = cache, enrutador
+        LIMITADOR.configurar(rpm=cuota[0], tpm=cuota[1])
+        usar_backend(backend_previo)
+
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+
+def percentil(valores: list[float], q: float) -> float:
+    """Percentil por rango más cercano (q entre 0 y 1)"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(q * len(ordenados) + 0.5) - 1))]
+
+
+def medir_patron(nombre: str, mock: BackendMock, repeticiones: int, calentamiento: int = 1) -> dict:
+    tarea = PATRONES[nombre]
+    latencias, llamadas_tarea, tokens_tarea, errores = [], [], [], 0
+
+    for i in range(calentamiento + repeticiones):
+        antes = mock.estadisticas()
+        inicio = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                tarea(i)
+        except Exception:
+            errores += 1
+        latencia = time.perf_counter() - inicio
+        despues = mock.estadisticas()
+        if i < calentamiento:
+            continue
+        latencias.append(latencia)
+        llamadas_tarea.append(despues["llamadas"] - antes["llamadas"])
+        tokens_tarea.append(
+            despues["tokens_entrada"] + despues["tokens_salida"]
+            - antes["tokens_entrada"] - antes["tokens_salida"]
+        )
+
+    total = sum(latencias)
+    return {
+        "repeticiones": repeticiones,
+        "p50": percentil(latencias, 0.50),
+        "p95": percentil(latencias, 0.95),
+        "p99": percentil(latencias, 0.99),
+        "media": statistics.fmean(latencias),
+        "llamadas_por_tarea": statistics.fmean(llamadas_tarea),
+        "tokens_por_tarea": statistics.fmean(tokens_tarea),
+        "tareas_por_segundo": repeticiones / total if total else 0.0,
+        "errores": errores,
+    }
+
+
+def _commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar_benchmarks(
+    patrones: list[str],
+    repeticiones: int = 20,
+    latencia: float = 0.05,
+    sigma: float = 0.0,
+    tasa_error: float = 0.0,
+    semilla: int = 0,
+) -> dict:
+    mock = BackendMock(
+        respuestas=responder_escenario,
+        latencia=latencia_lognormal(latencia, sigma) if sigma else latencia_constante(latencia),
+        tasa_error=tasa_error,
+        semilla=semilla,
+    )
+    resultados = {}
+    with entorno_aislado(mock):
+        for nombre in patrones:
+            resultados[nombre] = medir_patron(nombre, mock, repeticiones)
+    return {
+        "commit": _commit_actual(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {
+            "repeticiones": repeticiones,
+            "latencia": latencia,
+            "sigma": sigma,
+            "tasa_error": tasa_error,
+            "semilla": semilla,
+        },
+        "patrones": resultados,
+    }
+
+
+# ============================================
+# INFORME Y COMPARACIÓN
+# ============================================
+
+# Métricas en las que "más" es peor
+METRICAS_COMPARADAS = ("p50", "p95", "p99", "llamadas_por_tarea", "tokens_por_tarea")
+
+
+def imprimir_tabla(resultados: dict) -> None:
+    print(
+        f"{'patrón':<15}{'p50':>9}{'p95':>9}{'p99':>9}"
+        f"{'llamadas':>10}{'tokens':>9}{'tareas/s':>10}{'errores':>9}"
+    )
+    for nombre, r in resultados["patrones"].items():
+        print(
+            f"{nombre:<15}{r['p50'] * 1e3:>7.1f}ms{r['p95'] * 1e3:>7.1f}ms{r['p99'] * 1e3:>7.1f}ms"
+            f"{r['llamadas_por_tarea']:>10.1f}{r['tokens_por_tarea']:>9.0f}"
+            f"{r['tareas_por_segundo']:>10.1f}{r['errores']:>9}"
+        )
+
+
+def comparar(actual: dict, anterior: dict, tolerancia: float = 0.10) -> list[str]:
+    """Lista de regresiones (métrica que empeora más que la tolerancia relativa)"""
+    regresiones = []
+    for nombre, r in actual["patrones"].items():
+        previo = anterior.get("patrones", {}).get(nombre)
+        if not previo:
+            continue
+        for metrica in METRICAS_COMPARADAS:
+            antes, ahora = previo.get(metrica, 0.0), r[metrica]
+            if antes and (ahora - antes) / antes > tolerancia:
+                regresiones.append(
+                    f"{nombre}.{metrica}: {antes:.4g} → {ahora:.4g} (+{(ahora - antes) / antes:.0%})"
+                )
+    return regresiones
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de los patrones contra el backend simulado")
+    parser.add_argument("patrones", nargs="*", metavar="PATRON",
+                        help=f"patrones a medir (por defecto, todos): {', '.join(PATRONES)}")
+    parser.add_argument("-n", "--repeticiones", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.05, help="segundos por llamada simulada")
+    parser.add_argument("--sigma", type=float, default=0.0, help="dispersión log-normal (0 = fija)")
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="empeoramiento relativo admitido")
+    args = parser.parse_args(argv)
+
+    desconocidos = [p for p in args.patrones if p not in PATRONES]
+    if desconocidos:
+        parser.error(f"patrones desconocidos: {', '.join(desconocidos)}")
+
+    resultados = ejecutar_benchmarks(
+        args.patrones or list(PATRONES),
+        repeticiones=args.repeticiones,
+        latencia=args.latencia,
+        sigma=args.sigma,
+        tasa_error=args.tasa_error,
+    )
+    imprimir_tabla(resultados)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            anterior = json.load(archivo)
+        regresiones = comparar(resultados, anterior, args.tolerancia)
+        print(f"\n📊 Comparación con {anterior.get('commit') or args.comparar}:")
+        if anterior.get("config") != resultados["config"]:
+            print(f"  ⚠️ Configuración distinta: {anterior.get('config')}")
+        for linea in regresiones:
+            print(f"  ❌ {linea}")
+        if not regresiones:
+            print(f"  ✓ Sin regresiones por encima del {args.tolerancia:.0%}")
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+BUCLE DE AGENTE PROPIO (herramientas en paralelo y con caché)
+
+Con enable_automatic_function_calling=True el SDK ejecuta las herramientas
+una detrás de otra dentro de su propio bucle. Aquí el bucle es nuestro:
+
+- Todas las function_call de un mismo turno del modelo se ejecutan a la vez
+  en un pool de hilos (y las repetidas dentro del turno, una sola vez).
+- Las herramientas puras se memorizan por argumentos: la misma llamada en
+  otro turno u otra tarea no se vuelve a ejecutar.
+- Presupuesto por tarea: máximo de pasos (turnos del modelo) y de tiempo.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence
+
+from llamadas import enviar_mensaje
+from paralelizacion import ejecutar_en_paralelo
+from politica_llamadas import tiempo_restante
+from registro_modelos import MODELO_POR_DEFECTO, obtener_modelo
+from trazas import traza
+
+
+@dataclass
+class LlamadaHerramienta:
+    nombre: str
+    args: dict
+    resultado: dict
+    latencia: float = 0.0
+    desde_cache: bool = False
+    paso: int = 0
+
+
+@dataclass
+class ResultadoAgente:
+    texto: Optional[str]
+    motivo: str  # "respuesta", "pasos", "tiempo" o "cancelado"
+    pasos: int
+    tiempo: float
+    llamadas: list[LlamadaHerramienta] = field(default_factory=list)
+
+
+def _a_python(valor: Any) -> Any:
+    """Los args de Gemini llegan como MapComposite / RepeatedComposite; los pasamos a dict / list"""
+    if hasattr(valor, "items"):
+        return {clave: _a_python(v) for clave, v in valor.items()}
+    if hasattr(valor, "__iter__") and not isinstance(valor, (str, bytes)):
+        return [_a_python(v) for v in valor]
+    return valor
+
+
+def _clave(nombre: str, args: dict) -> str:
+    return nombre + json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _texto(respuesta: Any) -> Optional[str]:
+    try:
+        return respuesta.text
+    except (AttributeError, ValueError):
+        return None
+
+
+class BucleAgente:
+    """Agente con herramientas: el modelo pide, nosotros ejecutamos en paralelo"""
+
+    def __init__(
+        self,
+        herramientas: Sequence[Callable[..., Any]],
+        puras: Optional[Sequence[str]] = None,
+        modelo: str = MODELO_POR_DEFECTO,
+        system_instruction: Optional[str] = None,
+        max_pasos: int = 8,
+        max_tiempo: float = 60.0,
+        max_concurrencia: int = 8,
+        max_memoria: int = 1024,
+        historial=None,
+    ):
+        self.herramientas = list(herramientas)
+        self._por_nombre = {h.__name__: h for h in self.herramientas}
+        self.puras = set(puras or ())
+        self.modelo = modelo
+        self.system_instruction = system_instruction
+        self.max_pasos = max_pasos
+        self.max_tiempo = max_tiempo
+        self.max_concurrencia = max_concurrencia
+        self.max_memoria = max_memoria
+        self.historial = historial  # GestorHistorial opcional: cada tarea usa su propia sesión
+        self._memoria: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "tareas": 0,
+            "pasos": 0,
+            "llamadas_herramientas": 0,
+            "ejecutadas": 0,
+            "aciertos_cache": 0,
+            "tiempo_herramientas": 0.0,  # suma de latencias
+            "tiempo_en_paralelo": 0.0,  # lo que realmente se esperó
+        }
+
+    # --- herramientas ---
+
+    def _de_memoria(self, clave: str) -> Optional[dict]:
+        with self._lock:
+            resultado = self._memoria.get(clave)
+            if resultado is not None:
+                self._memoria.move_to_end(clave)
+            return resultado
+
+    def _a_memoria(self, clave: str, resultado: dict) -> None:
+        with self._lock:
+            self._memoria[clave] = resultado
+            if len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def _ejecutar(self, nombre: str, args: dict) -> dict:
+        funcion = self._por_nombre.get(nombre)
+        if funcion is None:
+            return {"error": f"Herramienta desconocida: {nombre}"}
+        with traza(f"herramienta: {nombre}"):
+            try:
+                resultado = funcion(**args)
+            except Exception as e:
+                # El error vuelve al modelo, que puede corregir los argumentos
+                return {"error": f"{type(e).__name__}: {e}"}
+        resultado = resultado if isinstance(resultado, dict) else {"resultado": resultado}
+        if nombre in self.puras:
+            self._a_memoria(_clave(nombre, args), resultado)
+        return resultado
+
+    def _despachar(self, pedidas: list[tuple[str, dict]], paso: int, timeout: Optional[float]) -> list[LlamadaHerramienta]:
+        """Ejecuta todas las llamadas de un turno a la vez; devuelve una por llamada pedida"""
+        llamadas = [LlamadaHerramienta(nombre, args, {}, paso=paso) for nombre, args in pedidas]
+
+        # Las repetidas dentro del turno o ya memorizadas no se ejecutan
+        pendientes: dict[str, tuple[str, dict]] = {}
+        for llamada in llamadas:
+            clave = _clave(llamada.nombre, llamada.args)
+            memorizado = self._de_memoria(clave) if llamada.nombre in self.puras else None
+            if memorizado is not None:
+                llamada.resultado, llamada.desde_cache = memorizado, True
+            else:
+                pendientes.setdefault(clave, (llamada.nombre, llamada.args))
+
+        inicio = time.perf_counter()
+        ramas = [
+            (clave, lambda n=nombre, a=args: self._ejecutar(n, a))
+            for clave, (nombre, args) in pendientes.items()
+        ]
+        resultados = {
+            r.nombre: r for r in ejecutar_en_paralelo(ramas, self.max_concurrencia, timeout)
+        }
+        espera = time.perf_counter() - inicio
+
+        for llamada in llamadas:
+            if llamada.desde_cache:
+                continue
+            r = resultados[_clave(llamada.nombre, llamada.args)]
+            llamada.latencia = r.latencia
+            if r.ok:
+                llamada.resultado = r.valor
+            else:
+                llamada.resultado = {"error": "Tiempo agotado" if r.agotado else str(r.error)}
+
+        with self._lock:
+            self.stats["llamadas_herramientas"] += len(llamadas)
+            self.stats["ejecutadas"] += len(pendientes)
+            self.stats["aciertos_cache"] += sum(ll.desde_cache for ll in llamadas)
+            self.stats["tiempo_herramientas"] += sum(r.latencia for r in resultados.values())
+            self.stats["tiempo_en_paralelo"] += espera
+        return llamadas
+
+    # --- bucle ---
+
+    def ejecutar(self, tarea: str, cancelado: Optional[threading.Event] = None) -> ResultadoAgente:
+        """
+        Resuelve la tarea en una sesión de chat propia. `cancelado` se revisa
+        entre pasos: una llamada al modelo ya en curso no se puede interrumpir.
+        """
+        inicio = time.perf_counter()
+        modelo = obtener_modelo(self.modelo, self.system_instruction, self.herramientas)
+        chat = modelo.start_chat()
+        # Un gestor por chat: varias tareas a la vez no se pisan ultimo_envio
+        sesion = self.historial.nueva_sesion() if self.historial is not None else None
+        historial: list[LlamadaHerramienta] = []
+        motivo, paso = "pasos", 0
+
+        with traza("Agente", herramientas=len(self.herramientas)) as span:
+            with traza("Paso 1"):
+                respuesta = enviar_mensaje(chat, tarea, historial=sesion)
+
+            for paso in range(1, self.max_pasos + 1):
+                pedidas = [
+                    (parte.function_call.name, _a_python(parte.function_call.args or {}))
+                    for parte in respuesta.parts
+                    if getattr(parte, "function_call", None)
+                ]
+                if not pedidas:
+                    motivo = "respuesta"
+                    break
+                if cancelado is not None and cancelado.is_set():
+                    motivo = "cancelado"
+                    break
+                restante = self.max_tiempo - (time.perf_counter() - inicio)
+                del_flujo = tiempo_restante()
+                if del_flujo is not None:
+                    restante = min(restante, del_flujo)
+                if restante <= 0 or paso == self.max_pasos:
+                    motivo = "tiempo" if restante <= 0 else "pasos"
+                    break
+
+                with traza(f"Paso {paso + 1}", llamadas=len(pedidas)):
+                    llamadas = self._despachar(pedidas, paso, restante)
+                    historial.extend(llamadas)
+                    # Una function_response por cada function_call, en el mismo orden
+                    respuesta = enviar_mensaje(chat, [
+                        {"function_response": {"name": ll.nombre, "response": ll.resultado}}
+                        for ll in llamadas
+                    ], historial=sesion)
+
+            span.fijar(pasos=paso, motivo=motivo, llamadas_herramientas=len(historial))
+
+        with self._lock:
+            self.stats["tareas"] += 1
+            self.stats["pasos"] += paso
+
+        return ResultadoAgente(
+            texto=_texto(respuesta) if motivo == "respuesta" else None,
+            motivo=motivo,
+            pasos=paso,
+            tiempo=time.perf_counter() - inicio,
+            llamadas=historial,
+        )
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["ahorro_paralelo"] = stats["tiempo_herramientas"] - stats["tiempo_en_paralelo"]
+        return stats
+
+
+if __name__ == "__main__":
+    # Herramientas lentas y un modelo simulado que pide tres a la vez
+    # (dos de ellas idénticas) y luego responde
+    from backends import BackendMock, latencia_constante, usar_backend
+    from limitador import LIMITADOR
+
+    def buscar_informacion(tema: str) -> dict:
+        time.sleep(0.3)
+        return {"informacion": f"datos sobre {tema}"}
+
+    def convertir_unidades(valor: float, de: str, a: str) -> dict:
+        time.sleep(0.3)
+        return {"resultado": valor * 0.621371, "unidad": a}
+
+    def responder(prompt: str, modelo) -> object:
+        if "function_response:" in prompt:
+            return "La luz recorre unas 186282 millas por segundo."
+        return [
+            {"function_call": {"name": "buscar_informacion", "args": {"tema": "velocidad de la luz"}}},
+            {"function_call": {"name": "convertir_unidades", "args": {"valor": 299792, "de": "km", "a": "millas"}}},
+            {"function_call": {"name": "buscar_informacion", "args": {"tema": "velocidad de la luz"}}},
+        ]
+
+    usar_backend(BackendMock(respuestas=responder, latencia=latencia_constante(0.05)))
+    LIMITADOR.configurar(rpm=100000)
+    agente = BucleAgente(
+        [buscar_informacion, convertir_unidades], puras=["buscar_informacion", "convertir_unidades"]
+    )
+
+    for intento in (1, 2):
+        r = agente.ejecutar("¿Cuántas millas recorre la luz en un segundo?")
+        print(f"Tarea {intento}: {r.tiempo:.2f}s, {r.pasos} pasos, motivo: {r.motivo} → {r.texto}")
+        for ll in r.llamadas:
+            print(f"  • {ll.nombre}{ll.args} {'(caché)' if ll.desde_cache else f'{ll.latencia:.2f}s'}")
+    print("Secuencial con el SDK habría tardado ~0.9s en herramientas por tarea")
+    print(agente.estadisticas())
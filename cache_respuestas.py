@@ -0,0 +1,203 @@
+"""
+CACHÉ PERSISTENTE DE RESPUESTAS DEL LLM
+
+Los ejemplos envían una y otra vez los mismos prompts deterministas. Esta
+caché direccionada por contenido evita repetir esas llamadas:
+
+- Clave: hash de (modelo, system_instruction, tools, generation_config, prompt).
+- Nivel 1: LRU en memoria.
+- Nivel 2: SQLite en disco, sobrevive entre ejecuciones.
+- Expiración por TTL y expulsión por tamaño en ambos niveles.
+- Contadores de aciertos y fallos.
+
+Variables de entorno: LLM_CACHE=0 la desactiva, LLM_CACHE_RUTA cambia el archivo.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+
+
+class RespuestaCacheada:
+    """Imita lo mínimo de una respuesta de Gemini que usan los ejemplos"""
+
+    desde_cache = True
+    usage_metadata = None
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __repr__(self) -> str:
+        return f"RespuestaCacheada({self.text[:40]!r}...)"
+
+
+def _serializable(valor: Any) -> Any:
+    """Convierte protos, funciones y demás en algo estable para el hash"""
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    if isinstance(valor, dict):
+        return {str(k): _serializable(v) for k, v in sorted(valor.items())}
+    if isinstance(valor, (list, tuple)):
+        return [_serializable(v) for v in valor]
+    if callable(valor) and hasattr(valor, "__qualname__"):
+        return f"{valor.__module__}.{valor.__qualname__}"
+    return str(valor)
+
+
+def clave_de_llamada(modelo, contenido: Any, generation_config: Any = None) -> str:
+    """Clave direccionada por contenido para una llamada a generate_content"""
+    partes = {
+        "modelo": getattr(modelo, "model_name", type(modelo).__name__),
+        "system_instruction": _serializable(getattr(modelo, "_system_instruction", None)),
+        "tools": _serializable(getattr(modelo, "_tools", None)),
+        "generation_config": _serializable(
+            generation_config or getattr(modelo, "_generation_config", None)
+        ),
+        "prompt": _serializable(contenido),
+    }
+    contexto_cacheado = getattr(modelo, "cached_content", None)
+    if contexto_cacheado:
+        # Un modelo sobre caché de contexto: su prefijo vive en el servidor
+        partes["cached_content"] = _serializable(contexto_cacheado)
+    texto = json.dumps(partes, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class CacheRespuestas:
+    """Caché de dos niveles (memoria LRU + SQLite) con TTL"""
+
+    def __init__(
+        self,
+        ruta: Optional[str] = ".cache_llm.sqlite",
+        max_memoria: int = 256,
+        max_disco: int = 10_000,
+        ttl: Optional[float] = 7 * 24 * 3600,
+    ):
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self.ttl = ttl
+        self._memoria: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "aciertos_memoria": 0,
+            "aciertos_disco": 0,
+            "fallos": 0,
+            "escrituras": 0,
+            "expulsiones": 0,
+        }
+
+        self.ruta = ruta
+        self._conexion: Optional[sqlite3.Connection] = None
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Abre el archivo SQLite solo la primera vez que se necesita"""
+        if self._conexion is None and self.ruta:
+            self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conexion.execute(
+                """CREATE TABLE IF NOT EXISTS respuestas (
+                    clave TEXT PRIMARY KEY,
+                    texto TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    accedido REAL NOT NULL
+                )"""
+            )
+            self._conexion.commit()
+        return self._conexion
+
+    @classmethod
+    def desde_entorno(cls) -> Optional["CacheRespuestas"]:
+        if os.getenv("LLM_CACHE", "1") == "0":
+            return None
+        return cls(ruta=os.getenv("LLM_CACHE_RUTA", ".cache_llm.sqlite"))
+
+    def _vigente(self, creado: float) -> bool:
+        return self.ttl is None or time.time() - creado < self.ttl
+
+    def obtener(self, clave: str) -> Optional[str]:
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                creado, texto = entrada
+                if self._vigente(creado):
+                    self._memoria.move_to_end(clave)
+                    self._stats["aciertos_memoria"] += 1
+                    return texto
+                del self._memoria[clave]
+
+            if self._db is not None:
+                fila = self._db.execute(
+                    "SELECT texto, creado FROM respuestas WHERE clave = ?", (clave,)
+                ).fetchone()
+                if fila is not None:
+                    texto, creado = fila
+                    if self._vigente(creado):
+                        self._db.execute(
+                            "UPDATE respuestas SET accedido = ? WHERE clave = ?",
+                            (time.time(), clave),
+                        )
+                        self._db.commit()
+                        self._guardar_en_memoria(clave, creado, texto)
+                        self._stats["aciertos_disco"] += 1
+                        return texto
+                    self._db.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                    self._db.commit()
+
+            self._stats["fallos"] += 1
+            return None
+
+    def guardar(self, clave: str, texto: str) -> None:
+        ahora = time.time()
+        with self._lock:
+            self._guardar_en_memoria(clave, ahora, texto)
+            self._stats["escrituras"] += 1
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?)",
+                (clave, texto, ahora, ahora),
+            )
+            # Expulsar las menos usadas recientemente si se supera el tamaño
+            (total,) = self._db.execute("SELECT COUNT(*) FROM respuestas").fetchone()
+            if total > self.max_disco:
+                sobrantes = total - self.max_disco
+                self._db.execute(
+                    """DELETE FROM respuestas WHERE clave IN (
+                        SELECT clave FROM respuestas ORDER BY accedido LIMIT ?)""",
+                    (sobrantes,),
+                )
+                self._stats["expulsiones"] += sobrantes
+            self._db.commit()
+
+    def _guardar_en_memoria(self, clave: str, creado: float, texto: str) -> None:
+        self._memoria[clave] = (creado, texto)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+            self._stats["expulsiones"] += 1
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._memoria.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM respuestas")
+                self._db.commit()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        aciertos = stats["aciertos_memoria"] + stats["aciertos_disco"]
+        consultas = aciertos + stats["fallos"]
+        stats["tasa_aciertos"] = aciertos / consultas if consultas else 0.0
+        return stats
+
+
+# Caché compartida por ambos scripts (None si está desactivada)
+CACHE = CacheRespuestas.desde_entorno()
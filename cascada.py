@@ -0,0 +1,360 @@
+"""
+CASCADA DE MODELOS POR PASO (barato primero, el fuerte solo si hace falta)
+
+Todos los pasos usan el mismo modelo, sea una etiqueta de una palabra o
+tres párrafos. Una Cascada prueba niveles en orden, del más barato al más
+caro, y se queda con la primera respuesta que pasa un verificador barato:
+
+- Niveles: un modelo del registro (p. ej. Flash-Lite, luego Flash) o una
+  función propia (ruta local, plantilla con caché...). Una función que
+  devuelve None cede el paso al siguiente nivel.
+- Verificadores: `por_esquema` (el JSON valida contra el tipo; con
+  `estricto=True`, sin adivinar la respuesta a partir de prosa),
+  `por_longitud` (compuerta de palabras) y `por_nota` (nota del evaluador,
+  como en el EVALUATOR-OPTIMIZER, pedida al modelo barato). Cualquier
+  función texto -> bool o (bool, motivo) también sirve.
+- Solo si el verificador rechaza se escala. El último nivel se acepta sin
+  verificar (no hay a quién escalar), salvo `verificar_ultimo=True`.
+- Por paso: tasa de escalado, aceptadas por nivel, latencia media y p95, y
+  coste con la tarifa de cada modelo (trazas.PRECIOS_MODELO), incluido el
+  de los verificadores que llaman al LLM.
+
+Variables de entorno: LLM_MODELO_RAPIDO (Flash-Lite por defecto),
+LLM_CASCADA=0 desactiva las cascadas (solo el último nivel, para comparar).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence, Union
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+import trazas
+from llamadas import generar
+from registro_modelos import MODELO_POR_DEFECTO, obtener_modelo
+
+MODELO_RAPIDO = os.getenv("LLM_MODELO_RAPIDO", "models/gemini-flash-lite-latest")
+
+
+@dataclass
+class Veredicto:
+    ok: bool
+    motivo: str = ""
+    coste: float = 0.0  # lo que costó verificar (si el verificador llama al LLM)
+
+
+Verificador = Callable[[str], Union[bool, tuple[bool, str], Veredicto]]
+
+
+def _veredicto(valor: Any) -> Veredicto:
+    if isinstance(valor, Veredicto):
+        return valor
+    if isinstance(valor, tuple):
+        return Veredicto(*valor)
+    return Veredicto(bool(valor), "" if valor else "rechazada")
+
+
+def _texto(respuesta: Any) -> Optional[str]:
+    if respuesta is None or isinstance(respuesta, str):
+        return respuesta
+    try:
+        return respuesta.text
+    except (AttributeError, ValueError):
+        return None
+
+
+def coste_respuesta(respuesta: Any, modelo: Optional[str]) -> float:
+    """Coste de una respuesta según su usage_metadata (0 si vino de la caché o de la ruta local)"""
+    uso = getattr(respuesta, "usage_metadata", None)
+    if not uso:
+        return 0.0
+    return trazas.coste_estimado(
+        getattr(uso, "prompt_token_count", 0) or 0,
+        getattr(uso, "candidates_token_count", 0) or 0,
+        getattr(uso, "cached_content_token_count", 0) or 0,
+        modelo,
+    )
+
+
+# --- verificadores ---
+
+
+def por_longitud(minimo: int = 50, maximo: Optional[int] = None) -> Verificador:
+    """Acepta si el número de palabras está entre minimo y maximo"""
+    from compuertas import CompuertaPalabras
+
+    def verificar(texto: str) -> tuple[bool, str]:
+        compuerta = CompuertaPalabras(minimo=minimo, maximo=maximo)
+        ok = compuerta.finalizar(texto)
+        return ok, "" if ok else compuerta.motivo()
+
+    return verificar
+
+
+def por_esquema(tipo: Any, estricto: bool = False) -> Verificador:
+    """
+    Acepta si el texto es (o se repara en local a) JSON válido para `tipo`.
+    Con `estricto`, rechaza también las reparaciones que leen la respuesta en
+    prosa ("La categoría es TECNICO"): un nivel barato que no sigue el
+    formato escala en vez de pasar por bueno.
+    """
+    from salida_estructurada import REPARACIONES_DUDOSAS, ErrorEsquema, interpretar
+
+    def verificar(texto: str) -> tuple[bool, str]:
+        try:
+            _, reparaciones = interpretar(texto, tipo)
+        except ErrorEsquema as e:
+            return False, f"esquema: {e}"
+        dudosas = [r for r in reparaciones if r in REPARACIONES_DUDOSAS] if estricto else []
+        if dudosas:
+            return False, f"esquema: sin JSON del formato pedido ({', '.join(dudosas)})"
+        return True, ""
+
+    return verificar
+
+
+def por_nota(
+    tarea: str,
+    umbral: float = 8,
+    criterios: str = "claridad, precisión y atractivo",
+    modelo: str = MODELO_RAPIDO,
+) -> Verificador:
+    """Acepta si el evaluador (un modelo barato) da al menos `umbral` sobre 10"""
+    from evaluador_optimizador import PROMPT_EVALUAR, Evaluacion, interpretar_evaluacion
+    from salida_estructurada import SalidaEstructurada
+
+    salida = SalidaEstructurada(Evaluacion)
+
+    def verificar(texto: str) -> Veredicto:
+        respuesta = generar(
+            obtener_modelo(modelo),
+            PROMPT_EVALUAR.format(tarea=tarea, criterios=criterios, candidato=texto),
+            generation_config=salida.configuracion(),
+        )
+        coste = coste_respuesta(respuesta, modelo)
+        evaluacion = interpretar_evaluacion(_texto(respuesta) or "", salida)
+        if evaluacion is None:
+            return Veredicto(False, "evaluación ilegible", coste)
+        return Veredicto(evaluacion.puntuacion >= umbral, f"nota {evaluacion.puntuacion:.0f}/10", coste)
+
+    return verificar
+
+
+# --- cascada ---
+
+
+@dataclass
+class Nivel:
+    nombre: str
+    modelo: Optional[str] = None  # del registro; también fija la tarifa
+    system_instruction: Optional[str] = None
+    # En lugar de un modelo del registro: funcion(prompt, **kwargs) -> respuesta, texto o None
+    funcion: Optional[Callable[..., Any]] = None
+
+    def responder(self, prompt: Any, **kwargs) -> tuple[Optional[str], float]:
+        if self.funcion is not None:
+            respuesta = self.funcion(prompt, **kwargs)
+        else:
+            modelo = obtener_modelo(self.modelo or MODELO_POR_DEFECTO, system_instruction=self.system_instruction)
+            respuesta = generar(modelo, prompt, **kwargs)
+        return _texto(respuesta), coste_respuesta(respuesta, self.modelo)
+
+
+@dataclass
+class Intento:
+    nivel: str
+    aceptado: bool
+    motivo: str
+    latencia: float
+    coste: float
+
+
+@dataclass
+class ResultadoCascada:
+    texto: Optional[str]
+    nivel: Optional[str]  # el que dio la respuesta aceptada (o la última, si ninguna pasó)
+    aceptado: bool
+    latencia: float
+    coste: float
+    intentos: list[Intento] = field(default_factory=list)
+
+    @property
+    def escalado(self) -> bool:
+        return len(self.intentos) > 1
+
+
+def _percentil(valores: Sequence[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))] if ordenados else 0.0
+
+
+class Cascada:
+    """Un paso del flujo servido por varios niveles, del más barato al más caro"""
+
+    def __init__(
+        self,
+        paso: str,
+        niveles: Sequence[Nivel],
+        verificar: Verificador,
+        verificar_ultimo: bool = False,
+        activa: Optional[bool] = None,
+    ):
+        if not niveles:
+            raise ValueError("Una cascada necesita al menos un nivel")
+        self.paso = paso
+        self.niveles = list(niveles)
+        self.verificar = verificar
+        self.verificar_ultimo = verificar_ultimo
+        self.activa = os.getenv("LLM_CASCADA", "1") != "0" if activa is None else activa
+        self._lock = threading.Lock()
+        self.reiniciar_estadisticas()
+
+    def reiniciar_estadisticas(self) -> None:
+        with self._lock:
+            self.stats = {"llamadas": 0, "escaladas": 0, "sin_aceptar": 0, "coste": 0.0}
+            self._por_nivel = {
+                n.nombre: {"intentos": 0, "aceptadas": 0, "latencia": 0.0, "coste": 0.0} for n in self.niveles
+            }
+            self._latencias: deque[float] = deque(maxlen=1000)
+
+    def ejecutar(self, prompt: Any, **kwargs) -> ResultadoCascada:
+        """Prueba los niveles en orden hasta que uno pasa el verificador"""
+        niveles = self.niveles if self.activa else self.niveles[-1:]
+        inicio = time.perf_counter()
+        intentos: list[Intento] = []
+        ultimo_texto, ultimo_nivel, aceptado = None, None, False
+        with trazas.traza(f"cascada: {self.paso}") as span:
+            for i, nivel in enumerate(niveles):
+                t0 = time.perf_counter()
+                texto, coste = nivel.responder(prompt, **kwargs)
+                if texto is None:
+                    veredicto = Veredicto(False, "sin respuesta")
+                elif i == len(niveles) - 1 and not self.verificar_ultimo:
+                    veredicto = Veredicto(True)
+                else:
+                    veredicto = _veredicto(self.verificar(texto))
+                intentos.append(
+                    Intento(nivel.nombre, veredicto.ok, veredicto.motivo, time.perf_counter() - t0, coste + veredicto.coste)
+                )
+                if texto is not None:
+                    ultimo_texto, ultimo_nivel = texto, nivel.nombre
+                if veredicto.ok:
+                    aceptado = True
+                    break
+                if i < len(niveles) - 1:
+                    trazas.evento("escalado", desde=nivel.nombre, motivo=veredicto.motivo)
+            span.fijar(nivel=ultimo_nivel, escalado=len(intentos) > 1 or None)
+
+        resultado = ResultadoCascada(
+            ultimo_texto,
+            ultimo_nivel,
+            aceptado,
+            time.perf_counter() - inicio,
+            sum(i.coste for i in intentos),
+            intentos,
+        )
+        self._registrar(resultado)
+        return resultado
+
+    def _registrar(self, resultado: ResultadoCascada) -> None:
+        with self._lock:
+            self.stats["llamadas"] += 1
+            self.stats["escaladas"] += int(resultado.escalado)
+            self.stats["sin_aceptar"] += int(not resultado.aceptado)
+            self.stats["coste"] += resultado.coste
+            self._latencias.append(resultado.latencia)
+            for intento in resultado.intentos:
+                nivel = self._por_nivel[intento.nivel]
+                nivel["intentos"] += 1
+                nivel["aceptadas"] += int(intento.aceptado)
+                nivel["latencia"] += intento.latencia
+                nivel["coste"] += intento.coste
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            latencias = list(self._latencias)
+            por_nivel = {nombre: dict(s) for nombre, s in self._por_nivel.items()}
+        llamadas = stats["llamadas"]
+        for s in por_nivel.values():
+            s["latencia_media"] = s.pop("latencia") / s["intentos"] if s["intentos"] else 0.0
+        stats.update(
+            paso=self.paso,
+            tasa_escalado=stats["escaladas"] / llamadas if llamadas else 0.0,
+            latencia_media=sum(latencias) / len(latencias) if latencias else 0.0,
+            latencia_p95=_percentil(latencias, 0.95),
+            coste_medio=stats["coste"] / llamadas if llamadas else 0.0,
+            niveles=por_nivel,
+        )
+        return stats
+
+
+def imprimir_cascadas(cascadas: Sequence[Cascada]) -> None:
+    print(f"  {'paso':<14} {'llamadas':>8} {'escalado':>8} {'media':>8} {'p95':>8} {'$/1k':>8}  aceptadas por nivel")
+    for cascada in cascadas:
+        s = cascada.estadisticas()
+        if not s["llamadas"]:
+            continue
+        niveles = ", ".join(f"{nombre} {n['aceptadas']}/{n['intentos']}" for nombre, n in s["niveles"].items())
+        print(
+            f"  {s['paso']:<14} {s['llamadas']:>8} {s['tasa_escalado']:>8.0%} "
+            f"{s['latencia_media']:>7.3f}s {s['latencia_p95']:>7.3f}s {s['coste_medio'] * 1000:>8.4f}  {niveles}"
+        )
+
+
+if __name__ == "__main__":
+    # Resúmenes y clasificaciones: solo el modelo fuerte vs. cascada Flash-Lite → Flash
+    import random
+    from typing import Literal
+
+    from backends import BackendMock, latencia_constante, latencia_lognormal, usar_backend
+    from limitador import LIMITADOR
+
+    @dataclass
+    class Etiqueta:
+        categoria: Literal["TECNICO", "FACTURACION", "GENERAL"]
+
+    azar = random.Random(3)
+
+    def responder(prompt: str, modelo) -> str:
+        # El modelo rápido falla a veces: se queda corto o rompe el formato
+        falla = modelo.model_name == MODELO_RAPIDO and azar.random() < 0.25
+        if prompt.startswith("Resume"):
+            return "Resumen breve." if falla else "El texto explica cómo reducir residuos en casa. " * 6
+        return "La categoría es TECNICO" if falla else '{"categoria": "TECNICO"}'
+
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+    documento = "Reciclar en casa es sencillo si se separan los residuos. " * 40
+
+    def medir(activa: bool) -> list[Cascada]:
+        usar_backend(
+            BackendMock(
+                respuestas=responder,
+                latencia={MODELO_RAPIDO: latencia_lognormal(0.08, 0.3), "*": latencia_lognormal(0.3, 0.3)},
+            )
+        )
+        niveles = [Nivel("flash-lite", MODELO_RAPIDO), Nivel("flash", MODELO_POR_DEFECTO)]
+        resumen = Cascada("resumir", niveles, por_longitud(20, 200), activa=activa)
+        etiqueta = Cascada("clasificar", niveles, por_esquema(Etiqueta, estricto=True), activa=activa)
+        for i in range(40):
+            resumen.ejecutar(f"Resume en un párrafo (documento {i}):\n\n{documento}", usar_cache=False)
+            etiqueta.ejecutar(f"Clasifica la consulta {i}: la app se cierra al subir fotos", usar_cache=False)
+        return [resumen, etiqueta]
+
+    for activa in (False, True):
+        print("Cascada Flash-Lite → Flash:" if activa else "Solo el modelo fuerte:")
+        imprimir_cascadas(medir(activa))
+
+    # Verificador por nota: el evaluador barato decide si hace falta el fuerte
+    usar_backend(
+        BackendMock(
+            respuestas={"Evalúa": '{"puntuacion": 6, "sugerencia": "más concreto"}', "*": "Título genérico"},
+            latencia=latencia_constante(0.05),
+        )
+    )
+    tarea = "Crea un título atractivo para un artículo sobre reciclaje. Solo el título."
+    titulos = Cascada("titular", [Nivel("flash-lite", MODELO_RAPIDO), Nivel("flash", MODELO_POR_DEFECTO)], por_nota(tarea))
+    r = titulos.ejecutar(tarea, usar_cache=False)
+    print(f"\nTítulo de {r.nivel}: " + " → ".join(f"{i.nivel} ({i.motivo or 'aceptado'})" for i in r.intentos))
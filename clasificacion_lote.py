@@ -0,0 +1,190 @@
+"""
+CLASIFICACIÓN POR LOTES (ROUTING masivo)
+
+Clasificar miles de tickets de uno en uno cuesta un viaje de ida y vuelta por
+ticket. Aquí se empaquetan muchas consultas en un solo prompt con salida
+JSON, se leen las etiquetas de vuelta y solo se reintentan (dividiendo en
+mitades) las consultas cuya etiqueta no se pudo interpretar.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from llamadas import generar
+from paralelizacion import ejecutar_en_paralelo
+from registro_modelos import obtener_modelo
+
+CATEGORIAS = ("TECNICO", "FACTURACION", "GENERAL")
+
+PROMPT_LOTE = """Clasifica cada consulta en UNA categoría:
+- TECNICO (errores, bugs, problemas técnicos)
+- FACTURACION (pagos, facturas, cargos)
+- GENERAL (información general)
+
+Devuelve SOLO un array JSON con un objeto por consulta, con su mismo id:
+[{{"id": 0, "categoria": "TECNICO"}}, ...]
+
+Consultas:
+{consultas}"""
+
+
+def _interpretar(texto: str, ids: list[int]) -> dict[int, str]:
+    """Extrae {id: categoría} válidos; lo que no se entienda simplemente falta"""
+    texto = texto.strip()
+    inicio, fin = texto.find("["), texto.rfind("]")
+    if inicio == -1 or fin == -1:
+        return {}
+    try:
+        datos = json.loads(texto[inicio : fin + 1])
+    except json.JSONDecodeError:
+        return {}
+
+    etiquetas = {}
+    for posicion, item in enumerate(datos if isinstance(datos, list) else []):
+        if isinstance(item, dict):
+            # {"id": "0"} es un desvío frecuente del modelo: no debe costar un reintento
+            try:
+                id_ = int(item.get("id"))
+            except (ValueError, TypeError):
+                continue
+            categoria = str(item.get("categoria", "")).strip().upper()
+        else:
+            # Array de etiquetas sueltas: se asume el mismo orden
+            id_ = ids[posicion] if posicion < len(ids) else None
+            categoria = str(item).strip().upper()
+        if id_ in ids and categoria in CATEGORIAS:
+            etiquetas[id_] = categoria
+    return etiquetas
+
+
+class ClasificadorLote:
+    """Clasifica listas de consultas con pocos viajes al modelo"""
+
+    def __init__(self, modelo: Any = None, max_divisiones: int = 3, usar_cache: bool = True):
+        self.modelo = modelo
+        self.max_divisiones = max_divisiones
+        self.usar_cache = usar_cache
+        self.stats = {"consultas": 0, "llamadas": 0, "reintentos": 0, "sin_etiqueta": 0}
+        self._lock = threading.Lock()
+
+    def _contar(self, clave: str, cantidad: int = 1) -> None:
+        with self._lock:
+            self.stats[clave] += cantidad
+
+    def _pedir(self, consultas: dict[int, str], usar_cache: bool = True) -> dict[int, str]:
+        modelo = self.modelo or obtener_modelo()
+        lineas = "\n".join(
+            f"{id_}. {json.dumps(texto, ensure_ascii=False)}" for id_, texto in consultas.items()
+        )
+        respuesta = generar(
+            modelo,
+            PROMPT_LOTE.format(consultas=lineas),
+            usar_cache=usar_cache,
+            generation_config={"response_mime_type": "application/json"},
+        )
+        self._contar("llamadas")
+        return _interpretar(respuesta.text, list(consultas))
+
+    def _resolver(self, consultas: dict[int, str], division: int = 0) -> dict[int, str]:
+        # Un reintento idéntico no debe recibir la misma respuesta fallida de la caché
+        etiquetas = self._pedir(consultas, usar_cache=self.usar_cache and division == 0)
+        faltantes = {i: c for i, c in consultas.items() if i not in etiquetas}
+        if not faltantes or division >= self.max_divisiones:
+            self._contar("sin_etiqueta", len(faltantes))
+            return etiquetas
+
+        # Reintentar solo lo que falló, partido en mitades más fáciles de responder
+        ids = list(faltantes)
+        mitad = max(1, len(ids) // 2)
+        for parte in (ids[:mitad], ids[mitad:]):
+            if parte:
+                self._contar("reintentos")
+                etiquetas.update(self._resolver({i: faltantes[i] for i in parte}, division + 1))
+        return etiquetas
+
+    def clasificar(
+        self,
+        consultas: list[str],
+        batch_size: int = 50,
+        max_concurrencia: int = 1,
+        por_defecto: Optional[str] = "GENERAL",
+    ) -> list[Optional[str]]:
+        """Una etiqueta por consulta, en el mismo orden (`por_defecto` si no hubo forma)"""
+        self._contar("consultas", len(consultas))
+        lotes = [
+            {i: consultas[i] for i in range(inicio, min(inicio + batch_size, len(consultas)))}
+            for inicio in range(0, len(consultas), batch_size)
+        ]
+        ramas = [
+            (f"lote {n}", lambda lote=lote: self._resolver(lote)) for n, lote in enumerate(lotes)
+        ]
+        etiquetas: dict[int, str] = {}
+        for resultado in ejecutar_en_paralelo(ramas, max_concurrencia=max_concurrencia):
+            if resultado.ok:
+                etiquetas.update(resultado.valor)
+            else:
+                print(f"⚠️ {resultado.nombre} falló: {resultado.error}")
+        return [etiquetas.get(i, por_defecto) for i in range(len(consultas))]
+
+
+def clasificar_lote(
+    consultas: list[str], batch_size: int = 50, max_concurrencia: int = 1
+) -> list[Optional[str]]:
+    """Atajo: clasifica `consultas` en lotes de `batch_size` por llamada"""
+    return ClasificadorLote().clasificar(consultas, batch_size, max_concurrencia)
+
+
+def medir_rendimiento(
+    consultas: list[str], clasificar: Callable[[list[str]], list[Optional[str]]]
+) -> float:
+    """Tickets por segundo de una estrategia de clasificación"""
+    inicio = time.perf_counter()
+    clasificar(consultas)
+    return len(consultas) / (time.perf_counter() - inicio)
+
+
+if __name__ == "__main__":
+    # Comparación por ítem frente a por lotes con un modelo simulado (sin red)
+    import random
+    import re
+
+    from limitador import LIMITADOR
+
+    LIMITADOR.configurar(rpm=100_000, tpm=1e9)
+
+    class ModeloSimulado:
+        """Tarda 0.2 s por llamada y etiqueta por palabras clave"""
+
+        model_name = "simulado"
+
+        def generate_content(self, prompt, **kwargs):
+            time.sleep(0.2)
+            items = re.findall(r"^(\d+)\. (.*)$", prompt, flags=re.M)
+            salida = [
+                {
+                    "id": int(id_),
+                    "categoria": "FACTURACION" if "cobr" in texto else
+                    "TECNICO" if "error" in texto else "GENERAL",
+                }
+                for id_, texto in items
+                if random.random() > 0.05  # a veces "olvida" un ítem
+            ]
+            return type("Respuesta", (), {"text": json.dumps(salida), "usage_metadata": None})()
+
+    plantillas = ["Me cobraron de más", "La app da error al abrir", "¿Qué horario tienen?"]
+    tickets = [f"{random.choice(plantillas)} (ticket {i})" for i in range(200)]
+    modelo = ModeloSimulado()
+
+    # Sin caché: las respuestas simuladas no deben acabar en .cache_llm.sqlite,
+    # y una segunda ejecución mediría aciertos de caché en lugar de lotes
+    por_item = ClasificadorLote(modelo, usar_cache=False)
+    tps_item = medir_rendimiento(
+        tickets[:20], lambda cs: [por_item.clasificar([c], batch_size=1)[0] for c in cs]
+    )
+    por_lote = ClasificadorLote(modelo, usar_cache=False)
+    tps_lote = medir_rendimiento(tickets, lambda cs: por_lote.clasificar(cs, batch_size=50))
+
+    print(f"Por ítem: {tps_item:8.1f} tickets/s | {por_item.stats}")
+    print(f"Por lote: {tps_lote:8.1f} tickets/s | {por_lote.stats}")
@@ -0,0 +1,179 @@
+"""
+HERRAMIENTA DE CLIMA (wttr.in)
+
+Cliente HTTP para `obtener_clima`:
+
+- Una sola requests.Session con pool de conexiones (reutiliza TLS).
+- Timeouts explícitos de conexión y lectura: nunca se queda colgado.
+- Caché por ciudad con TTL: el clima no cambia de un segundo a otro.
+- obtener_clima_lote(ciudades) consulta muchas ciudades a la vez.
+
+La URL base es configurable para poder probarlo contra un servidor local.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from normalizacion import normalizar
+from paralelizacion import ejecutar_en_paralelo
+
+
+class ClienteClima:
+    """Cliente de wttr.in con pool de conexiones, timeouts y caché TTL"""
+
+    def __init__(
+        self,
+        url_base: str = "https://wttr.in",
+        timeout: tuple[float, float] = (3.05, 10),
+        ttl: float = 600,
+        conexiones: int = 10,
+    ):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = timeout
+        self.ttl = ttl
+        self._cache: dict[str, tuple[float, dict]] = {}
+        self._lock = threading.Lock()
+        self.conexiones = conexiones
+        self.stats = {"aciertos": 0, "peticiones": 0, "errores": 0}
+        self._sesion = None
+
+    @property
+    def sesion(self):
+        """La sesión (y requests) se crean en la primera petición, no al importar"""
+        if self._sesion is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            with self._lock:
+                if self._sesion is None:
+                    sesion = requests.Session()
+                    adaptador = HTTPAdapter(
+                        pool_connections=self.conexiones,
+                        pool_maxsize=self.conexiones,
+                        # Reintentos solo para fallos transitorios del servidor
+                        max_retries=Retry(
+                            total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504)
+                        ),
+                    )
+                    sesion.mount("https://", adaptador)
+                    sesion.mount("http://", adaptador)
+                    self._sesion = sesion
+        return self._sesion
+
+    def _de_cache(self, clave: str) -> Optional[dict]:
+        with self._lock:
+            entrada = self._cache.get(clave)
+            if entrada and time.monotonic() - entrada[0] < self.ttl:
+                self.stats["aciertos"] += 1
+                return entrada[1]
+        return None
+
+    def obtener(self, ciudad: str) -> Optional[dict]:
+        """Obtiene el clima de una ciudad; None si hay un error (ya informado)"""
+        import requests
+
+        clave = normalizar(ciudad.strip())
+        clima = self._de_cache(clave)
+        if clima is not None:
+            return clima
+
+        try:
+            # La URL usa un formato especial para obtener la respuesta en JSON (j1)
+            with self._lock:
+                self.stats["peticiones"] += 1
+            respuesta = self.sesion.get(
+                f"{self.url_base}/{ciudad}", params={"format": "j1"}, timeout=self.timeout
+            )
+            respuesta.raise_for_status()
+            data = respuesta.json()
+
+            # Extraemos los datos que nos interesan
+            c = data['current_condition'][0]
+
+            clima = {
+                "ciudad": data['nearest_area'][0]['areaName'][0]['value'],
+                "temperatura": c['temp_C'],
+                "sensacion": c['FeelsLikeC'],
+                "descripcion": c['weatherDesc'][0]['value'],
+                "humedad": c['humidity'],
+                "viento": c['windspeedKmph'],
+                "precipitacion": c['precipMM']
+            }
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                self.stats["errores"] += 1
+            print(f"Error de red al obtener el clima: {e}")
+            return None
+        except (KeyError, IndexError, ValueError) as e:
+            with self._lock:
+                self.stats["errores"] += 1
+            print(f"Error al procesar los datos del clima. La ciudad '{ciudad}' podría no ser válida. Error: {e}")
+            return None
+
+        with self._lock:
+            self._cache[clave] = (time.monotonic(), clima)
+        return clima
+
+    def obtener_lote(self, ciudades: list[str], max_concurrencia: int = 8) -> dict[str, Optional[dict]]:
+        """Consulta varias ciudades en paralelo; devuelve {ciudad: clima o None}"""
+        ramas = [(ciudad, lambda ciudad=ciudad: self.obtener(ciudad)) for ciudad in ciudades]
+        resultados = ejecutar_en_paralelo(
+            ramas, max_concurrencia=max_concurrencia, timeout=sum(self.timeout) * 3
+        )
+        return {r.nombre: r.valor if r.ok else None for r in resultados}
+
+
+# Cliente compartido (la sesión se reutiliza entre llamadas)
+CLIENTE = ClienteClima()
+
+
+def obtener_clima(ciudad):
+    """Obtiene el clima de una ciudad usando la API de wttr.in."""
+    return CLIENTE.obtener(ciudad)
+
+
+def obtener_clima_lote(ciudades):
+    """Obtiene el clima de varias ciudades a la vez."""
+    return CLIENTE.obtener_lote(ciudades)
+
+
+if __name__ == "__main__":
+    # Prueba contra un servidor HTTP local que imita a wttr.in
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubWttr(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(0.2)  # latencia simulada
+            ciudad = self.path.split("?")[0].strip("/")
+            cuerpo = json.dumps({
+                "current_condition": [{
+                    "temp_C": "18", "FeelsLikeC": "17", "weatherDesc": [{"value": "Nublado"}],
+                    "humidity": "70", "windspeedKmph": "9", "precipMM": "0.1",
+                }],
+                "nearest_area": [{"areaName": [{"value": ciudad}]}],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), StubWttr)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    cliente = ClienteClima(url_base=f"http://127.0.0.1:{servidor.server_port}")
+
+    ciudades = ["Bogota", "Medellin", "Cali", "Barranquilla", "Cartagena", "Pasto"]
+    inicio = time.perf_counter()
+    lote = cliente.obtener_lote(ciudades)
+    print(f"Lote de {len(lote)} ciudades: {time.perf_counter() - inicio:.2f}s")
+    inicio = time.perf_counter()
+    cliente.obtener("Bogota")
+    print(f"Repetir Bogota (caché): {(time.perf_counter() - inicio) * 1e3:.3f} ms")
+    print(cliente.stats)
+    servidor.shutdown()
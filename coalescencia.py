@@ -0,0 +1,283 @@
+"""
+COALESCENCIA DE LLAMADAS IDÉNTICAS EN VUELO (single-flight)
+
+La caché de respuestas solo ayuda cuando la primera llamada ya terminó. Si
+veinte usuarios preguntan "¿Cuál es el horario de atención?" a la vez, las
+veinte fallan en la caché y salen veinte llamadas a Gemini. Aquí:
+
+- La primera llamada con una clave (la misma de la caché: modelo,
+  instrucción, herramientas, configuración y prompt) es la líder y hace la
+  llamada real.
+- Las que llegan con la misma clave mientras la líder está en vuelo esperan
+  su resultado en vez de salir a la red. Si la líder falla, todas reciben
+  la misma excepción; la siguiente llamada con esa clave vuelve a intentarlo.
+  Excepto PlazoAgotado: el plazo era de la líder, no de las demás, así que
+  las que esperan repiten la llamada y una de ellas pasa a ser la líder.
+- Vale para hilos (`compartir`) y para corrutinas (`compartir_async`), y
+  ambos comparten el mismo registro: un hilo y una corrutina con la misma
+  clave también se agrupan. Cancelar una corrutina que espera, o que se le
+  agote el plazo a un hilo que espera, no cancela la llamada de las demás.
+
+Todas reciben el mismo objeto respuesta: hay que tratarlo como de solo lectura.
+
+Variable de entorno: LLM_COALESCENCIA=0 la desactiva.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+from politica_llamadas import PlazoAgotado, tiempo_restante
+
+
+class _Relevo(Exception):
+    """La líder agotó su propio plazo: quien espera debe repetir la llamada"""
+
+    def __init__(self, error: BaseException):
+        super().__init__(str(error))
+        self.error = error
+
+
+class Coalescedor:
+    """Agrupa llamadas idénticas simultáneas en una sola llamada real"""
+
+    def __init__(self):
+        self._en_vuelo: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "llamadas": 0,
+            "reales": 0,  # llamadas que salieron al modelo
+            "compartidas": 0,  # llamadas ahorradas: esperaron a otra idéntica
+            "errores_compartidos": 0,  # esperas que recibieron el error de la líder
+            "relevos": 0,  # esperas que repitieron la llamada porque a la líder se le acabó el plazo
+            "max_en_espera": 0,  # mayor grupo de llamadas sobre una misma clave
+        }
+        self._en_espera: dict[str, int] = {}
+
+    @classmethod
+    def desde_entorno(cls) -> Optional["Coalescedor"]:
+        if os.getenv("LLM_COALESCENCIA", "1") == "0":
+            return None
+        return cls()
+
+    def _unirse(self, clave: str, relevo: bool = False) -> tuple[Future, bool]:
+        """(futuro de la clave, True si esta llamada es la líder)"""
+        with self._lock:
+            if relevo:
+                # Ya contada como compartida, pero al final no se ahorró
+                self.stats["compartidas"] -= 1
+                self.stats["relevos"] += 1
+            else:
+                self.stats["llamadas"] += 1
+            futuro = self._en_vuelo.get(clave)
+            if futuro is not None:
+                self.stats["compartidas"] += 1
+                self._en_espera[clave] += 1
+                self.stats["max_en_espera"] = max(self.stats["max_en_espera"], self._en_espera[clave])
+                return futuro, False
+            futuro = Future()
+            self._en_vuelo[clave] = futuro
+            self._en_espera[clave] = 1
+            self.stats["reales"] += 1
+            return futuro, True
+
+    def _publicar(self, clave: str, futuro: Future, resultado: Any = None, error: Optional[BaseException] = None) -> None:
+        # Se saca del registro antes de publicar: quien llegue después hace su propia llamada
+        with self._lock:
+            self._en_vuelo.pop(clave, None)
+            self._en_espera.pop(clave, None)
+        if isinstance(error, PlazoAgotado):
+            error = _Relevo(error)
+        if error is not None:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(resultado)
+
+    def _resultado_compartido(self, futuro: Future) -> Any:
+        # Quien espera respeta su propio plazo aunque la líder siga en vuelo
+        restante = tiempo_restante()
+        try:
+            return futuro.result(timeout=None if restante is None else max(0.0, restante))
+        except _Relevo:
+            raise
+        except BaseException:
+            if not futuro.done():
+                raise PlazoAgotado("Plazo agotado esperando una llamada idéntica en vuelo") from None
+            with self._lock:
+                self.stats["errores_compartidos"] += 1
+            raise
+
+    def compartir(self, clave: str, funcion: Callable[..., Any], *args, **kwargs) -> tuple[Any, bool]:
+        """
+        funcion(*args, **kwargs), o el resultado de una llamada idéntica en vuelo.
+        Devuelve (resultado, compartida); compartida=True si no hubo llamada propia.
+        """
+        futuro, lider = self._unirse(clave)
+        while not lider:
+            try:
+                return self._resultado_compartido(futuro), True
+            except _Relevo:
+                futuro, lider = self._unirse(clave, relevo=True)
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            self._publicar(clave, futuro, error=e)
+            raise
+        self._publicar(clave, futuro, resultado)
+        return resultado, False
+
+    async def compartir_async(self, clave: str, funcion: Callable[..., Any], *args, **kwargs) -> tuple[Any, bool]:
+        """
+        Como compartir(), desde una corrutina. `funcion` puede ser async o
+        síncrona (esta última corre en el pool del bucle y no lo bloquea).
+        """
+        futuro, lider = self._unirse(clave)
+        while True:
+            if lider:
+                if inspect.iscoroutinefunction(funcion):
+                    trabajo = self._liderar_async(clave, futuro, funcion, args, kwargs)
+                    asyncio.ensure_future(trabajo)
+                else:
+                    contexto = contextvars.copy_context()
+                    asyncio.get_running_loop().run_in_executor(
+                        None, contexto.run, self._liderar, clave, futuro, funcion, args, kwargs
+                    )
+            # shield: si quien espera se cancela, la llamada sigue para los demás
+            try:
+                resultado = await asyncio.shield(asyncio.wrap_future(futuro))
+            except _Relevo as e:
+                if lider:
+                    raise e.error from None
+                futuro, lider = self._unirse(clave, relevo=True)
+                continue
+            except Exception:
+                if not lider:
+                    with self._lock:
+                        self.stats["errores_compartidos"] += 1
+                raise
+            return resultado, not lider
+
+    def _liderar(self, clave: str, futuro: Future, funcion, args, kwargs) -> None:
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            self._publicar(clave, futuro, error=e)
+        else:
+            self._publicar(clave, futuro, resultado)
+
+    async def _liderar_async(self, clave: str, futuro: Future, funcion, args, kwargs) -> None:
+        try:
+            resultado = await funcion(*args, **kwargs)
+        except BaseException as e:
+            self._publicar(clave, futuro, error=e)
+        else:
+            self._publicar(clave, futuro, resultado)
+
+    def en_vuelo(self) -> int:
+        with self._lock:
+            return len(self._en_vuelo)
+
+    def reiniciar_estadisticas(self) -> None:
+        with self._lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["tasa_ahorro"] = stats["compartidas"] / stats["llamadas"] if stats["llamadas"] else 0.0
+        return stats
+
+
+# Coalescedor compartido por todas las llamadas (ver llamadas.generar)
+COALESCEDOR = Coalescedor.desde_entorno()
+
+
+if __name__ == "__main__":
+    # Ráfaga de preguntas frecuentes: 200 usuarios, 5 preguntas distintas, todos a la vez
+    import random
+    import time
+
+    from backends import BackendMock, latencia_constante, usar_backend
+    from coalescencia import COALESCEDOR  # noqa: F811 (el que usa llamadas.py)
+    from limitador import LIMITADOR
+    from llamadas import generar
+    from paralelizacion import ejecutar_en_paralelo
+    from registro_modelos import obtener_modelo
+
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+    preguntas = [
+        "¿Cuál es el horario de atención?",
+        "¿Cómo restablezco mi contraseña?",
+        "¿Dónde veo mis facturas?",
+        "¿Aceptan pagos con tarjeta?",
+        "¿Cómo contacto con soporte?",
+    ]
+    rafaga = random.Random(0).choices(preguntas, k=200)
+
+    def medir(nombre: str, usar_cache: bool) -> None:
+        mock = BackendMock(latencia=latencia_constante(0.2))
+        usar_backend(mock)
+        modelo = obtener_modelo()
+        COALESCEDOR.reiniciar_estadisticas()
+        # Todas a la vez: ninguna ha terminado cuando llegan las demás, la caché no puede ayudar
+        inicio = time.perf_counter()
+        ramas = [(str(i), lambda p=p: generar(modelo, p, usar_cache=usar_cache).text) for i, p in enumerate(rafaga)]
+        resultados = ejecutar_en_paralelo(ramas, max_concurrencia=len(rafaga))
+        total = time.perf_counter() - inicio
+        assert all(r.ok for r in resultados)
+        print(f"{nombre:<16} {mock.estadisticas()['llamadas']:4d} llamadas al modelo para {len(rafaga)} peticiones, {total:.2f}s")
+
+    medir("sin coalescencia", usar_cache=False)
+    medir("con coalescencia", usar_cache=True)
+    print(COALESCEDOR.estadisticas())
+
+    # Corrutinas e hilos sobre la misma clave, y propagación del error
+    async def demo_async() -> None:
+        coalescedor = Coalescedor()
+        llamadas_reales = []
+
+        def lenta(x: str) -> str:
+            llamadas_reales.append(x)
+            time.sleep(0.1)
+            return x.upper()
+
+        def falla() -> str:
+            time.sleep(0.1)
+            raise RuntimeError("503 del servidor")
+
+        hilo = threading.Thread(target=lambda: coalescedor.compartir("k", lenta, "hola"))
+        hilo.start()
+        time.sleep(0.01)
+        resultados = await asyncio.gather(*(coalescedor.compartir_async("k", lenta, "hola") for _ in range(10)))
+        hilo.join()
+        print(f"async + hilo: {len(llamadas_reales)} llamada real, {sum(c for _, c in resultados)} compartidas")
+
+        errores = await asyncio.gather(*(coalescedor.compartir_async("e", falla) for _ in range(5)), return_exceptions=True)
+        print(f"error propagado a {sum(isinstance(e, RuntimeError) for e in errores)} de 5 esperas: {coalescedor.estadisticas()}")
+
+        # A la líder se le acaba su plazo: las demás no heredan su PlazoAgotado, toman el relevo
+        intentos = []
+
+        def con_plazo_corto() -> str:
+            intentos.append(1)
+            if len(intentos) == 1:
+                time.sleep(0.1)
+                raise PlazoAgotado("Plazo agotado esperando al modelo")
+            time.sleep(0.1)
+            return "respuesta"
+
+        resultados = await asyncio.gather(
+            *(coalescedor.compartir_async("p", con_plazo_corto) for _ in range(5)), return_exceptions=True
+        )
+        print(
+            f"plazo de la líder: {sum(isinstance(r, PlazoAgotado) for r in resultados)} PlazoAgotado, "
+            f"{sum(isinstance(r, tuple) for r in resultados)} respuestas "
+            f"con {len(intentos)} llamadas reales"
+        )
+
+    asyncio.run(demo_async())
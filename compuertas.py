@@ -0,0 +1,46 @@
+"""
+COMPUERTAS (gates) DE VALIDACIÓN
+
+Comprobaciones en Python entre pasos de un workflow. Pueden alimentarse con
+texto parcial mientras llega un stream y decidir antes de que termine.
+"""
+
+from typing import Optional
+
+
+class CompuertaPalabras:
+    """
+    Aprueba si el texto tiene al menos `minimo` palabras (y como mucho `maximo`).
+
+    Sin `maximo` (lo normal) no hay tope; es una opción explícita para quien
+    quiera rechazar textos demasiado largos.
+
+    actualizar() devuelve None mientras no se sabe, False en cuanto el
+    resultado ya es un rechazo seguro (solo con `maximo`: se puede abortar
+    el stream) y True cuando ya se cumplió el mínimo (el resultado solo
+    puede cambiar si luego se supera el máximo).
+    """
+
+    def __init__(self, minimo: int = 50, maximo: Optional[int] = None):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.palabras = 0
+
+    def actualizar(self, texto_parcial: str) -> Optional[bool]:
+        self.palabras = len(texto_parcial.split())
+        if self.maximo is not None and self.palabras > self.maximo:
+            return False
+        if self.palabras >= self.minimo:
+            return True
+        return None
+
+    def finalizar(self, texto: str) -> bool:
+        """Decisión definitiva con el texto completo"""
+        return bool(self.actualizar(texto))
+
+    def motivo(self) -> str:
+        if self.palabras < self.minimo:
+            return f"contenido muy corto ({self.palabras} < {self.minimo} palabras)"
+        if self.maximo is not None and self.palabras > self.maximo:
+            return f"contenido muy largo (más de {self.maximo} palabras)"
+        return "ok"
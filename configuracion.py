@@ -0,0 +1,41 @@
+"""
+CONFIGURACIÓN DEL ENTORNO
+
+El limitador, la caché, las trazas, la política de llamadas, la coalescencia,
+las cascadas y la elección de backend leen sus variables (LLM_RPM, LLM_CACHE,
+LLM_BACKEND...) al importarse. Este módulo carga `.env` una sola vez y todos
+ellos lo importan primero, así que da igual cuál se importe antes: lo que
+esté en `.env` vale igual que lo exportado en la terminal (que tiene
+prioridad si está en los dos sitios).
+"""
+
+import os
+import sys
+
+_cargado = False
+
+
+def cargar_entorno() -> None:
+    """Lee .env una vez, sin pisar variables ya definidas en el entorno"""
+    global _cargado
+    if _cargado:
+        return
+    _cargado = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        if os.path.exists(".env"):
+            print("⚠️ Hay un .env pero falta python-dotenv (pip install python-dotenv); se ignora", file=sys.stderr)
+        return
+    load_dotenv()
+
+
+cargar_entorno()
+
+
+if __name__ == "__main__":
+    # Variables que se usarán (las del .env incluidas)
+    for nombre, valor in sorted(os.environ.items()):
+        if nombre.startswith("LLM_"):
+            print(f"{nombre}={valor}")
+    print(f"GEMINI_API_KEY {'definida' if os.getenv('GEMINI_API_KEY') else 'sin definir'}")
@@ -0,0 +1,245 @@
+"""
+ENRUTADOR LOCAL (ruta rápida para el ROUTING)
+
+Clasificar una consulta en TECNICO / FACTURACION / GENERAL no necesita un
+viaje completo a Gemini en la mayoría de los casos. Este enrutador resuelve en
+microsegundos con dos niveles locales y solo pregunta al LLM cuando no está
+seguro:
+
+1. Reglas de palabras clave / regex.
+2. Un clasificador TF-IDF + centroides (lineal) entrenado con ejemplos semilla
+   y con las etiquetas que el LLM va devolviendo (se guardan en un JSONL).
+3. Si la confianza queda por debajo del umbral, se llama al LLM.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Optional
+
+from normalizacion import normalizar, tokenizar
+
+CATEGORIAS = ("TECNICO", "FACTURACION", "GENERAL")
+
+# Patrones sobre texto normalizado (minúsculas, sin tildes)
+REGLAS = {
+    "TECNICO": [
+        r"\berror(es)?\b", r"\bbug", r"\bfall(a|o|an)\b", r"\bse (cierra|cuelga|bloquea)",
+        r"\bno (funciona|carga|abre|arranca)", r"\bcontrasena\b", r"\binstal",
+        r"\bactualiz", r"\bapp\b", r"\bconex", r"\bpantalla\b",
+    ],
+    "FACTURACION": [
+        r"\bcobr", r"\bfactur", r"\bpag(o|os|ar|ue)\b", r"\breembols", r"\btarjeta\b",
+        r"\bcargo", r"\bprecio", r"\bsuscripcion", r"\bplan\b", r"\bdevolu",
+    ],
+    "GENERAL": [
+        r"\bhorario", r"\bdonde\b", r"\bubicacion", r"\bcontact", r"\binformacion\b",
+        r"\bquienes\b", r"\btelefono\b",
+    ],
+}
+
+EJEMPLOS_SEMILLA = [
+    ("Mi app se cierra al subir fotos", "TECNICO"),
+    ("La aplicación muestra un error al iniciar sesión", "TECNICO"),
+    ("No puedo restablecer mi contraseña", "TECNICO"),
+    ("La página no carga desde ayer", "TECNICO"),
+    ("¿Por qué me cobraron dos veces?", "FACTURACION"),
+    ("Quiero un reembolso de mi último pago", "FACTURACION"),
+    ("No encuentro la factura de marzo", "FACTURACION"),
+    ("¿Cómo cambio la tarjeta de mi suscripción?", "FACTURACION"),
+    ("¿Cuál es el horario de atención?", "GENERAL"),
+    ("¿Dónde están ubicadas sus oficinas?", "GENERAL"),
+    ("¿Tienen programa de afiliados?", "GENERAL"),
+    ("Quiero información sobre sus servicios", "GENERAL"),
+]
+
+
+class ClasificadorTfidf:
+    """TF-IDF + un centroide por clase; la predicción es la similitud coseno"""
+
+    def __init__(self):
+        self.idf: dict[str, float] = {}
+        self.centroides: dict[str, dict[str, float]] = {}
+
+    def _vector(self, texto: str) -> dict[str, float]:
+        tf = Counter(t for t in tokenizar(texto) if t in self.idf)
+        vector = {t: (1 + math.log(n)) * self.idf[t] for t, n in tf.items()}
+        norma = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {t: v / norma for t, v in vector.items()}
+
+    def entrenar(self, ejemplos: list[tuple[str, str]]) -> None:
+        documentos = [(set(tokenizar(texto)), etiqueta) for texto, etiqueta in ejemplos]
+        df = Counter(t for tokens, _ in documentos for t in tokens)
+        total = len(documentos)
+        self.idf = {t: math.log((1 + total) / (1 + n)) + 1 for t, n in df.items()}
+
+        sumas: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for texto, etiqueta in ejemplos:
+            for t, v in self._vector(texto).items():
+                sumas[etiqueta][t] += v
+        self.centroides = {}
+        for etiqueta, suma in sumas.items():
+            norma = math.sqrt(sum(v * v for v in suma.values())) or 1.0
+            self.centroides[etiqueta] = {t: v / norma for t, v in suma.items()}
+
+    def predecir(self, texto: str) -> tuple[Optional[str], float]:
+        """(etiqueta, confianza en [0, 1]); confianza 0 si no hay palabras conocidas"""
+        vector = self._vector(texto)
+        if not vector or not self.centroides:
+            return None, 0.0
+        similitudes = {
+            etiqueta: sum(v * centroide.get(t, 0.0) for t, v in vector.items())
+            for etiqueta, centroide in self.centroides.items()
+        }
+        # Softmax con temperatura baja para convertir similitudes en probabilidades
+        exps = {e: math.exp(10 * s) for e, s in similitudes.items()}
+        total = sum(exps.values())
+        mejor = max(exps, key=exps.get)
+        return mejor, exps[mejor] / total
+
+
+class EnrutadorLocal:
+    """Reglas -> modelo local -> LLM, con estadísticas de la ruta rápida"""
+
+    def __init__(
+        self,
+        umbral: float = 0.75,
+        registro: Optional[str] = "etiquetas_enrutador.jsonl",
+        reentrenar_cada: int = 20,
+    ):
+        self.umbral = umbral
+        self.registro = registro
+        self.reentrenar_cada = reentrenar_cada
+        self._reglas = {
+            categoria: [re.compile(p) for p in patrones]
+            for categoria, patrones in REGLAS.items()
+        }
+        self._modelo: Optional[ClasificadorTfidf] = None
+        self._ejemplos: list[tuple[str, str]] = []
+        self._nuevas = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "consultas": 0,
+            "reglas": 0,
+            "modelo_local": 0,
+            "llm": 0,
+            "tiempo_local": 0.0,
+            "tiempo_llm": 0.0,
+        }
+
+    def _cargar_ejemplos(self) -> list[tuple[str, str]]:
+        ejemplos = list(EJEMPLOS_SEMILLA)
+        if self.registro and os.path.exists(self.registro):
+            with open(self.registro, encoding="utf-8") as archivo:
+                for linea in archivo:
+                    try:
+                        fila = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue
+                    if fila.get("categoria") in CATEGORIAS:
+                        ejemplos.append((fila["consulta"], fila["categoria"]))
+        return ejemplos
+
+    def _modelo_entrenado(self) -> ClasificadorTfidf:
+        """Entrena el modelo la primera vez que se usa (no al importar)"""
+        if self._modelo is None:
+            self._ejemplos = self._cargar_ejemplos()
+            self._modelo = ClasificadorTfidf()
+            self._modelo.entrenar(self._ejemplos)
+        return self._modelo
+
+    def por_reglas(self, consulta: str) -> tuple[Optional[str], float]:
+        texto = normalizar(consulta)
+        aciertos = {
+            categoria: sum(1 for patron in patrones if patron.search(texto))
+            for categoria, patrones in self._reglas.items()
+        }
+        con_aciertos = [c for c, n in aciertos.items() if n]
+        if len(con_aciertos) != 1:
+            # Sin coincidencias o ambigua: que decida otro nivel
+            return None, 0.0
+        categoria = con_aciertos[0]
+        return categoria, 0.95 if aciertos[categoria] > 1 else 0.85
+
+    def clasificar_local(self, consulta: str) -> tuple[Optional[str], float, str]:
+        """(categoría, confianza, origen) usando solo los niveles locales"""
+        categoria, confianza = self.por_reglas(consulta)
+        if confianza >= self.umbral:
+            return categoria, confianza, "reglas"
+        with self._lock:
+            modelo = self._modelo_entrenado()
+        categoria, confianza = modelo.predecir(consulta)
+        return categoria, confianza, "modelo_local"
+
+    def clasificar(
+        self, consulta: str, clasificar_con_llm: Callable[[str], str]
+    ) -> tuple[str, str]:
+        """
+        Devuelve (categoría, origen). Solo llama a `clasificar_con_llm` si la
+        ruta rápida no alcanza el umbral de confianza.
+        """
+        inicio = time.perf_counter()
+        categoria, confianza, origen = self.clasificar_local(consulta)
+        tiempo_local = time.perf_counter() - inicio
+
+        with self._lock:
+            self._stats["consultas"] += 1
+            self._stats["tiempo_local"] += tiempo_local
+
+        if categoria is not None and confianza >= self.umbral:
+            with self._lock:
+                self._stats[origen] += 1
+            return categoria, origen
+
+        inicio = time.perf_counter()
+        categoria = clasificar_con_llm(consulta).strip().upper()
+        with self._lock:
+            self._stats["llm"] += 1
+            self._stats["tiempo_llm"] += time.perf_counter() - inicio
+
+        if categoria in CATEGORIAS:
+            self.registrar_etiqueta(consulta, categoria)
+        return categoria, "llm"
+
+    def registrar_etiqueta(self, consulta: str, categoria: str) -> None:
+        """Guarda la etiqueta del LLM y reentrena cada `reentrenar_cada` nuevas"""
+        if self.registro:
+            with open(self.registro, "a", encoding="utf-8") as archivo:
+                fila = {"consulta": consulta, "categoria": categoria}
+                archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        with self._lock:
+            self._ejemplos.append((consulta, categoria))
+            self._nuevas += 1
+            if self._modelo is not None and self._nuevas >= self.reentrenar_cada:
+                self._modelo.entrenar(self._ejemplos)
+                self._nuevas = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        rapidas = stats["reglas"] + stats["modelo_local"]
+        llm_promedio = stats["tiempo_llm"] / stats["llm"] if stats["llm"] else 0.0
+        stats["tasa_ruta_rapida"] = rapidas / stats["consultas"] if stats["consultas"] else 0.0
+        # Cada respuesta local evita, en promedio, una clasificación con el LLM
+        stats["tiempo_ahorrado_estimado"] = rapidas * llm_promedio
+        return stats
+
+
+if __name__ == "__main__":
+    enrutador = EnrutadorLocal(registro=None)
+    pruebas = [
+        "Mi app se cierra al subir fotos",
+        "¿Por qué me cobraron dos veces?",
+        "¿Cuál es el horario de atención?",
+        "Me aparece un mensaje raro en la pantalla de pago",
+        "¿Hacen envíos a Medellín?",
+    ]
+    for consulta in pruebas:
+        inicio = time.perf_counter()
+        categoria, confianza, origen = enrutador.clasificar_local(consulta)
+        micros = (time.perf_counter() - inicio) * 1e6
+        print(f"{consulta!r:55} -> {categoria} ({confianza:.2f}, {origen}, {micros:.0f} µs)")
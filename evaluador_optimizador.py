@@ -0,0 +1,292 @@
+"""
+EVALUATOR-OPTIMIZER ACOTADO
+
+El patrón "generar → evaluar → mejorar" repetido hasta alcanzar un puntaje,
+pero con frenos:
+
+- La evaluación se pide en JSON con esquema ({"puntuacion": 8, "sugerencia":
+  "..."}) y se valida y repara localmente (salida_estructurada); no hace
+  falta otra llamada para leer la nota.
+- Se para en cuanto se alcanza el umbral.
+- Se para si hay meseta: `paciencia` rondas seguidas sin mejorar.
+- Presupuesto máximo de tokens y de tiempo por tarea.
+- En cada ronda se generan varios candidatos a la vez (fan-out) y se queda
+  el mejor.
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from limitador import estimar_tokens
+from llamadas import generar
+from paralelizacion import ejecutar_en_paralelo
+from politica_llamadas import tiempo_restante
+from registro_modelos import obtener_modelo
+from salida_estructurada import ErrorEsquema, SalidaEstructurada, interpretar
+from trazas import traza
+
+PROMPT_GENERAR = "{tarea}"
+
+PROMPT_EVALUAR = """Evalúa de 1 a 10 este resultado para la tarea indicada.
+
+Tarea: {tarea}
+Criterios: {criterios}
+
+Resultado:
+{candidato}
+
+Responde SOLO con JSON: {{"puntuacion": <1-10>, "sugerencia": "<mejora concreta y breve>"}}"""
+
+PROMPT_MEJORAR = """Mejora este resultado siguiendo la sugerencia del evaluador.
+
+Tarea: {tarea}
+Resultado actual: {candidato}
+Sugerencia: {sugerencia}
+
+Devuelve solo el resultado mejorado, nada más."""
+
+# Para que los candidatos de una misma ronda no sean idénticos (ni compartan caché)
+VARIANTE = "\n\n(Propuesta {numero} de {total}: toma un enfoque distinto a las demás.)"
+
+
+@dataclass
+class Evaluacion:
+    puntuacion: float
+    sugerencia: str = ""
+
+
+_NOTA_TEXTO = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:/\s*10|de\s+10)|puntuaci[oó]n\D{0,5}(\d+(?:[.,]\d+)?)", re.I)
+
+
+def _acotar(evaluacion: Evaluacion) -> Evaluacion:
+    evaluacion.puntuacion = min(10.0, max(0.0, evaluacion.puntuacion))
+    return evaluacion
+
+
+def _nota_en_texto(texto: str) -> Optional[Evaluacion]:
+    """Último recurso si la respuesta ni siquiera se parece al JSON pedido: "7/10", "Puntuación: 7" """
+    coincidencia = _NOTA_TEXTO.search(texto)
+    if coincidencia:
+        nota = float((coincidencia.group(1) or coincidencia.group(2)).replace(",", "."))
+        return _acotar(Evaluacion(nota, texto.strip()))
+    return None
+
+
+def interpretar_evaluacion(texto: str, salida: Optional[SalidaEstructurada] = None) -> Optional[Evaluacion]:
+    """Lee la nota del JSON pedido (reparándolo si hace falta); si no hay JSON, busca "7/10"."""
+    if "{" in texto:
+        try:
+            evaluacion = salida.interpretar(texto) if salida else interpretar(texto, Evaluacion)[0]
+            return _acotar(evaluacion)
+        except ErrorEsquema:
+            pass
+    return _nota_en_texto(texto)
+
+
+@dataclass
+class Candidato:
+    texto: str
+    ronda: int
+    evaluacion: Optional[Evaluacion] = None
+
+    @property
+    def puntuacion(self) -> float:
+        return self.evaluacion.puntuacion if self.evaluacion else 0.0
+
+
+@dataclass
+class ResultadoOptimizacion:
+    mejor: Candidato
+    aceptado: bool
+    motivo: str  # "umbral", "meseta", "tokens", "tiempo" o "rondas"
+    rondas: int
+    llamadas: int
+    tokens: int
+    tiempo: float
+    historial: list[Candidato] = field(default_factory=list)
+
+
+class EvaluadorOptimizador:
+    """Bucle generar → evaluar → mejorar con parada temprana y presupuesto"""
+
+    def __init__(
+        self,
+        modelo: Any = None,
+        criterios: str = "claridad, atractivo y relevancia",
+        umbral: float = 8.0,
+        max_rondas: int = 4,
+        paciencia: int = 2,
+        candidatos: int = 2,
+        max_tokens: Optional[int] = None,
+        max_tiempo: Optional[float] = None,
+    ):
+        self.modelo = modelo
+        self.criterios = criterios
+        self.umbral = umbral
+        self.max_rondas = max_rondas
+        self.paciencia = paciencia
+        self.candidatos = candidatos
+        self.max_tokens = max_tokens
+        self.max_tiempo = max_tiempo
+        self.salida = SalidaEstructurada(Evaluacion)
+        self.stats = {"tareas": 0, "aceptadas": 0, "llamadas": 0, "tokens": 0}
+        self._lock = threading.Lock()
+
+    # --- llamadas al modelo ---
+
+    def _llamar(self, prompt: str, contador: dict, **kwargs) -> str:
+        respuesta = generar(self.modelo or obtener_modelo(), prompt, **kwargs)
+        uso = getattr(respuesta, "usage_metadata", None)
+        tokens = getattr(uso, "total_token_count", None)
+        if tokens is None and not getattr(respuesta, "desde_cache", False):
+            tokens = estimar_tokens(prompt) + estimar_tokens(respuesta.text)
+        with self._lock:
+            contador["llamadas"] += 1
+            contador["tokens"] += tokens or 0
+        return respuesta.text.strip()
+
+    def _evaluar(self, tarea: str, texto: str, contador: dict) -> Optional[Evaluacion]:
+        crudo = self._llamar(
+            PROMPT_EVALUAR.format(tarea=tarea, criterios=self.criterios, candidato=texto),
+            contador,
+            generation_config=self.salida.configuracion(),
+        )
+        return interpretar_evaluacion(crudo, self.salida)
+
+    def _ronda(self, prompts: list[str], tarea: str, ronda: int, contador: dict, timeout) -> list[Candidato]:
+        """Genera y evalúa los candidatos de una ronda, todos en paralelo"""
+
+        def _candidato(prompt: str) -> Candidato:
+            texto = self._llamar(prompt, contador)
+            return Candidato(texto, ronda, self._evaluar(tarea, texto, contador))
+
+        ramas = [(f"candidato {i + 1}", lambda p=p: _candidato(p)) for i, p in enumerate(prompts)]
+        return [r.valor for r in ejecutar_en_paralelo(ramas, timeout=timeout) if r.ok]
+
+    def _variantes(self, prompt: str) -> list[str]:
+        if self.candidatos == 1:
+            return [prompt]
+        return [prompt + VARIANTE.format(numero=i + 1, total=self.candidatos) for i in range(self.candidatos)]
+
+    # --- bucle principal ---
+
+    def optimizar(self, tarea: str) -> ResultadoOptimizacion:
+        inicio = time.perf_counter()
+        contador = {"llamadas": 0, "tokens": 0}
+        historial: list[Candidato] = []
+        mejor: Optional[Candidato] = None
+        sin_mejora, tokens_ronda, motivo, ronda = 0, 0, "rondas", 0
+
+        def restante() -> Optional[float]:
+            # Lo que quede del presupuesto propio o del plazo del flujo, lo que acabe antes
+            propio = None if self.max_tiempo is None else self.max_tiempo - (time.perf_counter() - inicio)
+            limites = [t for t in (propio, tiempo_restante()) if t is not None]
+            return min(limites) if limites else None
+
+        with traza("Evaluador-optimizador", umbral=self.umbral, candidatos=self.candidatos) as span:
+            for ronda in range(1, self.max_rondas + 1):
+                # Presupuesto: no empezar una ronda que previsiblemente no cabe
+                if self.max_tokens is not None and contador["tokens"] + tokens_ronda > self.max_tokens:
+                    motivo = "tokens"
+                    break
+                if restante() is not None and restante() <= 0:
+                    motivo = "tiempo"
+                    break
+
+                if mejor is None:
+                    prompts = self._variantes(PROMPT_GENERAR.format(tarea=tarea))
+                else:
+                    prompts = self._variantes(PROMPT_MEJORAR.format(
+                        tarea=tarea,
+                        candidato=mejor.texto,
+                        sugerencia=mejor.evaluacion.sugerencia if mejor.evaluacion else "",
+                    ))
+
+                tokens_antes = contador["tokens"]
+                with traza(f"Ronda {ronda}"):
+                    nuevos = self._ronda(prompts, tarea, ronda, contador, restante())
+                tokens_ronda = contador["tokens"] - tokens_antes
+                historial.extend(nuevos)
+
+                mejor_ronda = max(nuevos, key=lambda c: c.puntuacion, default=None)
+                if mejor_ronda is not None and (mejor is None or mejor_ronda.puntuacion > mejor.puntuacion):
+                    mejor, sin_mejora = mejor_ronda, 0
+                else:
+                    sin_mejora += 1
+
+                if mejor is not None and mejor.puntuacion >= self.umbral:
+                    motivo = "umbral"
+                    break
+                if sin_mejora >= self.paciencia:
+                    motivo = "meseta"
+                    break
+
+            aceptado = mejor is not None and mejor.puntuacion >= self.umbral
+            span.fijar(rondas=ronda, motivo=motivo, aceptado=aceptado, puntuacion=mejor and mejor.puntuacion)
+
+        with self._lock:
+            self.stats["tareas"] += 1
+            self.stats["aceptadas"] += int(aceptado)
+            self.stats["llamadas"] += contador["llamadas"]
+            self.stats["tokens"] += contador["tokens"]
+
+        return ResultadoOptimizacion(
+            mejor=mejor or Candidato("", 0),
+            aceptado=aceptado,
+            motivo=motivo,
+            rondas=ronda,
+            llamadas=contador["llamadas"],
+            tokens=contador["tokens"],
+            tiempo=time.perf_counter() - inicio,
+            historial=historial,
+        )
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["llamadas_por_aceptado"] = (
+            stats["llamadas"] / stats["aceptadas"] if stats["aceptadas"] else None
+        )
+        stats["tasa_aceptacion"] = stats["aceptadas"] / stats["tareas"] if stats["tareas"] else 0.0
+        stats["evaluaciones_reparadas"] = self.salida.estadisticas()["reparadas"]
+        return stats
+
+
+if __name__ == "__main__":
+    # Backend simulado: las propuestas mejoran con cada ronda hasta estancarse
+    import json
+    import random
+
+    from backends import BackendMock, latencia_constante, usar_backend
+    from limitador import LIMITADOR
+
+    azar = random.Random(1)
+
+    def responder(prompt: str, modelo) -> str:
+        if prompt.startswith("Evalúa"):
+            nivel = prompt.count("mejorado")
+            nota = min(9, 5 + 2 * nivel + azar.choice([0, 0, 1]))
+            return json.dumps({"puntuacion": nota, "sugerencia": "más concreto"})
+        if prompt.startswith("Mejora"):
+            actual = prompt.split("Resultado actual: ")[1].split("\n")[0]
+            return f"{actual} mejorado"
+        return "Título inicial"
+
+    usar_backend(BackendMock(respuestas=responder, latencia=latencia_constante(0.05)))
+    LIMITADOR.configurar(rpm=100000)
+
+    for candidatos in (1, 3):
+        motor = EvaluadorOptimizador(umbral=8, candidatos=candidatos, max_rondas=5)
+        inicio = time.perf_counter()
+        for i in range(10):
+            r = motor.optimizar(f"Crea un título para un artículo sobre el tema {i}")
+        stats = motor.estadisticas()
+        print(
+            f"{candidatos} candidato(s)/ronda: {stats['tasa_aceptacion']:.0%} aceptados, "
+            f"{stats['llamadas_por_aceptado']:.1f} llamadas por resultado aceptado, "
+            f"{(time.perf_counter() - inicio) / 10:.2f}s por tarea"
+        )
+    print(f"Última: '{r.mejor.texto}' ({r.mejor.puntuacion}) tras {r.rondas} rondas, motivo: {r.motivo}")
@@ -0,0 +1,179 @@
+"""
+EVALUADOR ARITMÉTICO SEGURO
+
+Las herramientas `calculadora` y `calcular` reciben expresiones escritas por
+el modelo. Pasarlas a eval() permite ejecutar cualquier código, y además se
+vuelve a analizar el mismo texto en cada llamada. Este evaluador:
+
+- Solo acepta números, operadores aritméticos y unas pocas funciones.
+- Analiza cada expresión una vez y guarda el árbol compilado en una LRU.
+- Limita el número de nodos, el tamaño de los exponentes y de los enteros,
+  para que algo como 9**9**9 no bloquee un hilo.
+- Los errores de las funciones (sqrt(-1), log(0), max()) salen como
+  ExpresionNoPermitida, así que las herramientas siempre devuelven un dict.
+"""
+
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Callable, Union
+
+Numero = Union[int, float]
+
+MAX_LONGITUD = 500
+MAX_NODOS = 100
+MAX_EXPONENTE = 10_000
+MAX_BITS = 4096
+
+FUNCIONES = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "raiz": math.sqrt,
+    "log": math.log,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+}
+CONSTANTES = {"pi": math.pi, "e": math.e}
+
+_BINARIOS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+_UNARIOS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+class ExpresionNoPermitida(ValueError):
+    """La expresión usa algo fuera de la lista blanca o supera los límites"""
+
+
+def _comprobar_tamano(valor: Numero) -> Numero:
+    if isinstance(valor, int) and valor.bit_length() > MAX_BITS:
+        raise ExpresionNoPermitida("resultado demasiado grande")
+    return valor
+
+
+def _potencia(base: Numero, exponente: Numero) -> Numero:
+    if abs(exponente) > MAX_EXPONENTE:
+        raise ExpresionNoPermitida(f"exponente mayor que {MAX_EXPONENTE}")
+    if isinstance(base, int) and isinstance(exponente, int) and exponente > 0:
+        # Estimar los bits del resultado antes de calcularlo
+        if base.bit_length() * exponente > MAX_BITS:
+            raise ExpresionNoPermitida("resultado demasiado grande")
+    return base**exponente
+
+
+def _llamar(nombre: str, funcion: Callable[..., Numero], argumentos: list[Numero]) -> Numero:
+    """sqrt(-1), log(0), max() o abs(1, 2) son errores de la expresión, no del programa"""
+    try:
+        return funcion(*argumentos)
+    except (ValueError, TypeError) as e:
+        raise ExpresionNoPermitida(f"{nombre}(): {e}") from None
+
+
+def _compilar_nodo(nodo: ast.AST) -> Callable[[], Numero]:
+    """Convierte el AST ya validado en un árbol de funciones sin argumentos"""
+    if isinstance(nodo, ast.Expression):
+        return _compilar_nodo(nodo.body)
+
+    if isinstance(nodo, ast.Constant):
+        if isinstance(nodo.value, bool) or not isinstance(nodo.value, (int, float)):
+            raise ExpresionNoPermitida(f"constante no numérica: {nodo.value!r}")
+        valor = nodo.value
+        return lambda: valor
+
+    if isinstance(nodo, ast.Name):
+        if nodo.id not in CONSTANTES:
+            raise ExpresionNoPermitida(f"nombre no permitido: {nodo.id}")
+        valor = CONSTANTES[nodo.id]
+        return lambda: valor
+
+    if isinstance(nodo, ast.BinOp):
+        izquierda, derecha = _compilar_nodo(nodo.left), _compilar_nodo(nodo.right)
+        if isinstance(nodo.op, ast.Pow):
+            return lambda: _potencia(izquierda(), derecha())
+        operacion = _BINARIOS.get(type(nodo.op))
+        if operacion is None:
+            raise ExpresionNoPermitida(f"operador no permitido: {type(nodo.op).__name__}")
+        return lambda: _comprobar_tamano(operacion(izquierda(), derecha()))
+
+    if isinstance(nodo, ast.UnaryOp):
+        operando = _compilar_nodo(nodo.operand)
+        operacion = _UNARIOS.get(type(nodo.op))
+        if operacion is None:
+            raise ExpresionNoPermitida(f"operador no permitido: {type(nodo.op).__name__}")
+        return lambda: operacion(operando())
+
+    if isinstance(nodo, ast.Call):
+        if not isinstance(nodo.func, ast.Name) or nodo.func.id not in FUNCIONES:
+            raise ExpresionNoPermitida("función no permitida")
+        if nodo.keywords:
+            raise ExpresionNoPermitida("argumentos con nombre no permitidos")
+        nombre, funcion = nodo.func.id, FUNCIONES[nodo.func.id]
+        argumentos = [_compilar_nodo(a) for a in nodo.args]
+        return lambda: _llamar(nombre, funcion, [a() for a in argumentos])
+
+    raise ExpresionNoPermitida(f"elemento no permitido: {type(nodo).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compilar(expresion: str) -> Callable[[], Numero]:
+    """Analiza y valida la expresión una sola vez (resultado en caché LRU)"""
+    if len(expresion) > MAX_LONGITUD:
+        raise ExpresionNoPermitida(f"expresión de más de {MAX_LONGITUD} caracteres")
+    try:
+        arbol = ast.parse(expresion.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ExpresionNoPermitida(f"sintaxis inválida: {e.msg}") from None
+    nodos = sum(1 for _ in ast.walk(arbol))
+    if nodos > MAX_NODOS:
+        raise ExpresionNoPermitida(f"expresión con más de {MAX_NODOS} nodos")
+    return _compilar_nodo(arbol)
+
+
+def evaluar(expresion: str) -> Numero:
+    """Evalúa una expresión aritmética de forma segura"""
+    return compilar(expresion)()
+
+
+if __name__ == "__main__":
+    # Benchmark: eval() frente al evaluador compilado con caché
+    import timeit
+
+    corpus = [
+        "15 + 8 * 12",
+        "299792 * 0.621371",
+        "(22 + 25 + 28 + 31 + 29 + 26 + 24) / 7",
+        "384400 / 299792",
+        "2 ** 10",
+        "round(100 * 0.15, 2)",
+        "sqrt(144) + abs(-3)",
+        "(5500 * 9 / 5) + 32",
+    ]
+    repeticiones = 20_000
+
+    for expresion in corpus:
+        assert evaluar(expresion) == eval(expresion, {"__builtins__": {}}, {**FUNCIONES})
+
+    t_eval = timeit.timeit(
+        lambda: [eval(e, {"__builtins__": {}}, FUNCIONES) for e in corpus], number=repeticiones
+    )
+    t_seguro = timeit.timeit(lambda: [evaluar(e) for e in corpus], number=repeticiones)
+    por_expresion = repeticiones * len(corpus)
+    print(f"eval():             {t_eval / por_expresion * 1e6:6.2f} µs/expresión")
+    print(f"evaluador_seguro:   {t_seguro / por_expresion * 1e6:6.2f} µs/expresión")
+    print(f"Caché: {compilar.cache_info()}")
+
+    for peligrosa in ["9**9**9", "__import__('os').system('ls')", "().__class__", "10**100000", "sqrt(-1)", "max()"]:
+        try:
+            evaluar(peligrosa)
+        except ExpresionNoPermitida as e:
+            print(f"Rechazada {peligrosa!r}: {e}")
@@ -0,0 +1,355 @@
+"""
+FLUJOS COMO GRAFO (DAG) CON ETAPAS EN TUBERÍA
+
+El PROMPT CHAINING escrito a mano procesa una entrada de principio a fin
+antes de empezar la siguiente: 10 000 artículos son 10 000 cadenas en serie.
+Aquí cada paso (llamada al LLM, compuerta en Python, herramienta) es un nodo
+de un grafo y muchas entradas fluyen por él a la vez:
+
+- Cada etapa tiene sus propios hilos (`concurrencia`) y una cola acotada
+  (`capacidad`). Mientras el elemento i se traduce, el i+1 ya se genera.
+- Contrapresión: si una etapa se atasca, su cola se llena y la etapa
+  anterior espera en lugar de acumular trabajo sin límite; además hay un
+  máximo de elementos en vuelo.
+- Un nodo recibe la entrada (si no tiene dependencias) o los resultados de
+  sus dependencias, en orden. Lanzar Detener corta el elemento (compuerta).
+- Métricas por etapa: procesados, rendimiento, espera en cola, tiempo de
+  servicio y tiempo bloqueado por contrapresión.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+from trazas import traza
+
+
+class Detener(Exception):
+    """Lanzada por un nodo para terminar el elemento sin que cuente como error"""
+
+
+@dataclass
+class Nodo:
+    nombre: str
+    funcion: Callable[..., Any]
+    dependencias: tuple[str, ...] = ()
+    concurrencia: int = 1
+    capacidad: int = 16
+
+
+@dataclass
+class ResultadoElemento:
+    indice: int
+    entrada: Any
+    resultados: dict[str, Any] = field(default_factory=dict)
+    error: Optional[BaseException] = None
+    detenido_en: Optional[str] = None
+    motivo: Optional[str] = None
+    latencia: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.detenido_en is None
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class _MetricasEtapa:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.procesados = 0
+        self.errores = 0
+        self.detenidos = 0
+        self.esperas: list[float] = []
+        self.servicio = 0.0
+        self.bloqueado = 0.0
+        self.cola_max = 0
+        self.primero: Optional[float] = None
+        self.ultimo: Optional[float] = None
+
+    def resumen(self) -> dict:
+        with self.lock:
+            ventana = (self.ultimo - self.primero) if self.primero is not None else 0.0
+            return {
+                "procesados": self.procesados,
+                "errores": self.errores,
+                "detenidos": self.detenidos,
+                "rendimiento": self.procesados / ventana if ventana > 0 else 0.0,
+                "espera_cola_media": sum(self.esperas) / len(self.esperas) if self.esperas else 0.0,
+                "espera_cola_p95": _percentil(self.esperas, 0.95),
+                "servicio_medio": self.servicio / self.procesados if self.procesados else 0.0,
+                "tiempo_bloqueado": self.bloqueado,
+                "cola_max": self.cola_max,
+            }
+
+
+class _Elemento:
+    def __init__(self, indice: int, entrada: Any, dependencias: dict[str, int]):
+        self.resultado = ResultadoElemento(indice, entrada)
+        self.inicio = time.perf_counter()
+        self.faltan = dict(dependencias)  # dependencias sin resolver por nodo
+        self.en_vuelo = 0
+        self.lock = threading.Lock()
+
+    @property
+    def terminado(self) -> bool:
+        return self.resultado.error is not None or self.resultado.detenido_en is not None
+
+
+class FlujoDAG:
+    """Grafo de pasos por el que fluyen muchas entradas a la vez"""
+
+    def __init__(self, max_en_vuelo: int = 64):
+        self.nodos: dict[str, Nodo] = {}
+        self.max_en_vuelo = max_en_vuelo
+        self._metricas: dict[str, _MetricasEtapa] = {}
+
+    def nodo(
+        self,
+        nombre: str,
+        funcion: Optional[Callable[..., Any]] = None,
+        depende_de: Sequence[str] = (),
+        concurrencia: int = 1,
+        capacidad: int = 16,
+    ):
+        """Declara un paso; sin `funcion` se usa como decorador"""
+
+        def _registrar(f: Callable[..., Any]) -> Callable[..., Any]:
+            if nombre in self.nodos:
+                raise ValueError(f"Nodo repetido: {nombre}")
+            faltan = [d for d in depende_de if d not in self.nodos]
+            if faltan:
+                # Declarar en orden topológico también descarta ciclos
+                raise ValueError(f"{nombre} depende de nodos no declarados: {faltan}")
+            self.nodos[nombre] = Nodo(nombre, f, tuple(depende_de), max(1, concurrencia), max(1, capacidad))
+            return f
+
+        return _registrar(funcion) if funcion is not None else _registrar
+
+    def _sucesores(self) -> dict[str, list[str]]:
+        sucesores: dict[str, list[str]] = {n: [] for n in self.nodos}
+        for nodo in self.nodos.values():
+            for dependencia in nodo.dependencias:
+                sucesores[dependencia].append(nodo.nombre)
+        return sucesores
+
+    def procesar(self, entradas: Iterable[Any], ordenado: bool = False) -> Iterator[ResultadoElemento]:
+        """
+        Hace pasar todas las entradas por el grafo y entrega cada resultado al
+        terminar su elemento (en orden de llegada, o de entrada con `ordenado`).
+        Si el iterable de entradas falla, se entregan primero los elementos que
+        ya estaban dentro y después se relanza su excepción.
+        """
+        if not self.nodos:
+            raise ValueError("El flujo no tiene nodos")
+        sucesores = self._sucesores()
+        raices = [n for n, nodo in self.nodos.items() if not nodo.dependencias]
+        dependencias = {n: len(nodo.dependencias) for n, nodo in self.nodos.items()}
+        colas = {n: queue.Queue(maxsize=nodo.capacidad) for n, nodo in self.nodos.items()}
+        salida: queue.Queue = queue.Queue()
+        cupo = threading.Semaphore(self.max_en_vuelo)
+        cancelado = threading.Event()
+        self._metricas = {n: _MetricasEtapa() for n in self.nodos}
+
+        def _encolar(nombre: str, elemento: _Elemento, metricas: Optional[_MetricasEtapa]) -> None:
+            with elemento.lock:
+                elemento.en_vuelo += 1
+            inicio = time.perf_counter()
+            colas[nombre].put((elemento, time.perf_counter()))  # bloquea si la etapa va saturada
+            if metricas is not None:
+                with metricas.lock:
+                    metricas.bloqueado += time.perf_counter() - inicio
+            destino = self._metricas[nombre]
+            with destino.lock:
+                destino.cola_max = max(destino.cola_max, colas[nombre].qsize())
+
+        def _liberar(elemento: _Elemento) -> None:
+            with elemento.lock:
+                elemento.en_vuelo -= 1
+                listo = elemento.en_vuelo == 0
+            if listo:
+                elemento.resultado.latencia = time.perf_counter() - elemento.inicio
+                salida.put(elemento.resultado)
+                cupo.release()
+
+        def _trabajador(nombre: str) -> None:
+            nodo, metricas = self.nodos[nombre], self._metricas[nombre]
+            while True:
+                tarea = colas[nombre].get()
+                if tarea is None:
+                    return
+                elemento, encolado = tarea
+                comienzo = time.perf_counter()
+                resultado = elemento.resultado
+                if not elemento.terminado and not cancelado.is_set():
+                    argumentos = [resultado.resultados[d] for d in nodo.dependencias] or [resultado.entrada]
+                    error = detenido = None
+                    try:
+                        with traza(f"etapa: {nombre}", elemento=resultado.indice):
+                            valor = nodo.funcion(*argumentos)
+                    except Detener as e:
+                        detenido = e
+                    except Exception as e:
+                        error = e
+                    fin = time.perf_counter()
+                    with metricas.lock:
+                        metricas.procesados += 1
+                        metricas.errores += error is not None
+                        metricas.detenidos += detenido is not None
+                        metricas.esperas.append(comienzo - encolado)
+                        metricas.servicio += fin - comienzo
+                        metricas.primero = comienzo if metricas.primero is None else min(metricas.primero, comienzo)
+                        metricas.ultimo = fin if metricas.ultimo is None else max(metricas.ultimo, fin)
+                    with elemento.lock:
+                        if error is not None and resultado.error is None:
+                            resultado.error = error
+                            resultado.motivo = f"{nombre}: {type(error).__name__}: {error}"
+                        elif detenido is not None and not elemento.terminado:
+                            resultado.detenido_en, resultado.motivo = nombre, str(detenido) or None
+                        elif error is None and detenido is None:
+                            resultado.resultados[nombre] = valor
+                        listos = []
+                        if not elemento.terminado:
+                            for sucesor in sucesores[nombre]:
+                                elemento.faltan[sucesor] -= 1
+                                if elemento.faltan[sucesor] == 0:
+                                    listos.append(sucesor)
+                    for sucesor in listos:
+                        _encolar(sucesor, elemento, metricas)
+                _liberar(elemento)
+
+        def _alimentar() -> None:
+            total, error = 0, None
+            try:
+                for indice, entrada in enumerate(entradas):
+                    cupo.acquire()
+                    if cancelado.is_set():
+                        break
+                    elemento = _Elemento(indice, entrada, dependencias)
+                    # El propio alimentador cuenta como "en vuelo" hasta repartir en todas las raíces
+                    with elemento.lock:
+                        elemento.en_vuelo += 1
+                    for raiz in raices:
+                        _encolar(raiz, elemento, None)
+                    _liberar(elemento)
+                    total += 1
+            except BaseException as e:
+                error = e
+            finally:
+                salida.put(("fin", total, error))
+
+        # Cada hilo hereda el contexto de quien llama (span de traza actual, etc.)
+        hilos = [
+            threading.Thread(target=contextvars.copy_context().run, args=(_trabajador, nombre), daemon=True)
+            for nombre, nodo in self.nodos.items()
+            for _ in range(nodo.concurrencia)
+        ]
+        hilos.append(threading.Thread(target=contextvars.copy_context().run, args=(_alimentar,), daemon=True))
+        for hilo in hilos:
+            hilo.start()
+
+        entregados, total, siguiente, pendientes = 0, None, 0, {}
+        error_entradas = None
+        try:
+            while total is None or entregados < total:
+                item = salida.get()
+                if isinstance(item, tuple):
+                    _, total, error_entradas = item
+                    continue
+                entregados += 1
+                if not ordenado:
+                    yield item
+                    continue
+                pendientes[item.indice] = item
+                while siguiente in pendientes:
+                    yield pendientes.pop(siguiente)
+                    siguiente += 1
+            if error_entradas is not None:
+                raise error_entradas
+        finally:
+            # También si quien consume corta el generador: los elementos en
+            # vuelo se descartan y los hilos terminan al vaciar las colas
+            cancelado.set()
+            cupo.release()
+            for nombre, nodo in self.nodos.items():
+                for _ in range(nodo.concurrencia):
+                    colas[nombre].put(None)
+
+    def ejecutar(self, entradas: Iterable[Any]) -> list[ResultadoElemento]:
+        """Todos los resultados, en el orden de las entradas"""
+        return list(self.procesar(entradas, ordenado=True))
+
+    def estadisticas(self) -> dict[str, dict]:
+        """Métricas por etapa de la última ejecución"""
+        return {nombre: metricas.resumen() for nombre, metricas in self._metricas.items()}
+
+
+def imprimir_etapas(flujo: FlujoDAG) -> None:
+    print(f"  {'etapa':<12} {'hechos':>6} {'elem/s':>7} {'cola media':>10} {'cola p95':>9} {'servicio':>9} {'bloqueado':>9}")
+    for nombre, s in flujo.estadisticas().items():
+        print(
+            f"  {nombre:<12} {s['procesados']:>6} {s['rendimiento']:>7.1f} "
+            f"{s['espera_cola_media']:>9.3f}s {s['espera_cola_p95']:>8.3f}s "
+            f"{s['servicio_medio']:>8.3f}s {s['tiempo_bloqueado']:>8.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    # Generar → validar → traducir para 200 temas contra el backend simulado
+    from backends import BackendMock, latencia_constante, usar_backend
+    from compuertas import CompuertaPalabras
+    from limitador import LIMITADOR
+    from llamadas import generar
+    from registro_modelos import obtener_modelo
+
+    def responder(prompt: str, modelo) -> str:
+        if prompt.startswith("Traduce"):
+            return "Recycling matters. " * 30
+        largo = 10 if "tema 7" in prompt else 60  # algunos no pasan la compuerta
+        return "Reciclar importa. " * largo
+
+    usar_backend(BackendMock(respuestas=responder, latencia=latencia_constante(0.1)))
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+    modelo = obtener_modelo()
+    temas = [f"Escribe 3 párrafos sobre reciclar (tema {i})" for i in range(200)]
+
+    def generar_texto(tema: str) -> str:
+        return generar(modelo, tema, usar_cache=False).text
+
+    def validar(texto: str) -> str:
+        compuerta = CompuertaPalabras(minimo=50)
+        if not compuerta.finalizar(texto):
+            raise Detener(compuerta.motivo())
+        return texto
+
+    def traducir(texto: str) -> str:
+        return generar(modelo, f"Traduce al inglés:\n\n{texto}", usar_cache=False).text
+
+    inicio = time.perf_counter()
+    for tema in temas[:20]:
+        try:
+            traducir(validar(generar_texto(tema)))
+        except Detener:
+            pass
+    serie = (time.perf_counter() - inicio) / 20
+    print(f"En serie: {serie:.2f}s por artículo → {len(temas) * serie:.0f}s para {len(temas)}")
+
+    flujo = FlujoDAG(max_en_vuelo=64)
+    flujo.nodo("generar", generar_texto, concurrencia=8)
+    flujo.nodo("validar", validar, depende_de=["generar"])
+    flujo.nodo("traducir", traducir, depende_de=["validar"], concurrencia=8)
+
+    inicio = time.perf_counter()
+    resultados = flujo.ejecutar(temas)
+    total = time.perf_counter() - inicio
+    detenidos = sum(r.detenido_en is not None for r in resultados)
+    print(f"Con el DAG: {total:.1f}s para {len(temas)} ({len(temas) / total:.0f} art/s), {detenidos} detenidos por la compuerta")
+    imprimir_etapas(flujo)
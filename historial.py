@@ -0,0 +1,292 @@
+"""
+HISTORIAL ACOTADO PARA CHATS LARGOS
+
+Cada send_message reenvía todo chat.history: sin límite, el coste y la
+latencia por turno crecen con la conversación. GestorHistorial compacta el
+historial antes de cada envío:
+
+- Agrupa por turnos: un turno empieza con un mensaje de texto del usuario e
+  incluye las function_call del modelo y sus function_response, que así nunca
+  se separan.
+- Si el historial pasa del presupuesto de tokens, los turnos más antiguos se
+  resumen (con la función `resumir`, normalmente una llamada al LLM) o se
+  descartan, hasta bajar a `objetivo`. El margen entre ambos evita resumir en
+  cada turno.
+- Los turnos recientes se conservan siempre completos.
+- Una sesión de agente es un solo turno (la tarea y todas sus llamadas a
+  herramientas). Si el turno actual sigue sin caber, sus pasos antiguos
+  (function_call + function_response) se resumen dentro del propio turno,
+  detrás del mensaje inicial; los últimos `pasos_recientes` quedan intactos.
+
+Un gestor por chat: `gestor.nueva_sesion()` da otro con la misma
+configuración cuyas estadísticas se suman también en el original.
+
+Uso: enviar_mensaje(chat, mensaje, historial=gestor.nueva_sesion()).
+"""
+
+import json
+import threading
+from typing import Any, Callable, Optional
+
+from limitador import estimar_tokens
+
+PROMPT_RESUMEN = """Resume esta conversación en pocas frases. Conserva datos, cifras,
+decisiones y resultados de herramientas que puedan hacer falta después.
+
+{conversacion}"""
+
+PREFIJO_RESUMEN = "Resumen de la conversación anterior:\n"
+PREFIJO_PASOS = "\n\nPasos ya hechos en esta tarea:\n"
+
+
+def _texto_parte(parte: Any) -> str:
+    if getattr(parte, "text", None):
+        return parte.text
+    llamada = getattr(parte, "function_call", None)
+    if llamada:
+        args = dict(llamada.args) if llamada.args else {}
+        return f"[{llamada.name}({json.dumps(args, ensure_ascii=False, default=str)})]"
+    respuesta = getattr(parte, "function_response", None)
+    if respuesta:
+        datos = dict(respuesta.response) if respuesta.response else {}
+        return f"[{respuesta.name} → {json.dumps(datos, ensure_ascii=False, default=str)}]"
+    return ""
+
+
+def texto_contenido(contenido: Any) -> str:
+    return " ".join(filter(None, (_texto_parte(p) for p in contenido.parts)))
+
+
+def _inicia_turno(contenido: Any) -> bool:
+    """Un mensaje del usuario con texto (no una respuesta de herramienta)"""
+    return contenido.role == "user" and any(getattr(p, "text", None) for p in contenido.parts)
+
+
+def agrupar_turnos(historial: list) -> list[list]:
+    turnos: list[list] = []
+    for contenido in historial:
+        if not turnos or _inicia_turno(contenido):
+            turnos.append([])
+        turnos[-1].append(contenido)
+    return turnos
+
+
+def agrupar_pasos(turno: list) -> tuple[list, list[list]]:
+    """(inicio, pasos): cada paso es un mensaje del modelo y las respuestas de herramientas que le siguen"""
+    inicio: list = []
+    pasos: list[list] = []
+    for contenido in turno:
+        if contenido.role == "model":
+            pasos.append([contenido])
+        elif pasos:
+            pasos[-1].append(contenido)
+        else:
+            inicio.append(contenido)
+    return inicio, pasos
+
+
+def tokens_turno(turno: list) -> int:
+    return sum(estimar_tokens(texto_contenido(c)) for c in turno)
+
+
+def _nuevo_contenido(referencia: Any, role: str, texto: str) -> Any:
+    """Un contenido de texto del mismo tipo que los del historial (proto de Gemini o del mock)"""
+    tipo_parte = type(referencia.parts[0])
+    return type(referencia)(role=role, parts=[tipo_parte(text=texto)])
+
+
+def resumen_con_llm(modelo: Any = None) -> Callable[[str], str]:
+    """Función `resumir` que usa el modelo (por defecto, el modelo base)"""
+
+    def _resumir(conversacion: str) -> str:
+        from llamadas import generar
+        from registro_modelos import obtener_modelo
+
+        respuesta = generar(modelo or obtener_modelo(), PROMPT_RESUMEN.format(conversacion=conversacion))
+        return respuesta.text.strip()
+
+    return _resumir
+
+
+class GestorHistorial:
+    """Mantiene chat.history por debajo de un presupuesto de tokens"""
+
+    def __init__(
+        self,
+        presupuesto: int = 4000,
+        objetivo: Optional[int] = None,
+        turnos_recientes: int = 4,
+        resumir: Optional[Callable[[str], str]] = None,
+        pasos_recientes: int = 2,
+        _origen: Optional["GestorHistorial"] = None,
+    ):
+        self.presupuesto = presupuesto
+        self.objetivo = objetivo if objetivo is not None else int(presupuesto * 0.6)
+        self.turnos_recientes = max(1, turnos_recientes)
+        self.pasos_recientes = max(1, pasos_recientes)
+        self.resumir = resumir
+        self._origen = _origen
+        self._lock = threading.Lock()
+        self.ultimo_envio = 0  # tokens de historial reenviados en el último envío de esta sesión
+        self.stats = {
+            "compactaciones": 0,
+            "turnos_resumidos": 0,
+            "turnos_descartados": 0,
+            "pasos_resumidos": 0,
+            "tokens_liberados": 0,
+        }
+
+    def nueva_sesion(self) -> "GestorHistorial":
+        """Gestor para un chat nuevo: misma configuración, estadísticas sumadas aquí"""
+        return GestorHistorial(
+            self.presupuesto,
+            self.objetivo,
+            self.turnos_recientes,
+            self.resumir,
+            self.pasos_recientes,
+            _origen=self,
+        )
+
+    def _sumar(self, **cantidades: int) -> None:
+        with self._lock:
+            for clave, cantidad in cantidades.items():
+                self.stats[clave] += cantidad
+        if self._origen is not None:
+            self._origen._sumar(**cantidades)
+
+    def tokens_por_turno(self, historial: list) -> list[int]:
+        return [tokens_turno(t) for t in agrupar_turnos(historial)]
+
+    def _compactar_turno(self, turno: list) -> tuple[list, int]:
+        """Resume los pasos antiguos del turno dentro de su mensaje inicial: (turno, tokens liberados)"""
+        inicio, pasos = agrupar_pasos(turno)
+        viejos = pasos[: -self.pasos_recientes]
+        if not inicio or not viejos:
+            return turno, 0
+        contenidos = [c for paso in viejos for c in paso]
+        # Si ya se compactó antes, el resumen previo entra en el nuevo en vez de acumularse
+        tarea, _, previo = " ".join(texto_contenido(c) for c in inicio).partition(PREFIJO_PASOS)
+        if self.resumir is not None:
+            pasos_texto = "\n".join(f"{c.role}: {texto_contenido(c)}" for c in contenidos)
+            hechos = self.resumir(f"{previo}\n{pasos_texto}".strip())
+        else:
+            hechos = f"{previo}\n({len(viejos)} pasos anteriores omitidos)".strip()
+        # El resumen va en el mensaje del usuario que abre el turno: la alternancia
+        # de roles y los pares function_call/function_response recientes no cambian
+        texto = tarea + PREFIJO_PASOS + hechos
+        nuevo = [_nuevo_contenido(inicio[0], "user", texto)] + [c for paso in pasos[-self.pasos_recientes :] for c in paso]
+        self._sumar(pasos_resumidos=len(viejos))
+        return nuevo, tokens_turno(turno) - tokens_turno(nuevo)
+
+    def compactar(self, historial: list) -> list:
+        """Devuelve un historial que cabe en el presupuesto (el mismo si ya cabe)"""
+        turnos = agrupar_turnos(historial)
+        tokens = [tokens_turno(t) for t in turnos]
+        total = sum(tokens)
+        if total <= self.presupuesto:
+            return historial
+
+        # Los más antiguos salen hasta bajar al objetivo, salvo los recientes
+        corte = 0
+        while corte < len(turnos) - self.turnos_recientes and total > self.objetivo:
+            total -= tokens[corte]
+            corte += 1
+        # Si ni con eso cabe, se sacrifican también recientes (nunca el último)
+        while corte < len(turnos) - 1 and total > self.presupuesto:
+            total -= tokens[corte]
+            corte += 1
+        # El turno en curso (p. ej. una sesión de agente) tampoco cabe: sus pasos antiguos se resumen
+        liberados = 0
+        ultimo = turnos[-1]
+        if total > self.presupuesto:
+            ultimo, liberados = self._compactar_turno(ultimo)
+        if corte == 0 and not liberados:
+            return historial
+
+        viejos = [c for turno in turnos[:corte] for c in turno]
+        nuevo = [c for turno in turnos[corte:-1] for c in turno] + ultimo
+        liberados += sum(tokens[:corte])
+
+        if viejos and self.resumir is not None:
+            conversacion = "\n".join(f"{c.role}: {texto_contenido(c)}" for c in viejos)
+            resumen = PREFIJO_RESUMEN + self.resumir(conversacion)
+            # Par usuario/modelo para respetar la alternancia de roles
+            nuevo = [
+                _nuevo_contenido(viejos[0], "user", resumen),
+                _nuevo_contenido(viejos[0], "model", "Entendido."),
+            ] + nuevo
+            liberados -= estimar_tokens(resumen)
+
+        self._sumar(
+            compactaciones=1,
+            **{"turnos_resumidos" if self.resumir else "turnos_descartados": corte},
+            tokens_liberados=liberados,
+        )
+        return nuevo
+
+    def preparar(self, chat: Any) -> int:
+        """Compacta chat.history en su sitio; devuelve los tokens que se reenviarán"""
+        historial = list(chat.history)
+        compacto = self.compactar(historial)
+        if compacto is not historial:
+            chat.history = compacto
+        self.ultimo_envio = sum(tokens_turno(t) for t in agrupar_turnos(compacto))
+        return self.ultimo_envio
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+
+if __name__ == "__main__":
+    # 300 turnos contra el backend simulado: tokens reenviados por turno con y sin gestor
+    from backends import BackendMock, usar_backend
+    from limitador import LIMITADOR
+    from llamadas import enviar_mensaje
+    from registro_modelos import obtener_modelo
+
+    def responder(prompt: str, modelo) -> str:
+        if prompt.startswith("Resume"):
+            return "El usuario pidió datos de varias ciudades; ya se dieron las temperaturas."
+        return "Respuesta con algunos datos útiles sobre la ciudad y su clima actual. " * 3
+
+    usar_backend(BackendMock(respuestas=responder))
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+
+    for gestor in (None, GestorHistorial(presupuesto=3000, resumir=resumen_con_llm())):
+        chat = obtener_modelo().start_chat()
+        reenviados = []
+        for turno in range(300):
+            pregunta = f"Turno {turno}: ¿qué tiempo hace en la ciudad número {turno}?"
+            enviar_mensaje(chat, pregunta, historial=gestor)
+            anteriores = agrupar_turnos(chat.history)[:-1]
+            reenviados.append(gestor.ultimo_envio if gestor else sum(map(tokens_turno, anteriores)))
+        etiqueta = "con gestor" if gestor else "sin gestor"
+        print(
+            f"{etiqueta}: tokens reenviados en el turno 10 = {reenviados[10]}, "
+            f"turno 100 = {reenviados[100]}, turno 299 = {reenviados[299]}, "
+            f"total = {sum(reenviados)}"
+        )
+        if gestor:
+            print(f"  {gestor.estadisticas()}")
+
+    # Una tarea de agente con 30 pasos de herramientas: todo es un único turno,
+    # así que solo se puede compactar por dentro
+    def agente_largo(prompt: str, modelo) -> object:
+        if prompt.startswith("Resume"):
+            return "Se buscaron datos de varias ciudades."
+        return [{"function_call": {"name": "buscar", "args": {"tema": "otra ciudad"}}}]
+
+    usar_backend(BackendMock(respuestas=agente_largo))
+    plantilla = GestorHistorial(presupuesto=3000, resumir=resumen_con_llm())
+    for gestor in (None, plantilla.nueva_sesion()):
+        chat = obtener_modelo().start_chat()
+        enviar_mensaje(chat, "Busca datos de 30 ciudades", historial=gestor)
+        reenviados = []
+        for paso in range(30):
+            datos = {"informacion": f"datos extensos sobre la ciudad {paso}: " + "bla " * 150}
+            enviar_mensaje(chat, [{"function_response": {"name": "buscar", "response": datos}}], historial=gestor)
+            reenviados.append(gestor.ultimo_envio if gestor else sum(map(tokens_turno, agrupar_turnos(chat.history[:-1]))))
+        etiqueta = "con gestor" if gestor else "sin gestor"
+        print(f"agente {etiqueta}: tokens reenviados en el paso 30 = {reenviados[-1]}, total = {sum(reenviados)}")
+    print(f"  {plantilla.estadisticas()}")
@@ -0,0 +1,198 @@
+"""
+LIMITADOR DE TASA DEL LADO DEL CLIENTE
+
+Sustituye las pausas fijas (time.sleep(2)) por un limitador compartido:
+
+- Cubo de tokens para solicitudes por minuto (RPM).
+- Cubo de tokens para tokens por minuto (TPM).
+- Reintentos con backoff exponencial y jitter ante errores 429 / ResourceExhausted.
+- Estadísticas de cola y de tiempo pasado esperando.
+- Dentro de un flujo con plazo no se espera un cupo (ni un backoff) que
+  llegaría tarde: se lanza PlazoAgotado en el acto.
+
+Los límites se leen de las variables de entorno LLM_RPM y LLM_TPM.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+import trazas
+from politica_llamadas import PlazoAgotado, tiempo_restante
+
+
+class CuboTokens:
+    """Cubo de tokens clásico: se recarga de forma continua hasta su capacidad"""
+
+    def __init__(self, capacidad: float, recarga_por_segundo: float):
+        self.capacidad = capacidad
+        self.recarga_por_segundo = recarga_por_segundo
+        self.disponibles = capacidad
+        self._ultimo = time.monotonic()
+
+    def _recargar(self) -> None:
+        ahora = time.monotonic()
+        self.disponibles = min(
+            self.capacidad,
+            self.disponibles + (ahora - self._ultimo) * self.recarga_por_segundo,
+        )
+        self._ultimo = ahora
+
+    def espera_necesaria(self, cantidad: float) -> float:
+        """Segundos que faltan para poder consumir `cantidad` (0 si ya se puede)"""
+        self._recargar()
+        # Una petición más grande que el cubo entero solo espera a tenerlo lleno
+        cantidad = min(cantidad, self.capacidad)
+        if self.disponibles >= cantidad:
+            return 0.0
+        return (cantidad - self.disponibles) / self.recarga_por_segundo
+
+    def consumir(self, cantidad: float) -> None:
+        self._recargar()
+        self.disponibles -= cantidad
+
+
+def es_error_de_cuota(error: BaseException) -> bool:
+    """Detecta 429 / ResourceExhausted sin depender de google.api_core"""
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    return getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429
+
+
+def estimar_tokens(contenido: Any) -> int:
+    """Estimación barata: ~4 caracteres por token"""
+    if contenido is None:
+        return 0
+    if isinstance(contenido, str):
+        return len(contenido) // 4 + 1
+    if isinstance(contenido, (list, tuple)):
+        return sum(estimar_tokens(c) for c in contenido)
+    return len(str(contenido)) // 4 + 1
+
+
+class LimitadorTasa:
+    """Limitador RPM + TPM compartido por todas las llamadas al modelo"""
+
+    def __init__(
+        self,
+        rpm: float = 10,
+        tpm: float = 250_000,
+        max_reintentos: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._solicitudes = CuboTokens(rpm, rpm / 60)
+        self._tokens = CuboTokens(tpm, tpm / 60)
+        self._lock = threading.Lock()
+
+        self._en_cola = 0
+        self._stats = {
+            "solicitudes": 0,
+            "reintentos": 0,
+            "errores_cuota": 0,
+            "max_en_cola": 0,
+            "tiempo_limitado": 0.0,
+            "tiempo_backoff": 0.0,
+        }
+
+    def configurar(self, rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        """Cambia la cuota en caliente (por ejemplo, para pruebas de carga simuladas)"""
+        with self._lock:
+            if rpm is not None:
+                self.rpm = rpm
+                self._solicitudes = CuboTokens(rpm, rpm / 60)
+            if tpm is not None:
+                self.tpm = tpm
+                self._tokens = CuboTokens(tpm, tpm / 60)
+
+    @classmethod
+    def desde_entorno(cls) -> "LimitadorTasa":
+        return cls(
+            rpm=float(os.getenv("LLM_RPM", "10")),
+            tpm=float(os.getenv("LLM_TPM", "250000")),
+        )
+
+    def adquirir(self, tokens_estimados: int = 0) -> float:
+        """Bloquea hasta que haya cupo en ambos cubos. Devuelve el tiempo esperado."""
+        inicio = time.monotonic()
+        with self._lock:
+            self._en_cola += 1
+            self._stats["max_en_cola"] = max(self._stats["max_en_cola"], self._en_cola)
+        try:
+            while True:
+                with self._lock:
+                    espera = max(
+                        self._solicitudes.espera_necesaria(1),
+                        self._tokens.espera_necesaria(tokens_estimados),
+                    )
+                    if espera == 0:
+                        self._solicitudes.consumir(1)
+                        self._tokens.consumir(tokens_estimados)
+                        self._stats["solicitudes"] += 1
+                        break
+                restante = tiempo_restante()
+                if restante is not None and espera >= restante:
+                    raise PlazoAgotado("Plazo agotado esperando cupo del limitador")
+                time.sleep(espera)
+        finally:
+            esperado = time.monotonic() - inicio
+            with self._lock:
+                self._en_cola -= 1
+                self._stats["tiempo_limitado"] += esperado
+        return esperado
+
+    def registrar_uso(self, tokens_estimados: int, tokens_reales: int) -> None:
+        """Corrige el cubo TPM con el consumo real informado por la API"""
+        with self._lock:
+            self._tokens.consumir(tokens_reales - tokens_estimados)
+
+    def _penalizar(self, espera: float) -> None:
+        """Tras un 429 vaciamos el cubo RPM para que los demás hilos también frenen"""
+        with self._lock:
+            self._solicitudes.disponibles = min(
+                self._solicitudes.disponibles, -espera * self._solicitudes.recarga_por_segundo
+            )
+
+    def ejecutar(
+        self, funcion: Callable[..., Any], *args, tokens_estimados: int = 0, **kwargs
+    ) -> Any:
+        """Llama a `funcion` respetando el límite y reintentando ante errores de cuota"""
+        for intento in range(self.max_reintentos + 1):
+            trazas.sumar("espera_cupo", self.adquirir(tokens_estimados))
+            try:
+                return funcion(*args, **kwargs)
+            except Exception as e:
+                if not es_error_de_cuota(e) or intento == self.max_reintentos:
+                    raise
+                # Backoff exponencial con "full jitter"
+                espera = random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2**intento)
+                )
+                with self._lock:
+                    self._stats["errores_cuota"] += 1
+                    self._stats["reintentos"] += 1
+                    self._stats["tiempo_backoff"] += espera
+                trazas.sumar("reintentos", 1)
+                trazas.evento("reintento", intento=intento + 1, espera=espera, error=type(e).__name__)
+                self._penalizar(espera)
+                restante = tiempo_restante()
+                if restante is not None and espera >= restante:
+                    raise PlazoAgotado("Plazo agotado esperando para reintentar") from e
+                time.sleep(espera)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {**self._stats, "en_cola": self._en_cola}
+
+
+# Limitador compartido por ambos scripts
+LIMITADOR = LimitadorTasa.desde_entorno()
@@ -0,0 +1,255 @@
+"""
+PUNTO ÚNICO DE PASO PARA LAS LLAMADAS AL MODELO
+
+Todas las llamadas a generate_content / send_message de los ejemplos pasan por
+aquí, de modo que el limitador de tasa, la caché de respuestas y las trazas
+se aplican en un solo lugar.
+"""
+
+import time
+from typing import Any, Iterator, Optional
+
+from cache_respuestas import CACHE, RespuestaCacheada, clave_de_llamada
+from coalescencia import COALESCEDOR
+from limitador import LIMITADOR, estimar_tokens
+from politica_llamadas import POLITICA, comprobar_plazo, con_timeout
+from trazas import TRAZADOR, Span, coste_estimado
+
+
+def _tokens_reales(respuesta: Any) -> int | None:
+    uso = getattr(respuesta, "usage_metadata", None)
+    return getattr(uso, "total_token_count", None) if uso else None
+
+
+def _texto_o_none(respuesta: Any) -> str | None:
+    """El texto de la respuesta, o None si trae llamadas a funciones u otra cosa"""
+    try:
+        return respuesta.text
+    except (AttributeError, ValueError):
+        return None
+
+
+def _nombre_modelo(modelo: Any) -> Optional[str]:
+    return getattr(modelo, "model_name", None)
+
+
+def _anotar_uso(span: Span, uso: Any, modelo: Any = None) -> None:
+    """Tokens y coste estimado (con la tarifa del modelo) a partir de usage_metadata"""
+    if not uso:
+        return
+    entrada = getattr(uso, "prompt_token_count", 0) or 0
+    salida = getattr(uso, "candidates_token_count", 0) or 0
+    cacheados = getattr(uso, "cached_content_token_count", 0) or 0
+    span.fijar(
+        tokens_entrada=entrada,
+        tokens_salida=salida,
+        tokens_total=entrada + salida,
+        tokens_cacheados=cacheados or None,
+        coste_usd=coste_estimado(entrada, salida, cacheados, _nombre_modelo(modelo)),
+    )
+
+
+def _funciones_llamadas(contenidos: Any) -> list[str]:
+    """Nombres de las herramientas pedidas en una lista de contenidos"""
+    return [
+        parte.function_call.name
+        for contenido in contenidos
+        for parte in getattr(contenido, "parts", [])
+        if getattr(parte, "function_call", None)
+    ]
+
+
+def generar(modelo, contenido, usar_cache: bool = True, **kwargs):
+    """
+    Equivalente a modelo.generate_content(contenido) pero respetando el límite.
+    Las respuestas de texto se guardan en la caché; un acierto no toca la red.
+    Con usar_cache, una llamada idéntica a otra aún en vuelo espera su respuesta.
+    """
+    with TRAZADOR.span("generate_content", modelo=_nombre_modelo(modelo)) as span:
+        reutilizable = usar_cache and not kwargs.get("stream")
+        cacheable = reutilizable and CACHE is not None
+        coalescer = reutilizable and COALESCEDOR is not None
+        if cacheable or coalescer:
+            clave = clave_de_llamada(modelo, contenido, kwargs.get("generation_config"))
+        if cacheable:
+            texto = CACHE.obtener(clave)
+            if texto is not None:
+                span.fijar(cache=True)
+                return RespuestaCacheada(texto)
+
+        estimados = estimar_tokens(contenido)
+        # Primero el cupo del limitador; después, dentro del plazo del flujo y con
+        # petición de cobertura si está activa, solo la llamada al modelo: las
+        # esperas de cupo no cuentan para el p95 ni se duplican
+        if coalescer:
+            respuesta, compartida = COALESCEDOR.compartir(
+                clave, LIMITADOR.ejecutar, POLITICA.ejecutar, con_timeout(modelo.generate_content), contenido,
+                tokens_estimados=estimados, **kwargs,
+            )
+            if compartida:
+                # La líder ya registró el uso y guardó en caché
+                span.fijar(coalescida=True)
+                return respuesta
+        else:
+            respuesta = LIMITADOR.ejecutar(
+                POLITICA.ejecutar, con_timeout(modelo.generate_content), contenido,
+                tokens_estimados=estimados, **kwargs,
+            )
+        reales = _tokens_reales(respuesta)
+        if reales:
+            LIMITADOR.registrar_uso(estimados, reales)
+        _anotar_uso(span, getattr(respuesta, "usage_metadata", None), modelo)
+        candidatos = getattr(respuesta, "candidates", None)
+        herramientas = _funciones_llamadas([candidatos[0].content]) if candidatos else []
+        if herramientas:
+            span.fijar(herramientas=herramientas)
+
+        if cacheable:
+            texto = _texto_o_none(respuesta)
+            if texto:
+                CACHE.guardar(clave, texto)
+        return respuesta
+
+
+class FlujoRespuesta:
+    """
+    Respuesta en streaming: se itera fragmento a fragmento y, al terminar,
+    expone el texto completo, el tiempo hasta el primer token y la latencia total.
+    """
+
+    def __init__(
+        self,
+        fragmentos: Iterator[str],
+        inicio: float,
+        al_terminar=None,
+        span: Optional[Span] = None,
+    ):
+        self._fragmentos = fragmentos
+        self._inicio = inicio
+        self._al_terminar = al_terminar
+        self._span = span
+        self._partes: list[str] = []
+        self.ttft: Optional[float] = None
+        self.latencia_total: Optional[float] = None
+        self.completo = False
+        self.cancelado = False
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for fragmento in self._fragmentos:
+                if self.cancelado:
+                    break
+                if not fragmento:
+                    continue
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - self._inicio
+                self._partes.append(fragmento)
+                yield fragmento
+        except Exception as e:
+            self._cerrar_span(e)
+            raise
+        self.latencia_total = time.perf_counter() - self._inicio
+        if not self.cancelado:
+            self.completo = True
+            if self._al_terminar:
+                self._al_terminar(self.texto)
+        self._cerrar_span()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._partes)
+
+    texto = text
+
+    def cerrar(self) -> None:
+        """Deja de consumir el stream (por ejemplo, si una compuerta ya decidió)"""
+        self.cancelado = True
+        self.latencia_total = time.perf_counter() - self._inicio
+        cerrar = getattr(self._fragmentos, "close", None)
+        if cerrar:
+            cerrar()
+        self._cerrar_span()
+
+    def _cerrar_span(self, error: Optional[BaseException] = None) -> None:
+        if self._span is None:
+            return
+        self._span.fijar(ttft=self.ttft, cancelado=self.cancelado or None)
+        TRAZADOR.terminar(self._span, error)
+
+
+def generar_stream(modelo, contenido, usar_cache: bool = True, **kwargs) -> FlujoRespuesta:
+    """Como generar(), pero devuelve los fragmentos de texto a medida que llegan"""
+    inicio = time.perf_counter()
+    # El span se cierra cuando el flujo termina o se corta, no al volver de aquí
+    span = TRAZADOR.iniciar("generate_content", modelo=_nombre_modelo(modelo), stream=True)
+    clave = None
+    if usar_cache and CACHE is not None:
+        clave = clave_de_llamada(modelo, contenido, kwargs.get("generation_config"))
+        texto = CACHE.obtener(clave)
+        if texto is not None:
+            span.fijar(cache=True)
+            return FlujoRespuesta(iter([texto]), inicio, span=span)
+
+    estimados = estimar_tokens(contenido)
+    try:
+        comprobar_plazo("generate_content")
+        with TRAZADOR.activar(span):
+            respuesta = LIMITADOR.ejecutar(
+                con_timeout(modelo.generate_content), contenido, tokens_estimados=estimados, stream=True, **kwargs
+            )
+    except Exception as e:
+        TRAZADOR.terminar(span, e)
+        raise
+    uso: dict[str, Any] = {}
+
+    def _fragmentos() -> Iterator[str]:
+        for parte in respuesta:
+            # El último fragmento de Gemini trae el uso total de tokens
+            if getattr(parte, "usage_metadata", None) is not None:
+                uso["final"] = parte.usage_metadata
+            yield _texto_o_none(parte) or ""
+            # Sin cobertura en streaming, pero el plazo del flujo también corta el stream
+            comprobar_plazo()
+
+    def _al_terminar(texto: str) -> None:
+        final = uso.get("final") or getattr(respuesta, "usage_metadata", None)
+        reales = getattr(final, "total_token_count", None)
+        if reales:
+            LIMITADOR.registrar_uso(estimados, reales)
+        _anotar_uso(span, final, modelo)
+        if clave is not None and texto:
+            CACHE.guardar(clave, texto)
+
+    return FlujoRespuesta(_fragmentos(), inicio, _al_terminar, span)
+
+
+def enviar_mensaje(chat, mensaje, historial=None, **kwargs):
+    """
+    Equivalente a chat.send_message(mensaje) pero respetando el límite.
+    El historial completo se reenvía en cada turno, así que cuenta para TPM;
+    con `historial` (un GestorHistorial) se compacta antes de enviarlo.
+    """
+    modelo = getattr(chat, "model", None)
+    with TRAZADOR.span("send_message", modelo=_nombre_modelo(modelo)) as span:
+        # Un chat no se duplica (su historial cambiaría dos veces): solo se respeta el plazo
+        comprobar_plazo("send_message")
+        if historial is not None:
+            span.fijar(tokens_historial=historial.preparar(chat))
+        previos = len(chat.history)
+        estimados = estimar_tokens(mensaje) + estimar_tokens(
+            [p.text for c in chat.history for p in c.parts if getattr(p, "text", None)]
+        )
+        respuesta = LIMITADOR.ejecutar(
+            con_timeout(chat.send_message), mensaje, tokens_estimados=estimados, **kwargs
+        )
+        reales = _tokens_reales(respuesta)
+        if reales:
+            LIMITADOR.registrar_uso(estimados, reales)
+        _anotar_uso(span, getattr(respuesta, "usage_metadata", None), modelo)
+
+        # Con function calling automático, el SDK añade al historial las
+        # llamadas a herramientas y sus respuestas dentro de este mismo turno
+        herramientas = _funciones_llamadas(chat.history[previos:])
+        if herramientas:
+            span.fijar(llamadas_herramientas=len(herramientas), herramientas=herramientas)
+        return respuesta
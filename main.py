@@ -1,164 +1,179 @@
 # pip install google-generativeai python-dotenv requests
 
+# Uso: python main.py
+# Importar este archivo no hace llamadas de red ni pide datos por teclado:
+# el SDK de Gemini se configura la primera vez que se usa un modelo.
+
 # ============================================
 # CONFIGURACIÓN INICIAL
 # ============================================
 
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
-import requests
+from clima import obtener_clima
+from llamadas import generar, generar_stream
+from politica_llamadas import plazo
+from registro_modelos import obtener_modelo
+from salida_estructurada import SalidaEstructurada
+
+MODELO = 'models/gemini-flash-latest'
+
+salida_consejos = SalidaEstructurada(list[str])
 
-load_dotenv()
-API_KEY = os.getenv('GEMINI_API_KEY')
 
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel('models/gemini-flash-latest')
+def modelo():
+    """El modelo compartido; se construye (y se configura la API) al primer uso."""
+    return obtener_modelo(MODELO)
 
 # ============================================
 # EJEMPLO 1: La llamada más simple posible
 # ============================================
 
-pregunta = "¿Qué es la fotosíntesis?.  Dame una respuesta concreta y breve."
-respuesta = model.generate_content(pregunta)
+def ejemplo_1():
+    pregunta = "¿Qué es la fotosíntesis?.  Dame una respuesta concreta y breve."
+    respuesta = generar(modelo(), pregunta)
 
-print(respuesta.text)
+    print(respuesta.text)
 
 # ============================================
 # EJEMPLO 2: Usando variables en el prompt
 # ============================================
 
-especie = "Jaguar"
-region = "Amazonía colombiana"
+def ejemplo_2(especie="Jaguar", region="Amazonía colombiana"):
+    prompt = f'''
+    Háblame sobre el {especie} en la {region}.
+    Incluye:
+    - Estado de conservación
+    - Amenazas principales
+    - Una acción concreta para protegerlo
 
-prompt = f'''
-Háblame sobre el {especie} en la {region}.
-Incluye:
-- Estado de conservación
-- Amenazas principales
-- Una acción concreta para protegerlo
-
-Responde en máximo 4 líneas.
-'''
+    Responde en máximo 4 líneas.
+    '''
 
-respuesta = model.generate_content(prompt)
-print(f"RESPUESTA DEL LLM:\n{respuesta.text}\n")
+    respuesta = generar(modelo(), prompt)
+    print(f"RESPUESTA DEL LLM:\n{respuesta.text}\n")
 
 # ============================================
 # EJEMPLO 3: Procesando respuesta recibida
 # ============================================
 
-prompt_lista = '''
-Dame 3 consejos para reducir el uso de plástico.
-Responde en formato:
-1. [consejo]
-2. [consejo]
-3. [consejo]
-'''
+def ejemplo_3():
+    prompt_lista = '''
+    Dame 3 consejos para reducir el uso de plástico.
+    Responde con un array JSON de textos, un consejo por elemento.
+    '''
 
-respuesta = model.generate_content(prompt_lista)
-texto_respuesta = respuesta.text
-numero_de_lineas = len(texto_respuesta.split('\n'))
-numero_de_caracteres = len(texto_respuesta)
+    # Para millones de respuestas, ver metricas_respuestas / matriz_palabras_clave en analitica_lote.py
+    # La lista llega como JSON con esquema (no hay que partir el texto por '\n')
+    # y cada consejo se muestra en cuanto termina de llegar
+    consejos = []
+    for consejo in salida_consejos.pedir_elementos(prompt_lista, modelo()):
+        consejos.append(consejo)
+        print(f"{len(consejos)}. {consejo}")
+    texto_respuesta = '\n'.join(consejos)
 
-print("ANÁLISIS:")
-print(f"   Líneas en la respuesta: {numero_de_lineas}")
-print(f"   Caracteres totales: {numero_de_caracteres}")
-print(f"   ¿Menciona 'plástico'?: {'Sí' if 'plástico' in texto_respuesta.lower() else 'No'}")
+    print("\nANÁLISIS:")
+    print(f"   Consejos en la respuesta: {len(consejos)}")
+    print(f"   Caracteres totales: {len(texto_respuesta)}")
+    print(f"   ¿Menciona 'plástico'?: {'Sí' if 'plástico' in texto_respuesta.lower() else 'No'}")
 
 # ============================================
 # EJEMPLO 4: Función reutilizable
 # ============================================
 
-def consultar_llm(pregunta):
-    """Envía una pregunta al LLM y devuelve la respuesta en texto."""
-    respuesta = model.generate_content(pregunta)
-    return respuesta.text
+def consultar_llm(pregunta, plazo_segundos=None):
+    """Envía una pregunta al LLM y devuelve la respuesta en texto (con un tiempo máximo opcional)."""
+    if plazo_segundos is None:
+        return generar(modelo(), pregunta).text
+    with plazo(plazo_segundos):
+        return generar(modelo(), pregunta).text
+
+def consultar_llm_stream(pregunta):
+    """Igual que consultar_llm, pero entrega el texto en fragmentos a medida que llega."""
+    return generar_stream(modelo(), pregunta)
 
-pregunta1 = "¿Qué causa el cambio climático en una frase?"
-print(consultar_llm(pregunta1))
+def ejemplo_4():
+    pregunta1 = "¿Qué causa el cambio climático en una frase?"
+    print(consultar_llm(pregunta1))
 
-pregunta2 = "Dame un dato curioso sobre las abejas"
-print(consultar_llm(pregunta2))
+    # Versión en streaming: los primeros tokens aparecen sin esperar al final
+    pregunta2 = "Dame un dato curioso sobre las abejas"
+    flujo = consultar_llm_stream(pregunta2)
+    for fragmento in flujo:
+        print(fragmento, end="", flush=True)
+    print(f"\n⏱️ Primer token: {flujo.ttft or 0:.2f}s | Total: {flujo.latencia_total:.2f}s\n")
 
 # ============================================
 # EJEMPLO 5: Combinando lógica Python + LLM
 # ============================================
 
-temperaturas_ciudad = [22, 25, 28, 31, 29, 26, 24]
-promedio = sum(temperaturas_ciudad) / len(temperaturas_ciudad)
+def ejemplo_5(temperaturas_ciudad=(22, 25, 28, 31, 29, 26, 24)):
+    temperaturas_ciudad = list(temperaturas_ciudad)
+    promedio = sum(temperaturas_ciudad) / len(temperaturas_ciudad)
 
-print(f"Temperaturas de la semana: {temperaturas_ciudad}\n")
-print(f"Promedio calculado por Python: {promedio:.1f}°C\n")
+    print(f"Temperaturas de la semana: {temperaturas_ciudad}\n")
+    print(f"Promedio calculado por Python: {promedio:.1f}°C\n")
 
-if promedio > 26:
-    prompt_calor = f"""
-    La temperatura promedio esta semana fue {promedio:.1f}°C.
-    Enumera 2 consejos breves para cuidar el medio ambiente en días calurosos.
-    Responde en texto plano, sin formato especial.
-    """
+    # Con series largas de lecturas, ventanas_sobre_umbral (analitica_lote.py) calcula las medias
+    # por bloques y solo llama al LLM en las semanas que cruzan el umbral
+    if promedio > 26:
+        prompt_calor = f"""
+        La temperatura promedio esta semana fue {promedio:.1f}°C.
+        Enumera 2 consejos breves para cuidar el medio ambiente en días calurosos.
+        Responde en texto plano, sin formato especial.
+        """
 
-    consejos = consultar_llm(prompt_calor) # Función creada en el ejemplo 4
-    print(f"CONSEJOS DEL LLM:\n{consejos}")
+        consejos = consultar_llm(prompt_calor) # Función creada en el ejemplo 4
+        print(f"CONSEJOS DEL LLM:\n{consejos}")
 
 # ============================================
 # EJEMPLO 6: Creando una "herramienta"
 # ============================================
 
-def obtener_clima(ciudad):
-    """Obtiene el clima de una ciudad usando la API de wttr.in."""
-    try:
-        # La URL usa un formato especial para obtener la respuesta en JSON (j1)
-        url = f"https://wttr.in/{ciudad}?format=j1"
-        data = requests.get(url).json()
-
-        # Extraemos los datos que nos interesan
-        c = data['current_condition'][0]
-
-        return {
-            "ciudad": data['nearest_area'][0]['areaName'][0]['value'],
-            "temperatura": c['temp_C'],
-            "sensacion": c['FeelsLikeC'],
-            "descripcion": c['weatherDesc'][0]['value'],
-            "humedad": c['humidity'],
-            "viento": c['windspeedKmph'],
-            "precipitacion": c['precipMM']
-        }
-    except requests.exceptions.RequestException as e:
-        print(f"Error de red al obtener el clima: {e}")
-        return None
-    except (KeyError, IndexError) as e:
-        print(f"Error al procesar los datos del clima. La ciudad '{ciudad}' podría no ser válida. Error: {e}")
-        return None
-
-# Pedimos al usuario una ciudad, con "Bogota" como valor por defecto
-ciudad_input = input("Ingresa una ciudad (o presiona Enter para usar 'Bogota'): ")
-ciudad = ciudad_input or "Bogota"
-
-clima = obtener_clima(ciudad)
-
-# Si obtuvimos el clima correctamente, lo mostramos y consultamos al LLM
-if clima:
-    print(f"\n📍 {clima['ciudad']}")
-    print(f"🌡️ {clima['temperatura']}°C (sensación: {clima['sensacion']}°C)")
-    print(f"☁️ {clima['descripcion']}")
-    print(f"💧 Humedad: {clima['humedad']}%")
-    print(f"💨 Viento: {clima['viento']} km/h")
-    print(f"🌧️ Precipitación: {clima['precipitacion']} mm \n")
-
-    prompt_consejos = f'''
-    Basado en el siguiente clima para {clima['ciudad']}:
-    - Temperatura: {clima['temperatura']}°C
-    - Descripción: {clima['descripcion']}
-    - Humedad: {clima['humedad']}%
-    - Precipitación: {clima['precipitacion']} mm
-
-    Enumera 3 consejos prácticos sobre qué ropa usar o qué actividades hacer hoy.
-    Responde en texto plano, sin formato especial.
-    '''
+# La herramienta obtener_clima vive en clima.py: sesión HTTP reutilizable,
+# timeouts explícitos y caché por ciudad (ver también obtener_clima_lote)
+
+def ejemplo_6(ciudad=None):
+    # Pedimos al usuario una ciudad, con "Bogota" como valor por defecto
+    if ciudad is None:
+        ciudad_input = input("Ingresa una ciudad (o presiona Enter para usar 'Bogota'): ")
+        ciudad = ciudad_input or "Bogota"
+
+    clima = obtener_clima(ciudad)
+
+    # Si obtuvimos el clima correctamente, lo mostramos y consultamos al LLM
+    if clima:
+        print(f"\n📍 {clima['ciudad']}")
+        print(f"🌡️ {clima['temperatura']}°C (sensación: {clima['sensacion']}°C)")
+        print(f"☁️ {clima['descripcion']}")
+        print(f"💧 Humedad: {clima['humedad']}%")
+        print(f"💨 Viento: {clima['viento']} km/h")
+        print(f"🌧️ Precipitación: {clima['precipitacion']} mm \n")
+
+        prompt_consejos = f'''
+        Basado en el siguiente clima para {clima['ciudad']}:
+        - Temperatura: {clima['temperatura']}°C
+        - Descripción: {clima['descripcion']}
+        - Humedad: {clima['humedad']}%
+        - Precipitación: {clima['precipitacion']} mm
+
+        Enumera 3 consejos prácticos sobre qué ropa usar o qué actividades hacer hoy.
+        Responde en texto plano, sin formato especial.
+        '''
+
+        print("🤖 CONSEJOS DEL LLM:")
+        print(consultar_llm(prompt_consejos))
+
+
+def main():
+    ejemplo_1()
+    ejemplo_2()
+    ejemplo_3()
+    ejemplo_4()
+    ejemplo_5()
+    ejemplo_6()
+
 
-    print("🤖 CONSEJOS DEL LLM:")
-    print(consultar_llm(prompt_consejos))
+if __name__ == "__main__":
+    main()
 
 
 """
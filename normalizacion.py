@@ -0,0 +1,41 @@
+"""
+NORMALIZACIÓN DE TEXTO
+
+Utilidades compartidas para comparar textos sin que importen mayúsculas,
+tildes ni palabras vacías.
+"""
+
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+STOPWORDS_ES = frozenset(
+    """
+    a al algo como con de del e el ella en es esa ese esta este fue ha hay la las
+    le les lo los me mi mis muy mas no o os para pero por que se si sin sobre su
+    sus te tu tus un una uno unos unas y ya yo
+    entre desde hasta hacia cual cuales cuanto cuanta cuantos cuantas donde
+    the of a an and or to in on is are for what how
+    """.split()
+)
+
+_PALABRA = re.compile(r"\w+")
+
+
+def quitar_acentos(texto: str) -> str:
+    """'Facturación' -> 'Facturacion'"""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes"""
+    return quitar_acentos(texto.lower())
+
+
+def tokenizar(texto: str, stopwords: Optional[Iterable[str]] = STOPWORDS_ES) -> list[str]:
+    """Palabras normalizadas, sin palabras vacías"""
+    palabras = _PALABRA.findall(normalizar(texto))
+    if stopwords is None:
+        return palabras
+    return [p for p in palabras if p not in stopwords]
@@ -0,0 +1,176 @@
+"""
+MOTOR DE PARALELIZACIÓN (fan-out)
+
+Lanza varias "ramas" (llamadas al LLM u otras funciones) al mismo tiempo y
+recoge los resultados en el mismo orden en que se pidieron.
+
+- Cada rama informa su propia latencia.
+- Si una rama supera el tiempo límite se marca como agotada, pero las demás
+  conservan su resultado.
+- El tiempo total es aproximadamente el de la rama más lenta, no la suma.
+"""
+
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from politica_llamadas import tiempo_restante
+
+
+@dataclass
+class ResultadoRama:
+    """Resultado de una rama del fan-out"""
+
+    nombre: str
+    valor: Any = None
+    error: Optional[BaseException] = None
+    latencia: float = 0.0
+    agotado: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.agotado
+
+
+def ejecutar_en_paralelo(
+    ramas: list[tuple[str, Callable[[], Any]]],
+    max_concurrencia: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> list[ResultadoRama]:
+    """
+    Ejecuta las ramas en un pool de hilos acotado.
+
+    ramas: lista de (nombre, función sin argumentos).
+    max_concurrencia: hilos simultáneos (por defecto, una por rama).
+    timeout: segundos máximos por rama, contados desde que la rama arranca.
+        Una rama que sigue en cola (el pool está ocupado, quizá por ramas
+        colgadas) tampoco espera más de `timeout` desde la llamada.
+    Dentro de un flujo con plazo, ninguna rama pasa del plazo del flujo.
+    """
+    if not ramas:
+        return []
+    inicio = time.perf_counter()
+    restante = tiempo_restante()
+    limite_flujo = None if restante is None else inicio + restante
+
+    resultados = [ResultadoRama(nombre) for nombre, _ in ramas]
+    inicios: dict[int, float] = {}
+
+    def _correr(indice: int, funcion: Callable[[], Any]) -> Any:
+        inicios[indice] = time.perf_counter()
+        return funcion()
+
+    def _vencimiento(indice: int) -> Optional[float]:
+        # En curso: desde que arrancó; en cola: desde la llamada
+        desde = inicios.get(indice, inicio)
+        limites = [t for t in (None if timeout is None else desde + timeout, limite_flujo) if t is not None]
+        return min(limites) if limites else None
+
+    pool = ThreadPoolExecutor(max_workers=max_concurrencia or len(ramas))
+    # Cada rama hereda el contexto de quien la lanza (span de traza actual, etc.)
+    futuros = {
+        pool.submit(contextvars.copy_context().run, _correr, i, funcion): i
+        for i, (_, funcion) in enumerate(ramas)
+    }
+    pendientes = set(futuros)
+
+    try:
+        while pendientes:
+            # Despertar cuando venza la primera rama pendiente (en curso o en cola)
+            vencimientos = [v for v in (_vencimiento(futuros[f]) for f in pendientes) if v is not None]
+            espera = max(0.0, min(vencimientos) - time.perf_counter()) if vencimientos else None
+
+            listos, pendientes = wait(pendientes, timeout=espera, return_when=FIRST_COMPLETED)
+
+            for futuro in listos:
+                i = futuros[futuro]
+                resultado = resultados[i]
+                resultado.latencia = time.perf_counter() - inicios.get(i, time.perf_counter())
+                try:
+                    resultado.valor = futuro.result()
+                except Exception as e:
+                    resultado.error = e
+
+            ahora = time.perf_counter()
+            for futuro in list(pendientes):
+                i = futuros[futuro]
+                vence = _vencimiento(i)
+                if vence is not None and ahora >= vence:
+                    # El hilo no se puede matar: se abandona su resultado
+                    # (y si aún no había arrancado, ya no arrancará)
+                    resultados[i].agotado = True
+                    resultados[i].latencia = ahora - inicios[i] if i in inicios else 0.0
+                    futuro.cancel()
+                    pendientes.discard(futuro)
+    finally:
+        # No esperamos a los hilos abandonados por timeout
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return resultados
+
+
+async def ejecutar_en_paralelo_async(
+    ramas: list[tuple[str, Callable[[], Awaitable[Any]]]],
+    max_concurrencia: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> list[ResultadoRama]:
+    """
+    Variante asyncio: cada rama es una función que devuelve una corrutina
+    (por ejemplo, lambda: model.generate_content_async(prompt)).
+    """
+    # asyncio solo se importa si se usa esta variante (importarlo cuesta ~40 ms)
+    import asyncio
+
+    limite = asyncio.Semaphore(max_concurrencia or max(1, len(ramas)))
+
+    async def _correr(nombre: str, funcion: Callable[[], Awaitable[Any]]) -> ResultadoRama:
+        resultado = ResultadoRama(nombre)
+        async with limite:
+            inicio = time.perf_counter()
+            try:
+                resultado.valor = await asyncio.wait_for(funcion(), timeout)
+            except asyncio.TimeoutError:
+                resultado.agotado = True
+            except Exception as e:
+                resultado.error = e
+            resultado.latencia = time.perf_counter() - inicio
+        return resultado
+
+    return list(await asyncio.gather(*(_correr(n, f) for n, f in ramas)))
+
+
+def resumen_paralelo(resultados: list[ResultadoRama], tiempo_total: float) -> str:
+    """Texto corto con el tiempo total frente a la suma secuencial"""
+    suma = sum(r.latencia for r in resultados)
+    mas_lenta = max((r.latencia for r in resultados), default=0.0)
+    fallidas = sum(not r.ok for r in resultados)
+    return (
+        f"⏱️ Total: {tiempo_total:.2f}s | rama más lenta: {mas_lenta:.2f}s | "
+        f"suma secuencial: {suma:.2f}s | ramas fallidas: {fallidas}"
+    )
+
+
+if __name__ == "__main__":
+    # Demostración con un backend simulado con latencia artificial
+    import random
+
+    def llamada_simulada(latencia: float) -> Callable[[], str]:
+        def _llamar() -> str:
+            time.sleep(latencia)
+            return f"respuesta tras {latencia:.2f}s"
+
+        return _llamar
+
+    ramas = [(f"Rama {i}", llamada_simulada(random.uniform(0.2, 1.0))) for i in range(5)]
+    ramas.append(("Rama lenta", llamada_simulada(5.0)))
+
+    inicio = time.perf_counter()
+    resultados = ejecutar_en_paralelo(ramas, timeout=1.5)
+    total = time.perf_counter() - inicio
+
+    for r in resultados:
+        estado = "⏱️ agotada" if r.agotado else ("✓" if r.ok else f"❌ {r.error}")
+        print(f"{r.nombre}: {r.latencia:.2f}s {estado}")
+    print(resumen_paralelo(resultados, total))
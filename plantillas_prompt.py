@@ -0,0 +1,184 @@
+"""
+PLANTILLAS DE PROMPT CON PREFIJO ESTABLE
+
+La clasificación del routing y las revisiones de código reenvían el mismo
+bloque de instrucciones en cada llamada; solo cambia la consulta o el código.
+Una Plantilla separa las dos partes:
+
+- prefijo: lo estable (instrucciones, criterios, ejemplos). Se registra una
+  sola vez en el servidor como contenido cacheado (context caching) y el
+  modelo resultante se reutiliza en todas las llamadas; si el prefijo no
+  llega al mínimo de la API, va como system_instruction de un modelo del
+  registro (que Gemini puede aprovechar con su caché implícita).
+- sufijo: lo variable. Se compila una vez ("Consulta: {consulta}" → trozos
+  fijos + campos) y en cada llamada solo se rellenan los campos.
+
+La caché explícita se renueva sola al vencer el TTL.
+"""
+
+import string
+import threading
+import time
+from typing import Any, Optional
+
+from limitador import estimar_tokens
+from llamadas import generar
+from registro_modelos import MODELO_POR_DEFECTO, obtener_modelo
+
+# Mínimo de tokens que la API acepta en una caché explícita (Gemini 2.5 Flash)
+MIN_TOKENS_CACHE = 1024
+
+
+def compilar(sufijo: str) -> list[tuple[str, Optional[str], str, Optional[str]]]:
+    """Trozos (literal, campo, formato, conversión) de una plantilla str.format, analizada una vez"""
+    return list(string.Formatter().parse(sufijo))
+
+
+def _convertir(valor: Any, conversion: Optional[str]) -> Any:
+    if conversion == "r":
+        return repr(valor)
+    if conversion == "s":
+        return str(valor)
+    if conversion == "a":
+        return ascii(valor)
+    return valor
+
+
+class Plantilla:
+    """Prompt = prefijo estable (cacheado una vez) + sufijo variable (precompilado)"""
+
+    def __init__(
+        self,
+        prefijo: str,
+        sufijo: str = "{entrada}",
+        modelo: str = MODELO_POR_DEFECTO,
+        cachear: bool = True,
+        ttl: float = 3600,
+        min_tokens_cache: int = MIN_TOKENS_CACHE,
+    ):
+        self.prefijo = prefijo
+        self.sufijo = sufijo
+        self.nombre_modelo = modelo
+        self.cachear = cachear
+        self.ttl = ttl
+        self.min_tokens_cache = min_tokens_cache
+        self.tokens_prefijo = estimar_tokens(prefijo)
+        self._trozos = compilar(sufijo)
+        self.campos = sorted({campo for _, campo, _, _ in self._trozos if campo})
+        self._modelo: Any = None
+        self._backend: Any = None
+        self._expira = 0.0
+        self._lock = threading.Lock()
+        self.origen: Optional[str] = None  # "cache" o "system_instruction"
+        self.motivo_sin_cache: Optional[str] = None
+        self.stats = {"llamadas": 0, "caches_creadas": 0, "tokens_prefijo_reutilizados": 0}
+
+    def rellenar(self, **valores) -> str:
+        partes = []
+        for literal, campo, formato, conversion in self._trozos:
+            partes.append(literal)
+            if campo is not None:
+                partes.append(format(_convertir(valores[campo], conversion), formato or ""))
+        return "".join(partes)
+
+    def _crear_modelo(self, backend: Any) -> Any:
+        if self.cachear and self.tokens_prefijo >= self.min_tokens_cache:
+            try:
+                modelo = backend.crear_modelo_cacheado(
+                    self.nombre_modelo, system_instruction=self.prefijo, ttl=self.ttl
+                )
+                self.origen, self.motivo_sin_cache = "cache", None
+                self._expira = time.monotonic() + self.ttl * 0.9  # renovar antes de que venza
+                self.stats["caches_creadas"] += 1
+                return modelo
+            except Exception as e:
+                # Backend sin caché explícita, prefijo rechazado, cuota de almacenamiento...
+                self.motivo_sin_cache = f"{type(e).__name__}: {e}"
+        elif self.cachear:
+            self.motivo_sin_cache = f"prefijo de {self.tokens_prefijo} tokens < {self.min_tokens_cache}"
+        self.origen = "system_instruction"
+        self._expira = float("inf")
+        return obtener_modelo(self.nombre_modelo, system_instruction=self.prefijo)
+
+    def modelo(self) -> Any:
+        """El modelo con el prefijo ya registrado; se crea una vez y se reutiliza"""
+        from backends import backend_activo
+
+        backend = backend_activo()
+        with self._lock:
+            if self._modelo is None or self._backend is not backend or time.monotonic() >= self._expira:
+                self._modelo, self._backend = self._crear_modelo(backend), backend
+            self.stats["llamadas"] += 1
+            self.stats["tokens_prefijo_reutilizados"] += self.tokens_prefijo
+            return self._modelo
+
+    def generar(self, **valores) -> Any:
+        return generar(self.modelo(), self.rellenar(**valores))
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(origen=self.origen, tokens_prefijo=self.tokens_prefijo, motivo_sin_cache=self.motivo_sin_cache)
+        return stats
+
+
+if __name__ == "__main__":
+    # Tráfico de routing repetido: prompt completo en cada llamada vs. plantilla
+    # con system_instruction vs. plantilla sobre caché explícita
+    import random
+
+    from backends import BackendMock, latencia_constante, usar_backend
+    from enrutador_local import EJEMPLOS_SEMILLA
+    from limitador import LIMITADOR
+    from trazas import coste_estimado
+
+    azar = random.Random(0)
+    ejemplos = "\n".join(
+        f"Consulta: {texto} (caso {i})\nCategoría: {categoria}"
+        for i, (texto, categoria) in enumerate(azar.choices(EJEMPLOS_SEMILLA, k=120))
+    )
+    instrucciones = f"""Clasifica consultas de soporte en UNA categoría:
+- TECNICO (errores, bugs, problemas técnicos)
+- FACTURACION (pagos, facturas, cargos)
+- GENERAL (información general)
+
+Ejemplos resueltos:
+{ejemplos}
+
+Responde SOLO la categoría en mayúsculas."""
+    consultas = [f"{texto} — ticket {i}" for i, (texto, _) in enumerate(azar.choices(EJEMPLOS_SEMILLA, k=100))]
+
+    def medir(nombre: str, llamar) -> None:
+        mock = BackendMock(
+            respuestas={"*": "TECNICO"},
+            latencia=latencia_constante(0.02),
+            latencia_por_token=0.00005,
+        )
+        usar_backend(mock)
+        inicio = time.perf_counter()
+        for consulta in consultas:
+            llamar(consulta)
+        por_llamada = (time.perf_counter() - inicio) / len(consultas)
+        s = mock.estadisticas()
+        facturados = s["tokens_entrada"] - s["tokens_cacheados"]
+        coste = coste_estimado(s["tokens_entrada"], s["tokens_salida"], s["tokens_cacheados"])
+        print(
+            f"{nombre:<31} {por_llamada * 1e3:6.1f} ms/llamada  "
+            f"{s['tokens_entrada'] / len(consultas):6.0f} tokens entrada  "
+            f"{facturados / len(consultas):6.0f} a precio completo  ${coste * 1e6 / len(consultas):.0f} por millón de llamadas"
+        )
+
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+    print(f"Prefijo: {estimar_tokens(instrucciones)} tokens, {len(consultas)} consultas")
+    medir("f-string completo", lambda c: generar(obtener_modelo(), f"{instrucciones}\n\nConsulta: {c}", usar_cache=False))
+
+    por_instruccion = Plantilla(instrucciones, "Consulta: {consulta}", cachear=False)
+    medir("plantilla + system_instruction", lambda c: generar(por_instruccion.modelo(), por_instruccion.rellenar(consulta=c), usar_cache=False))
+
+    cacheada = Plantilla(instrucciones, "Consulta: {consulta}")
+    medir("plantilla + caché explícita", lambda c: generar(cacheada.modelo(), cacheada.rellenar(consulta=c), usar_cache=False))
+    print(cacheada.estadisticas())
+
+    corta = Plantilla("Clasifica en TECNICO, FACTURACION o GENERAL.", "Consulta: {consulta}")
+    corta.modelo()
+    print(f"Prefijo corto → {corta.origen} ({corta.motivo_sin_cache})")
@@ -0,0 +1,299 @@
+"""
+POLÍTICA DE LLAMADAS: PLAZOS Y PETICIONES DE COBERTURA (hedging)
+
+Una sola respuesta lenta de generate_content frena toda la cadena. Aquí:
+
+- Plazo por flujo: `with plazo(30):` fija un tiempo total que heredan todos
+  los pasos de dentro (también los que corren en otros hilos, porque viaja
+  en una contextvar que paralelizacion y flujo_dag copian). Cada llamada
+  espera como mucho lo que queda; un plazo anidado solo puede acortarlo.
+- Con plazo, la petición al modelo lleva `request_options={"timeout": ...}`
+  con lo que queda (ver con_timeout): la llamada termina de verdad al
+  vencer y su hilo queda libre, en vez de seguir esperando una respuesta
+  que ya nadie va a leer.
+- Cobertura opcional: si una llamada tarda más que el p95 observado, se
+  lanza un duplicado y se usa la primera respuesta que llegue. La otra se
+  abandona: si aún no había empezado se cancela, y si ya estaba en curso su
+  resultado se descarta (sin plazo, una petición HTTP síncrona en curso no
+  se puede interrumpir).
+- El gasto en duplicados tiene tope: como mucho `max_duplicados` (p. ej.
+  10 %) de las llamadas.
+- Solo se mide y se duplica la llamada al modelo: llamadas.generar pasa
+  antes por el limitador, así que las esperas de cupo y los reintentos por
+  429 no inflan el p95 y un duplicado no gasta otro hueco de RPM.
+
+Variables de entorno: LLM_COBERTURA=1 activa la cobertura,
+LLM_COBERTURA_MAX fija el tope de duplicados (0.1 por defecto).
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+import trazas
+
+_plazo: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("plazo_llm", default=None)
+
+
+class PlazoAgotado(TimeoutError):
+    """Se acabó el tiempo total del flujo"""
+
+
+@contextmanager
+def plazo(segundos: float) -> Iterator[float]:
+    """Tiempo total para todo lo que se ejecute dentro (anidado: el más corto manda)"""
+    limite = time.monotonic() + segundos
+    actual = _plazo.get()
+    if actual is not None:
+        limite = min(limite, actual)
+    token = _plazo.set(limite)
+    try:
+        yield limite
+    finally:
+        _plazo.reset(token)
+
+
+def tiempo_restante() -> Optional[float]:
+    """Segundos que le quedan al flujo actual (None si no hay plazo)"""
+    limite = _plazo.get()
+    return None if limite is None else limite - time.monotonic()
+
+
+def comprobar_plazo(paso: str = "") -> None:
+    restante = tiempo_restante()
+    if restante is not None and restante <= 0:
+        raise PlazoAgotado(f"Plazo agotado{f' antes de {paso}' if paso else ''}")
+
+
+def con_timeout(funcion: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    funcion (generate_content, send_message...) con request_options={"timeout": s},
+    donde s es lo que le queda al plazo en el momento de llamar. Si la
+    petición falla porque el plazo venció, se relanza como PlazoAgotado.
+    """
+
+    @functools.wraps(funcion)
+    def _llamar(*args, **kwargs):
+        restante = tiempo_restante()
+        if restante is None:
+            return funcion(*args, **kwargs)
+        comprobar_plazo()
+        opciones = kwargs.get("request_options")
+        if opciones is None:
+            kwargs["request_options"] = {"timeout": restante}
+        elif isinstance(opciones, dict):
+            kwargs["request_options"] = {**opciones, "timeout": min(opciones.get("timeout", restante), restante)}
+        try:
+            return funcion(*args, **kwargs)
+        except Exception as e:
+            if tiempo_restante() <= 0:
+                raise PlazoAgotado("Plazo agotado esperando al modelo") from e
+            raise
+
+    return _llamar
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+class PoliticaLlamadas:
+    """Aplica el plazo del flujo y, si está activa, la cobertura a cada llamada"""
+
+    def __init__(
+        self,
+        cobertura: bool = False,
+        percentil: float = 0.95,
+        max_duplicados: float = 0.1,
+        min_muestras: int = 20,
+        ventana: int = 500,
+        max_hilos: int = 64,
+    ):
+        self.cobertura = cobertura
+        self.percentil = percentil
+        self.max_duplicados = max_duplicados
+        self.min_muestras = min_muestras
+        self._latencias: deque[float] = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+        self._max_hilos = max_hilos
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.stats = {
+            "llamadas": 0,
+            "duplicados": 0,  # peticiones de cobertura lanzadas
+            "ganados_por_duplicado": 0,
+            "abandonadas": 0,  # perdedoras canceladas o descartadas
+            "sin_cupo_duplicado": 0,  # coberturas no lanzadas por el tope
+            "plazos_agotados": 0,
+        }
+
+    @classmethod
+    def desde_entorno(cls) -> "PoliticaLlamadas":
+        return cls(
+            cobertura=os.getenv("LLM_COBERTURA") == "1",
+            max_duplicados=float(os.getenv("LLM_COBERTURA_MAX", "0.1")),
+        )
+
+    def configurar(self, cobertura: Optional[bool] = None, max_duplicados: Optional[float] = None) -> None:
+        with self._lock:
+            if cobertura is not None:
+                self.cobertura = cobertura
+            if max_duplicados is not None:
+                self.max_duplicados = max_duplicados
+
+    def reiniciar_estadisticas(self) -> None:
+        with self._lock:
+            self._latencias.clear()
+            self.stats = dict.fromkeys(self.stats, 0)
+
+    def umbral_cobertura(self) -> Optional[float]:
+        """Latencia a partir de la cual se lanza el duplicado (p95 observado)"""
+        with self._lock:
+            if len(self._latencias) < self.min_muestras:
+                return None
+            return _percentil(list(self._latencias), self.percentil)
+
+    def _registrar_latencia(self, latencia: float) -> None:
+        with self._lock:
+            self._latencias.append(latencia)
+
+    def _contar(self, clave: str) -> None:
+        with self._lock:
+            self.stats[clave] += 1
+
+    def _hay_cupo_duplicado(self) -> bool:
+        with self._lock:
+            if self.stats["duplicados"] + 1 > self.max_duplicados * self.stats["llamadas"]:
+                self.stats["sin_cupo_duplicado"] += 1
+                return False
+            self.stats["duplicados"] += 1
+            return True
+
+    def _lanzar(self, funcion: Callable[..., Any], args: tuple, kwargs: dict):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._max_hilos, thread_name_prefix="politica")
+            pool = self._pool
+
+        def _intento(*args, **kwargs) -> Any:
+            # Se mide desde que el intento arranca: la cola del pool no cuenta para
+            # el p95. Todos los que terminan bien (también los abandonados) lo alimentan
+            inicio = time.perf_counter()
+            resultado = funcion(*args, **kwargs)
+            self._registrar_latencia(time.perf_counter() - inicio)
+            return resultado
+
+        return pool.submit(contextvars.copy_context().run, _intento, *args, **kwargs)
+
+    def ejecutar(self, funcion: Callable[..., Any], *args, **kwargs) -> Any:
+        """funcion(*args, **kwargs) dentro del plazo y con cobertura si procede"""
+        comprobar_plazo()
+        restante = tiempo_restante()
+        umbral = self.umbral_cobertura() if self.cobertura else None
+        with self._lock:
+            self.stats["llamadas"] += 1
+
+        if restante is None and umbral is None:
+            # Camino directo: ni plazo ni cobertura (o aún sin muestras para el p95), ni hilos
+            inicio = time.perf_counter()
+            resultado = funcion(*args, **kwargs)
+            self._registrar_latencia(time.perf_counter() - inicio)
+            return resultado
+
+        limite = None if restante is None else time.monotonic() + restante
+        principal = self._lanzar(funcion, args, kwargs)
+        en_curso = {principal}
+        duplicado = None
+
+        def _espera(hasta: Optional[float]) -> Optional[float]:
+            candidatos = [t for t in (hasta, limite) if t is not None]
+            return max(0.0, min(candidatos) - time.monotonic()) if candidatos else None
+
+        momento_cobertura = None if umbral is None else time.monotonic() + umbral
+        while True:
+            listos, _ = wait(en_curso, timeout=_espera(momento_cobertura), return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                en_curso.discard(futuro)
+                if futuro.exception() is None or not en_curso:
+                    # Ganó esta (o falló y ya no queda otra que esperar)
+                    for perdedor in en_curso:
+                        perdedor.cancel()
+                        self._contar("abandonadas")
+                    if futuro is duplicado and futuro.exception() is None:
+                        self._contar("ganados_por_duplicado")
+                        trazas.evento("cobertura_ganada", umbral=umbral)
+                    return futuro.result()
+            if limite is not None and time.monotonic() >= limite:
+                for futuro in en_curso:
+                    futuro.cancel()
+                    self._contar("abandonadas")
+                self._contar("plazos_agotados")
+                trazas.evento("plazo_agotado")
+                raise PlazoAgotado("Plazo agotado esperando al modelo")
+            if momento_cobertura is not None and time.monotonic() >= momento_cobertura:
+                momento_cobertura = None
+                if self._hay_cupo_duplicado():
+                    trazas.evento("cobertura", umbral=umbral)
+                    duplicado = self._lanzar(funcion, args, kwargs)
+                    en_curso.add(duplicado)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["tasa_duplicados"] = stats["duplicados"] / stats["llamadas"] if stats["llamadas"] else 0.0
+        stats["umbral_cobertura"] = self.umbral_cobertura()
+        return stats
+
+
+# Política compartida por todas las llamadas (ver llamadas.generar)
+POLITICA = PoliticaLlamadas.desde_entorno()
+
+
+if __name__ == "__main__":
+    # Latencias de cola pesada (Pareto): p50/p95/p99 con y sin cobertura
+    from backends import BackendMock, latencia_constante, latencia_pareto, usar_backend
+    from limitador import LIMITADOR
+    from llamadas import generar
+    from paralelizacion import ejecutar_en_paralelo
+    from politica_llamadas import POLITICA, PlazoAgotado, plazo  # noqa: F811 (la que usa llamadas.py)
+    from registro_modelos import obtener_modelo
+
+    LIMITADOR.configurar(rpm=1_000_000, tpm=1_000_000_000)
+
+    def medir(cobertura: bool, n: int = 600) -> None:
+        usar_backend(BackendMock(latencia=latencia_pareto(0.05, alfa=1.3, maximo=4.0), semilla=7))
+        POLITICA.configurar(cobertura=cobertura, max_duplicados=0.1)
+        POLITICA.reiniciar_estadisticas()
+        modelo = obtener_modelo()
+        ramas = [(f"{i}", lambda i=i: generar(modelo, f"Pregunta {i}", usar_cache=False)) for i in range(n)]
+        resultados = ejecutar_en_paralelo(ramas, max_concurrencia=24)
+        latencias = sorted(r.latencia for r in resultados if r.ok)
+        s = POLITICA.estadisticas()
+        p = lambda q: _percentil(latencias, q)  # noqa: E731
+        print(
+            f"{'con' if cobertura else 'sin'} cobertura: p50={p(0.5):.3f}s p95={p(0.95):.3f}s "
+            f"p99={p(0.99):.3f}s | duplicados {s['tasa_duplicados']:.1%} "
+            f"(ganaron {s['ganados_por_duplicado']}, sin cupo {s['sin_cupo_duplicado']})"
+        )
+
+    medir(cobertura=False)
+    medir(cobertura=True)
+
+    # Plazo total de un flujo de tres pasos de 0.15s: el tercero ya no cabe
+    usar_backend(BackendMock(latencia=latencia_constante(0.15)))
+    modelo = obtener_modelo()
+    inicio = time.perf_counter()
+    try:
+        with plazo(0.3):
+            for paso in range(3):
+                generar(modelo, f"Paso {paso} del flujo", usar_cache=False)
+                print(f"  paso {paso} listo en {time.perf_counter() - inicio:.2f}s")
+    except PlazoAgotado as e:
+        print(f"  {e} a los {time.perf_counter() - inicio:.2f}s (plazo 0.3s)")
@@ -0,0 +1,131 @@
+"""
+REGISTRO DE MODELOS
+
+Construir un GenerativeModel por consulta repite trabajo y pierde la
+reutilización de conexiones. El registro crea cada combinación
+(nombre, system_instruction, tools) una sola vez y la comparte entre hilos.
+"""
+
+import threading
+from typing import Any, Callable, Optional, Sequence
+
+MODELO_POR_DEFECTO = "models/gemini-flash-latest"
+
+
+def _fabrica_activa(nombre: str, **kwargs) -> Any:
+    """Delega en el backend activo (Gemini por defecto, mock con LLM_BACKEND=mock)"""
+    from backends import backend_activo
+
+    return backend_activo().crear_modelo(nombre, **kwargs)
+
+
+class RegistroModelos:
+    """Caché de instancias de modelo, segura para varios hilos"""
+
+    def __init__(self, fabrica: Callable[..., Any] = _fabrica_activa):
+        self.fabrica = fabrica
+        self._modelos: dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.creados = 0
+        self.reutilizados = 0
+
+    @staticmethod
+    def _clave(nombre: str, system_instruction: Optional[str], tools: Optional[Sequence]) -> tuple:
+        # Las funciones-herramienta se identifican por su objeto, no por su nombre
+        return (nombre, system_instruction, tuple(tools) if tools else None)
+
+    def obtener(
+        self,
+        nombre: str = MODELO_POR_DEFECTO,
+        system_instruction: Optional[str] = None,
+        tools: Optional[Sequence] = None,
+    ) -> Any:
+        clave = self._clave(nombre, system_instruction, tools)
+        modelo = self._modelos.get(clave)
+        if modelo is not None:
+            self.reutilizados += 1
+            return modelo
+
+        with self._lock:
+            # Otro hilo pudo crearlo mientras esperábamos el lock
+            modelo = self._modelos.get(clave)
+            if modelo is None:
+                kwargs = {}
+                if system_instruction is not None:
+                    kwargs["system_instruction"] = system_instruction
+                if tools:
+                    kwargs["tools"] = list(tools)
+                modelo = self.fabrica(nombre, **kwargs)
+                self._modelos[clave] = modelo
+                self.creados += 1
+            else:
+                self.reutilizados += 1
+        return modelo
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._modelos.clear()
+
+    def estadisticas(self) -> dict:
+        return {
+            "modelos": len(self._modelos),
+            "creados": self.creados,
+            "reutilizados": self.reutilizados,
+        }
+
+
+# Registro compartido por ambos scripts
+REGISTRO = RegistroModelos()
+
+
+def obtener_modelo(
+    nombre: str = MODELO_POR_DEFECTO,
+    system_instruction: Optional[str] = None,
+    tools: Optional[Sequence] = None,
+) -> Any:
+    """Atajo sobre el registro compartido"""
+    return REGISTRO.obtener(nombre, system_instruction, tools)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: coste por consulta de construir el modelo frente a reutilizarlo
+    import timeit
+
+    instrucciones = [
+        "Experto en soporte técnico. Da soluciones paso a paso y técnicas.",
+        "Asistente de facturación. Sé empático y explica claramente.",
+        "Asistente amigable. Responde de forma concisa y útil.",
+    ]
+    repeticiones = 2000
+
+    try:
+        import google.generativeai  # noqa: F401
+        from backends import BackendGemini
+
+        fabrica = BackendGemini().crear_modelo
+        print("Usando google.generativeai.GenerativeModel real (sin llamadas de red)")
+    except ImportError:
+        # Sin el SDK instalado medimos con un objeto de construcción no trivial
+        class ModeloFalso:
+            def __init__(self, nombre, **kwargs):
+                self.nombre = nombre
+                self.config = {k: repr(v) for k, v in kwargs.items()}
+
+        fabrica = ModeloFalso
+        print("google.generativeai no está instalado: usando un modelo simulado")
+
+    def sin_registro(i=[0]):
+        i[0] += 1
+        fabrica(MODELO_POR_DEFECTO, system_instruction=instrucciones[i[0] % 3])
+
+    registro = RegistroModelos(fabrica)
+
+    def con_registro(i=[0]):
+        i[0] += 1
+        registro.obtener(MODELO_POR_DEFECTO, instrucciones[i[0] % 3])
+
+    antes = timeit.timeit(sin_registro, number=repeticiones) / repeticiones
+    despues = timeit.timeit(con_registro, number=repeticiones) / repeticiones
+    print(f"Construir por consulta: {antes * 1e6:8.2f} µs/consulta")
+    print(f"Registro compartido:    {despues * 1e6:8.2f} µs/consulta")
+    print(f"Aceleración: x{antes / despues:.1f} | {registro.estadisticas()}")
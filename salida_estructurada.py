@@ -0,0 +1,575 @@
+"""
+SALIDA ESTRUCTURADA (JSON con esquema, validado y reparado localmente)
+
+Leer texto libre es frágil: `response.text.strip()` como categoría, dividir
+una lista numerada por '\\n', buscar "Puntuación: 7" en prosa. Si el formato
+cambia un poco, el flujo cae en silencio en GENERAL o se rompe. Aquí:
+
+- El tipo esperado se declara con una dataclass (o una clase con __slots__)
+  y se traduce a `response_schema`; se pide `response_mime_type` JSON.
+- La respuesta se valida contra ese tipo y se devuelve como instancia.
+- Los defectos pequeños se reparan en local en lugar de volver a preguntar:
+  bloque ```json, texto alrededor, comillas simples, claves sin comillas,
+  comas finales, True/None de Python, JSON cortado, enums en otra
+  grafía o dentro de una frase (si solo aparece una opción), "8/10" donde va un número, un valor suelto donde va un objeto de
+  un solo campo, una lista numerada donde va un array...
+- Solo si ni así es válida se pregunta otra vez (con el error) y se cuenta.
+- AnalizadorIncremental entrega los elementos de un array a medida que
+  llegan por streaming.
+"""
+
+import dataclasses
+import inspect
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Iterator, Literal, Optional, Union, get_args, get_origin, get_type_hints
+
+from llamadas import generar, generar_stream
+from normalizacion import normalizar
+from registro_modelos import obtener_modelo
+
+PROMPT_CORREGIR = """
+
+Tu respuesta anterior no cumplía el formato pedido ({error}):
+{respuesta}
+
+Responde SOLO con JSON válido según el esquema."""
+
+
+class ErrorEsquema(ValueError):
+    """La respuesta no se pudo convertir al tipo pedido ni reparándola"""
+
+
+# ============================================
+# TIPO PYTHON → response_schema
+# ============================================
+
+_ESCALARES = {str: "STRING", int: "INTEGER", float: "NUMBER", bool: "BOOLEAN"}
+
+
+def _es_clase_esquema(tipo: Any) -> bool:
+    return inspect.isclass(tipo) and (dataclasses.is_dataclass(tipo) or hasattr(tipo, "__slots__"))
+
+
+def _campos(tipo: type) -> list[tuple[str, Any, bool, Any]]:
+    """(nombre, tipo, obligatorio, valor por defecto) de una dataclass o clase con __slots__"""
+    pistas = get_type_hints(tipo)
+    if dataclasses.is_dataclass(tipo):
+        campos = []
+        for campo in dataclasses.fields(tipo):
+            if campo.default is not dataclasses.MISSING:
+                campos.append((campo.name, pistas[campo.name], False, campo.default))
+            elif campo.default_factory is not dataclasses.MISSING:
+                campos.append((campo.name, pistas[campo.name], False, campo.default_factory()))
+            else:
+                campos.append((campo.name, pistas[campo.name], True, None))
+        return campos
+    slots = [tipo.__slots__] if isinstance(tipo.__slots__, str) else list(tipo.__slots__)
+    parametros = inspect.signature(tipo.__init__).parameters
+    campos = []
+    for nombre in slots:
+        defecto = parametros[nombre].default if nombre in parametros else inspect.Parameter.empty
+        obligatorio = defecto is inspect.Parameter.empty
+        campos.append((nombre, pistas.get(nombre, Any), obligatorio, None if obligatorio else defecto))
+    return campos
+
+
+def esquema_de(tipo: Any) -> dict:
+    """response_schema (subconjunto OpenAPI que acepta Gemini) para un tipo de Python"""
+    origen, args = get_origin(tipo), get_args(tipo)
+    if tipo in _ESCALARES:
+        return {"type": _ESCALARES[tipo]}
+    if origen is Literal:
+        return {"type": "STRING", "format": "enum", "enum": [str(a) for a in args]}
+    if origen is Union:
+        resto = [a for a in args if a is not type(None)]
+        return {**esquema_de(resto[0]), "nullable": True}
+    if origen is list:
+        return {"type": "ARRAY", "items": esquema_de(args[0] if args else str)}
+    if _es_clase_esquema(tipo):
+        campos = _campos(tipo)
+        return {
+            "type": "OBJECT",
+            "properties": {nombre: esquema_de(t) for nombre, t, _, _ in campos},
+            "required": [nombre for nombre, _, obligatorio, _ in campos if obligatorio],
+        }
+    raise TypeError(f"Tipo sin esquema: {tipo!r}")
+
+
+# ============================================
+# REPARACIÓN DE JSON
+# ============================================
+
+_BLOQUE_CODIGO = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.S)
+_LITERALES_PYTHON = {"True": "true", "False": "false", "None": "null"}
+_LITERALES_JSON = {"true", "false", "null"}
+
+
+def _leer_cadena(texto: str, i: int, reparaciones: list[str]) -> tuple[str, int]:
+    """Cadena que empieza en texto[i] (comilla simple o doble) → (cadena JSON, posición siguiente)"""
+    comilla, j, partes = texto[i], i + 1, []
+    while j < len(texto) and texto[j] != comilla:
+        c = texto[j]
+        if c == "\\" and j + 1 < len(texto):
+            partes.append(texto[j : j + 2])
+            j += 2
+            continue
+        if c == '"':
+            partes.append('\\"')
+        elif c == "\n":
+            partes.append("\\n")
+            reparaciones.append("salto de línea en cadena")
+        else:
+            partes.append(c)
+        j += 1
+    if comilla == "'":
+        reparaciones.append("comillas simples")
+    if j >= len(texto):
+        reparaciones.append("cadena sin cerrar")
+    return '"' + "".join(partes) + '"', j + 1
+
+
+def _normalizar_json(texto: str, reparaciones: list[str]) -> str:
+    """Reescribe JSON "casi válido" como JSON; cierra lo que quedó abierto"""
+    salida: list[str] = []
+    pila: list[str] = []
+    comas: list[tuple[int, list[str]]] = []  # para recortar un JSON cortado a mitad de elemento
+    i = 0
+    while i < len(texto):
+        c = texto[i]
+        if c in "\"'":
+            cadena, i = _leer_cadena(texto, i, reparaciones)
+            salida.append(cadena)
+            continue
+        if c in "{[":
+            pila.append("}" if c == "{" else "]")
+            salida.append(c)
+        elif c in "}]":
+            while salida and salida[-1].isspace():
+                salida.pop()
+            if salida and salida[-1] == ",":
+                salida.pop()
+                reparaciones.append("coma final")
+            if pila:
+                pila.pop()
+            salida.append(c)
+            if not pila:
+                if texto[i + 1 :].strip():
+                    reparaciones.append("texto sobrante")
+                return "".join(salida)
+        elif c.isalpha() or c == "_":
+            fin = i
+            while fin < len(texto) and (texto[fin].isalnum() or texto[fin] == "_"):
+                fin += 1
+            palabra = texto[i:fin]
+            siguiente = texto[fin:].lstrip()[:1]
+            if siguiente == ":":
+                salida.append(json.dumps(palabra, ensure_ascii=False))
+                reparaciones.append("clave sin comillas")
+            elif palabra in _LITERALES_PYTHON:
+                salida.append(_LITERALES_PYTHON[palabra])
+                reparaciones.append("literal de Python")
+            elif palabra in _LITERALES_JSON:
+                salida.append(palabra)
+            else:
+                salida.append(json.dumps(palabra, ensure_ascii=False))
+                reparaciones.append("valor sin comillas")
+            i = fin
+            continue
+        else:
+            if c == ",":
+                comas.append((len(salida), list(pila)))
+            salida.append(c)
+        i += 1
+
+    if not pila:
+        return "".join(salida)
+    # JSON cortado (p. ej. por max_output_tokens): cerrar lo abierto
+    reparaciones.append("JSON sin cerrar")
+    cuerpo = "".join(salida).rstrip().rstrip(",")
+    candidatos = [cuerpo, cuerpo + " null"]
+    if comas:
+        posicion, pila_coma = comas[-1]
+        candidatos.append(("".join(salida[:posicion]), pila_coma))
+    for candidato in candidatos:
+        texto_c, pila_c = candidato if isinstance(candidato, tuple) else (candidato, pila)
+        completo = texto_c + "".join(reversed(pila_c))
+        try:
+            json.loads(completo)
+            return completo
+        except json.JSONDecodeError:
+            continue
+    return cuerpo + "".join(reversed(pila))
+
+
+def reparar_json(texto: str) -> tuple[Any, list[str]]:
+    """
+    Interpreta `texto` como JSON, reparando defectos comunes.
+    Devuelve (datos, reparaciones aplicadas); lanza ErrorEsquema si no hay forma.
+    """
+    reparaciones: list[str] = []
+    limpio = texto.strip()
+    try:
+        return json.loads(limpio), reparaciones
+    except json.JSONDecodeError:
+        pass
+
+    bloque = _BLOQUE_CODIGO.search(limpio)
+    if bloque:
+        limpio = bloque.group(1).strip()
+        reparaciones.append("bloque de código")
+
+    posiciones = [p for p in (limpio.find("{"), limpio.find("[")) if p != -1]
+    if not posiciones:
+        # Ni objeto ni array: un valor suelto (número, o texto sin comillas)
+        try:
+            return json.loads(limpio), reparaciones
+        except json.JSONDecodeError:
+            reparaciones.append("texto sin JSON")
+            return limpio, reparaciones
+    inicio = min(posiciones)
+    if limpio[:inicio].strip():
+        reparaciones.append("texto alrededor")
+
+    normalizado = _normalizar_json(limpio[inicio:], reparaciones)
+    try:
+        return json.loads(normalizado), reparaciones
+    except json.JSONDecodeError as e:
+        raise ErrorEsquema(f"JSON irreparable: {e}") from e
+
+
+# ============================================
+# VALIDACIÓN CONTRA EL TIPO
+# ============================================
+
+_NUMERO = re.compile(r"-?\d+(?:[.,]\d+)?")
+_ITEM_LISTA = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(.*\S)")
+
+
+def _clave_normalizada(texto: str) -> str:
+    return re.sub(r"[\s_-]+", "", normalizar(str(texto)))
+
+
+def _convertir(valor: Any, tipo: Any, ruta: str, reparaciones: list[str]) -> Any:
+    origen, args = get_origin(tipo), get_args(tipo)
+
+    if tipo is Any:
+        return valor
+    if origen is Union:
+        if valor is None and type(None) in args:
+            return None
+        resto = [a for a in args if a is not type(None)]
+        return _convertir(valor, resto[0], ruta, reparaciones)
+    if origen is Literal:
+        if valor in args:
+            return valor
+        buscado = _clave_normalizada(valor)
+        for opcion in args:
+            if _clave_normalizada(opcion) == buscado:
+                reparaciones.append("enum en otra grafía")
+                return opcion
+        # "Categoría: TECNICO." y similares; con dos opciones en el texto
+        # ("no es TECNICO, es FACTURACION") no hay forma segura de elegir
+        texto = normalizar(str(valor))
+        presentes = [o for o in args if re.search(rf"\b{re.escape(_clave_normalizada(o))}\b", texto)]
+        if len(presentes) == 1:
+            reparaciones.append("enum dentro de texto")
+            return presentes[0]
+        if presentes:
+            raise ErrorEsquema(f"{ruta}: {valor!r} menciona varias de {list(args)}")
+        raise ErrorEsquema(f"{ruta}: {valor!r} no es una de {list(args)}")
+    if tipo is bool:
+        if isinstance(valor, bool):
+            return valor
+        if isinstance(valor, str) and normalizar(valor).strip() in ("true", "si", "false", "no"):
+            reparaciones.append("booleano como texto")
+            return normalizar(valor).strip() in ("true", "si")
+        raise ErrorEsquema(f"{ruta}: se esperaba booleano, llegó {valor!r}")
+    if tipo in (int, float):
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            if tipo is int and valor != int(valor):
+                reparaciones.append("número redondeado")
+                return round(valor)
+            return tipo(valor)
+        if isinstance(valor, str):
+            numero = _NUMERO.search(valor)
+            if numero:
+                reparaciones.append("número como texto")
+                convertido = float(numero.group().replace(",", "."))
+                return round(convertido) if tipo is int else convertido
+        raise ErrorEsquema(f"{ruta}: se esperaba número, llegó {valor!r}")
+    if tipo is str:
+        if isinstance(valor, str):
+            return valor
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            reparaciones.append("número como texto")
+            return str(valor)
+        raise ErrorEsquema(f"{ruta}: se esperaba texto, llegó {valor!r}")
+    if origen is list or tipo is list:
+        elemento = args[0] if args else Any
+        if isinstance(valor, str):
+            items = [m.group(1) for m in map(_ITEM_LISTA.match, valor.splitlines()) if m]
+            if items:
+                reparaciones.append("lista numerada")
+                valor = items
+        if not isinstance(valor, list):
+            reparaciones.append("valor suelto como lista")
+            valor = [valor]
+        return [_convertir(v, elemento, f"{ruta}[{i}]", reparaciones) for i, v in enumerate(valor)]
+    if origen is dict or tipo is dict:
+        if isinstance(valor, dict):
+            return valor
+        raise ErrorEsquema(f"{ruta}: se esperaba objeto, llegó {valor!r}")
+    if _es_clase_esquema(tipo):
+        return _construir(valor, tipo, ruta, reparaciones)
+    raise TypeError(f"Tipo no soportado: {tipo!r}")
+
+
+def _construir(valor: Any, tipo: type, ruta: str, reparaciones: list[str]) -> Any:
+    campos = _campos(tipo)
+    if not isinstance(valor, dict):
+        obligatorios = [c for c in campos if c[2]] or campos[:1]
+        if len(obligatorios) != 1:
+            raise ErrorEsquema(f"{ruta or tipo.__name__}: se esperaba objeto, llegó {valor!r}")
+        # Un valor suelto donde se pedía {"categoria": ...}
+        reparaciones.append("objeto envuelto")
+        valor = {obligatorios[0][0]: valor}
+
+    por_clave = {_clave_normalizada(k): k for k in valor}
+    argumentos = {}
+    for nombre, tipo_campo, obligatorio, defecto in campos:
+        if nombre in valor:
+            crudo = valor[nombre]
+        elif _clave_normalizada(nombre) in por_clave:
+            crudo = valor[por_clave[_clave_normalizada(nombre)]]
+            reparaciones.append("clave en otra grafía")
+        elif obligatorio:
+            raise ErrorEsquema(f"{ruta or tipo.__name__}: falta el campo '{nombre}'")
+        else:
+            argumentos[nombre] = defecto
+            continue
+        argumentos[nombre] = _convertir(crudo, tipo_campo, f"{ruta}.{nombre}".lstrip("."), reparaciones)
+
+    try:
+        return tipo(**argumentos)
+    except TypeError:
+        # Clases con __slots__ sin __init__ por campos
+        instancia = object.__new__(tipo)
+        for nombre, v in argumentos.items():
+            setattr(instancia, nombre, v)
+        return instancia
+
+
+# Reparaciones que adivinan la intención a partir de prosa, no de un JSON
+# defectuoso: válidas para leer una respuesta, dudosas como prueba de que
+# el modelo siguió el formato (ver cascada.por_esquema(estricto=True))
+REPARACIONES_DUDOSAS = ("texto sin JSON", "objeto envuelto", "enum dentro de texto")
+
+
+def interpretar(texto: str, tipo: Any) -> tuple[Any, list[str]]:
+    """Texto del modelo → (instancia de `tipo`, reparaciones aplicadas)"""
+    datos, reparaciones = reparar_json(texto)
+    return _convertir(datos, tipo, "", reparaciones), reparaciones
+
+
+# ============================================
+# STREAMING: elementos de un array a medida que llegan
+# ============================================
+
+
+class AnalizadorIncremental:
+    """
+    Se alimenta con fragmentos de texto y devuelve cada elemento del primer
+    array en cuanto se cierra, sin esperar al final de la respuesta.
+    """
+
+    def __init__(self, tipo_elemento: Any = Any):
+        self.tipo_elemento = tipo_elemento
+        self.texto = ""
+        self.reparaciones: list[str] = []
+        self._pos = 0
+        self._profundidad = 0
+        self._en_cadena = False
+        self._escape = False
+        self._nivel_array: Optional[int] = None  # profundidad dentro del primer array
+        self._inicio: Optional[int] = None
+        self._cerrado = False
+
+    def _elemento(self, fin: int) -> list:
+        crudo = self.texto[self._inicio : fin].strip()
+        self._inicio = None
+        if not crudo:
+            return []
+        datos, reparaciones = reparar_json(crudo)
+        self.reparaciones.extend(reparaciones)
+        return [_convertir(datos, self.tipo_elemento, "", self.reparaciones)]
+
+    def alimentar(self, fragmento: str) -> list:
+        self.texto += fragmento
+        nuevos = []
+        while self._pos < len(self.texto) and not self._cerrado:
+            c = self.texto[self._pos]
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+            elif c == '"':
+                self._en_cadena = True
+            elif c in "{[":
+                self._profundidad += 1
+                if c == "[" and self._nivel_array is None:
+                    self._nivel_array = self._profundidad
+                    self._inicio = self._pos + 1
+            elif c in "}]":
+                if c == "]" and self._profundidad == self._nivel_array:
+                    nuevos += self._elemento(self._pos)
+                    self._cerrado = True
+                self._profundidad -= 1
+            elif c == "," and self._profundidad == self._nivel_array:
+                nuevos += self._elemento(self._pos)
+                self._inicio = self._pos + 1
+            self._pos += 1
+        return nuevos
+
+    def terminar(self) -> list:
+        """Si el array quedó sin cerrar (respuesta cortada), su último elemento"""
+        if self._cerrado or self._inicio is None:
+            return []
+        try:
+            return self._elemento(len(self.texto))
+        except ErrorEsquema:
+            return []
+
+
+# ============================================
+# LLAMADAS CON SALIDA ESTRUCTURADA
+# ============================================
+
+
+class SalidaEstructurada:
+    """Pide JSON con esquema, lo valida y repara; vuelve a preguntar solo si hace falta"""
+
+    def __init__(self, tipo: Any, modelo: Any = None, max_reintentos: int = 1):
+        self.tipo = tipo
+        self.modelo = modelo
+        self.max_reintentos = max_reintentos
+        self.esquema = esquema_de(tipo)
+        self._lock = threading.Lock()
+        self.stats = {
+            "respuestas": 0,
+            "validas": 0,  # sin tocar nada
+            "reparadas": 0,  # cada una es un re-ask evitado
+            "reintentos": 0,
+            "fallidas": 0,
+        }
+        self.reparaciones: Counter = Counter()
+
+    def configuracion(self) -> dict:
+        return {"response_mime_type": "application/json", "response_schema": self.esquema}
+
+    def _contar(self, clave: str, reparaciones: Optional[list[str]] = None) -> None:
+        with self._lock:
+            self.stats[clave] += 1
+            self.reparaciones.update(set(reparaciones or ()))
+
+    def interpretar(self, texto: str) -> Any:
+        """Como interpretar(), pero contando; lanza ErrorEsquema si no se puede"""
+        try:
+            valor, reparaciones = interpretar(texto, self.tipo)
+        except ErrorEsquema:
+            self._contar("respuestas")
+            raise
+        self._contar("respuestas")
+        self._contar("reparadas" if reparaciones else "validas", reparaciones)
+        return valor
+
+    def pedir(self, prompt: str, modelo: Any = None, **kwargs) -> Any:
+        modelo = modelo or self.modelo or obtener_modelo()
+        intento_prompt = prompt
+        for intento in range(self.max_reintentos + 1):
+            respuesta = generar(modelo, intento_prompt, generation_config=self.configuracion(), **kwargs)
+            texto = respuesta.text
+            try:
+                return self.interpretar(texto)
+            except ErrorEsquema as e:
+                if intento == self.max_reintentos:
+                    self._contar("fallidas")
+                    raise
+                self._contar("reintentos")
+                intento_prompt = prompt + PROMPT_CORREGIR.format(error=e, respuesta=texto[:500])
+
+    def pedir_elementos(self, prompt: str, modelo: Any = None) -> Iterator[Any]:
+        """Para tipos list[X]: entrega cada elemento en cuanto llega por streaming"""
+        modelo = modelo or self.modelo or obtener_modelo()
+        elemento = (get_args(self.tipo) or (Any,))[0]
+        analizador = AnalizadorIncremental(elemento)
+        flujo = generar_stream(modelo, prompt, generation_config=self.configuracion())
+        entregados = 0
+        for fragmento in flujo:
+            for valor in analizador.alimentar(fragmento):
+                entregados += 1
+                yield valor
+        for valor in analizador.terminar():
+            entregados += 1
+            yield valor
+        if entregados == 0:
+            # Sin array en la respuesta (p. ej. una lista numerada): lectura completa
+            yield from self.interpretar(flujo.texto)
+            return
+        self._contar("respuestas")
+        self._contar("reparadas" if analizador.reparaciones else "validas", analizador.reparaciones)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["reparaciones"] = dict(self.reparaciones)
+        stats["reasks_evitados"] = stats["reparadas"]
+        stats["tasa_reparacion"] = stats["reparadas"] / stats["respuestas"] if stats["respuestas"] else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    from dataclasses import dataclass
+
+    @dataclass
+    class Clasificacion:
+        categoria: Literal["TECNICO", "FACTURACION", "GENERAL"]
+        confianza: float = 1.0
+
+    class Evaluacion:
+        __slots__ = ("puntuacion", "sugerencia")
+        puntuacion: float
+        sugerencia: str
+
+        def __init__(self, puntuacion: float, sugerencia: str = ""):
+            self.puntuacion = puntuacion
+            self.sugerencia = sugerencia
+
+    print(json.dumps(esquema_de(Clasificacion), ensure_ascii=False))
+    casos = [
+        (Clasificacion, '{"categoria": "TECNICO", "confianza": 0.9}'),
+        (Clasificacion, "TECNICO"),
+        (Clasificacion, "```json\n{'categoria': 'técnico',}\n```"),
+        (Clasificacion, 'Claro: {categoria: "FACTURACION", confianza: "alta 0.8"}'),
+        (Evaluacion, '{"puntuación": "8/10", "sugerencia": "más corto"'),
+        (Evaluacion, '{"puntuacion": 7, "sugerencia": "añade un verbo", "extra": [1, 2'),
+        (list[str], "1. Lleva bolsa propia\n2. Evita pajitas\n3. Compra a granel"),
+        (Clasificacion, "No sabría decirlo"),
+        (Clasificacion, "No es TECNICO, es FACTURACION"),
+    ]
+    for tipo, texto in casos:
+        try:
+            valor, reparaciones = interpretar(texto, tipo)
+            mostrado = valor if not hasattr(valor, "__slots__") else {s: getattr(valor, s) for s in valor.__slots__}
+            print(f"✅ {texto[:40]!r:45} → {mostrado} {reparaciones or ''}")
+        except ErrorEsquema as e:
+            print(f"❌ {texto[:40]!r:45} → {e}")
+
+    analizador = AnalizadorIncremental(str)
+    for fragmento in ['["Lleva ', 'bolsa", "Evita', ' pajitas", "Com', 'pra a granel"]']:
+        print(f"  fragmento {fragmento!r:22} → {analizador.alimentar(fragmento)}")
@@ -0,0 +1,326 @@
+"""
+SERVIDOR DE AGENTES (asyncio, HTTP en localhost)
+
+Acepta muchas tareas de agente a la vez y las ejecuta con un límite de
+concurrencia configurable:
+
+- Cada tarea tiene su propia sesión de chat (BucleAgente.ejecutar crea una).
+- Registro de modelos, limitador de tasa y cachés son los compartidos del
+  proceso: más concurrencia no salta la cuota.
+- Las tareas se pueden cancelar: en cola se cancelan al instante; en
+  ejecución, al terminar el paso en curso.
+
+API (JSON):
+    POST   /tareas            {"tarea": "...", "cliente": "...", "esperar": false}
+    GET    /tareas/<id>       estado y resultado
+    DELETE /tareas/<id>       cancelar
+    GET    /estadisticas
+
+Uso:
+    python servidor_agentes.py --puerto 8080          # backend activo (LLM_BACKEND)
+    python servidor_agentes.py --demo                 # escalado contra el backend simulado
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from bucle_agente import BucleAgente, ResultadoAgente
+from limitador import LIMITADOR
+
+ESTADOS_FINALES = ("completada", "cancelada", "error")
+
+
+@dataclass
+class Tarea:
+    id: str
+    texto: str
+    cliente: str = "anonimo"
+    estado: str = "en_cola"
+    resultado: Optional[ResultadoAgente] = None
+    error: Optional[str] = None
+    creada: float = field(default_factory=time.time)
+    inicio: Optional[float] = None
+    fin: Optional[float] = None
+    cancelado: threading.Event = field(default_factory=threading.Event)
+    futuro: Optional[asyncio.Task] = None
+
+    def a_dict(self) -> dict:
+        datos = {
+            "id": self.id,
+            "cliente": self.cliente,
+            "estado": self.estado,
+            "espera_en_cola": (self.inicio or self.fin or time.time()) - self.creada,
+            "duracion": (self.fin - self.inicio) if self.fin and self.inicio else None,
+            "error": self.error,
+        }
+        if self.resultado is not None:
+            r = self.resultado
+            datos["resultado"] = {
+                "texto": r.texto,
+                "motivo": r.motivo,
+                "pasos": r.pasos,
+                "llamadas": [
+                    {"nombre": ll.nombre, "args": ll.args, "resultado": ll.resultado, "desde_cache": ll.desde_cache}
+                    for ll in r.llamadas
+                ],
+            }
+        return datos
+
+
+class ServidorAgentes:
+    """Cola de tareas de agente con concurrencia acotada"""
+
+    def __init__(self, agente: BucleAgente, max_concurrencia: int = 8, max_tareas_guardadas: int = 10000):
+        self.agente = agente
+        self.max_concurrencia = max_concurrencia
+        self.max_tareas_guardadas = max_tareas_guardadas
+        self._tareas: OrderedDict[str, Tarea] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrencia, thread_name_prefix="agente")
+        self._servidor: Optional[asyncio.base_events.Server] = None
+        self.stats = Counter()
+        self.por_cliente = Counter()
+
+    # --- tareas ---
+
+    def enviar(self, texto: str, cliente: str = "anonimo") -> Tarea:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_concurrencia)
+        tarea = Tarea(f"t{next(self._ids)}", texto, cliente)
+        tarea.futuro = asyncio.get_running_loop().create_task(self._correr(tarea))
+        self._tareas[tarea.id] = tarea
+        self.stats["recibidas"] += 1
+        self.por_cliente[cliente] += 1
+        # Se olvidan las tareas terminadas más antiguas
+        while len(self._tareas) > self.max_tareas_guardadas:
+            id_viejo, vieja = next(iter(self._tareas.items()))
+            if vieja.estado not in ESTADOS_FINALES:
+                break
+            del self._tareas[id_viejo]
+        return tarea
+
+    async def _correr(self, tarea: Tarea) -> None:
+        estado = "error"
+        try:
+            async with self._semaforo:
+                tarea.estado, tarea.inicio = "ejecutando", time.time()
+                loop = asyncio.get_running_loop()
+                tarea.resultado = await loop.run_in_executor(
+                    self._pool, self.agente.ejecutar, tarea.texto, tarea.cancelado
+                )
+                estado = "cancelada" if tarea.resultado.motivo == "cancelado" else "completada"
+        except asyncio.CancelledError:
+            estado = "cancelada"
+        except Exception as e:
+            tarea.error = f"{type(e).__name__}: {e}"
+        finally:
+            self._finalizar(tarea, estado)
+
+    def _finalizar(self, tarea: Tarea, estado: str) -> None:
+        # Una sola vez por tarea: cancelar() puede cerrarla antes de que _correr llegue a empezar
+        if tarea.estado in ESTADOS_FINALES:
+            return
+        tarea.estado, tarea.fin = estado, time.time()
+        self.stats[estado] += 1
+
+    def cancelar(self, id_: str) -> Optional[Tarea]:
+        tarea = self._tareas.get(id_)
+        if tarea is None or tarea.estado in ESTADOS_FINALES:
+            return tarea
+        tarea.cancelado.set()
+        # Una tarea asyncio cancelada antes de arrancar nunca entra en _correr:
+        # se cierra aquí para que no se quede "en_cola" ni bloquee la limpieza
+        if tarea.estado == "en_cola" and tarea.futuro is not None and tarea.futuro.cancel():
+            self._finalizar(tarea, "cancelada")
+        return tarea
+
+    def estadisticas(self) -> dict:
+        en_curso = Counter(t.estado for t in self._tareas.values() if t.estado not in ESTADOS_FINALES)
+        return {
+            **self.stats,
+            "en_cola": en_curso["en_cola"],
+            "ejecutando": en_curso["ejecutando"],
+            "max_concurrencia": self.max_concurrencia,
+            "por_cliente": dict(self.por_cliente),
+            "limitador": LIMITADOR.estadisticas(),
+            "agente": self.agente.estadisticas(),
+        }
+
+    # --- HTTP ---
+
+    async def _atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        try:
+            linea = await lector.readline()
+            metodo, ruta, _ = linea.decode("latin-1").split(" ", 2)
+            cabeceras = {}
+            while (cabecera := await lector.readline()) not in (b"\r\n", b"\n", b""):
+                nombre, _, valor = cabecera.decode("latin-1").partition(":")
+                cabeceras[nombre.strip().lower()] = valor.strip()
+            cuerpo = await lector.readexactly(int(cabeceras.get("content-length", 0)))
+            estado, respuesta = await self._enrutar(metodo, ruta, cuerpo)
+        except (ValueError, json.JSONDecodeError, asyncio.IncompleteReadError) as e:
+            estado, respuesta = 400, {"error": str(e)}
+        except Exception as e:
+            # Cualquier otro fallo también recibe respuesta: el cliente no se queda sin ella
+            estado, respuesta = 500, {"error": f"{type(e).__name__}: {e}"}
+
+        datos = json.dumps(respuesta, ensure_ascii=False, default=str).encode()
+        escritor.write(
+            f"HTTP/1.1 {estado} {'OK' if estado < 400 else 'Error'}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(datos)}\r\nConnection: close\r\n\r\n".encode() + datos
+        )
+        try:
+            await escritor.drain()
+        finally:
+            escritor.close()
+
+    async def _enrutar(self, metodo: str, ruta: str, cuerpo: bytes) -> tuple[int, Any]:
+        partes = ruta.strip("/").split("/")
+        if metodo == "POST" and partes == ["tareas"]:
+            datos = json.loads(cuerpo or b"{}")
+            if not isinstance(datos, dict):
+                return 400, {"error": "El cuerpo debe ser un objeto JSON"}
+            if not datos.get("tarea"):
+                return 400, {"error": "Falta 'tarea'"}
+            if not isinstance(datos["tarea"], str) or not isinstance(datos.get("cliente", ""), str):
+                return 400, {"error": "'tarea' y 'cliente' deben ser texto"}
+            tarea = self.enviar(datos["tarea"], datos.get("cliente", "anonimo"))
+            if datos.get("esperar"):
+                await asyncio.wait([tarea.futuro])
+                return 200, tarea.a_dict()
+            return 202, {"id": tarea.id, "estado": tarea.estado}
+        if len(partes) == 2 and partes[0] == "tareas":
+            tarea = self.cancelar(partes[1]) if metodo == "DELETE" else self._tareas.get(partes[1])
+            if tarea is None:
+                return 404, {"error": "Tarea no encontrada"}
+            return 200, tarea.a_dict()
+        if metodo == "GET" and partes == ["estadisticas"]:
+            return 200, self.estadisticas()
+        return 404, {"error": f"Ruta desconocida: {metodo} {ruta}"}
+
+    async def iniciar(self, host: str = "127.0.0.1", puerto: int = 8080) -> int:
+        self._servidor = await asyncio.start_server(self._atender, host, puerto)
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self) -> None:
+        for tarea in self._tareas.values():
+            self.cancelar(tarea.id)
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================
+# GENERADOR DE CARGA
+# ============================================
+
+
+async def peticion(puerto: int, metodo: str, ruta: str, datos: Optional[dict] = None) -> tuple[int, dict]:
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    cuerpo = json.dumps(datos).encode() if datos is not None else b""
+    escritor.write(
+        f"{metodo} {ruta} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(cuerpo)}\r\n\r\n".encode() + cuerpo
+    )
+    await escritor.drain()
+    respuesta = await lector.read()
+    escritor.close()
+    cabecera, _, contenido = respuesta.partition(b"\r\n\r\n")
+    return int(cabecera.split(b" ", 2)[1]), json.loads(contenido)
+
+
+async def generar_carga(puerto: int, tareas: list[str], clientes: int = 4) -> dict:
+    """Envía las tareas y espera sus resultados; devuelve rendimiento y latencias"""
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(
+        peticion(puerto, "POST", "/tareas", {"tarea": t, "cliente": f"cliente-{i % clientes}", "esperar": True})
+        for i, t in enumerate(tareas)
+    ))
+    total = time.perf_counter() - inicio
+    duraciones = sorted(r["duracion"] or 0.0 for _, r in resultados)
+    return {
+        "tareas": len(tareas),
+        "completadas": sum(r["estado"] == "completada" for _, r in resultados),
+        "tiempo": total,
+        "tareas_por_segundo": len(tareas) / total,
+        "p50": duraciones[len(duraciones) // 2],
+        "p95": duraciones[min(len(duraciones) - 1, int(len(duraciones) * 0.95))],
+    }
+
+
+async def demo(tareas: int, rpm: float, latencia: float) -> None:
+    """Rendimiento según la concurrencia del servidor, con el limitador como techo"""
+    from backends import BackendMock, latencia_constante, usar_backend
+
+    def responder(prompt: str, modelo) -> object:
+        if "function_response:" in prompt:
+            return "La luz recorre unas 186282 millas por segundo."
+        return {"function_call": {"name": "convertir_unidades", "args": {"valor": 299792, "de": "km", "a": "millas"}}}
+
+    def convertir_unidades(valor: float, de: str, a: str) -> dict:
+        return {"resultado": valor * 0.621371, "unidad": a}
+
+    usar_backend(BackendMock(respuestas=responder, latencia=latencia_constante(latencia)))
+    LIMITADOR.configurar(rpm=rpm, tpm=1_000_000_000)
+    techo = rpm / 60 / 2  # dos llamadas al modelo por tarea
+    print(f"{tareas} tareas, {latencia * 1e3:.0f} ms por llamada, limitador a {rpm:.0f} RPM "
+          f"(techo ≈ {techo:.1f} tareas/s)\n")
+
+    for concurrencia in (1, 2, 4, 8, 16, 32):
+        # El cubo RPM empieza lleno; se vacía para medir el régimen estable
+        LIMITADOR.configurar(rpm=rpm)
+        LIMITADOR._solicitudes.disponibles = 0
+        servidor = ServidorAgentes(
+            BucleAgente([convertir_unidades], puras=["convertir_unidades"]), max_concurrencia=concurrencia
+        )
+        puerto = await servidor.iniciar(puerto=0)
+        carga = await generar_carga(puerto, [f"Tarea {i}: ¿millas de la luz?" for i in range(tareas)])
+        await servidor.detener()
+        print(
+            f"concurrencia {concurrencia:>3}: {carga['tareas_por_segundo']:6.1f} tareas/s | "
+            f"p50 {carga['p50']:.2f}s p95 {carga['p95']:.2f}s | {carga['completadas']}/{carga['tareas']} completadas"
+        )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Servidor HTTP local de tareas de agente")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--demo", action="store_true", help="medir el escalado contra el backend simulado")
+    parser.add_argument("--tareas", type=int, default=60)
+    parser.add_argument("--rpm", type=float, default=1200)
+    parser.add_argument("--latencia", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.demo:
+        asyncio.run(demo(args.tareas, args.rpm, args.latencia))
+        return
+
+    async def _servir() -> None:
+        # El agente de los ejemplos: mismas herramientas, memoria e historial
+        from agentes_simples import agente
+
+        servidor = ServidorAgentes(agente, max_concurrencia=args.concurrencia)
+        puerto = await servidor.iniciar(puerto=args.puerto)
+        print(f"🚀 Servidor de agentes en http://127.0.0.1:{puerto} (concurrencia {args.concurrencia})")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(_servir())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Búsquedas en la base de conocimiento: aciertos y consultas que no deben responder nada"""
+
+import pytest
+
+from base_conocimiento import BaseConocimiento
+
+
+@pytest.fixture(scope="module")
+def base():
+    return BaseConocimiento()
+
+
+@pytest.mark.parametrize(
+    "consulta, esperado",
+    [
+        ("velocidad luz", "299,792 km/s en el vacío"),
+        ("Velocidad de la luz", "299,792 km/s en el vacío"),
+        ("temperatura del Sol", "5,500°C en la superficie"),
+        ("distancia entre la tierra y la luna", "384,400 km promedio"),
+        ("velocidd del sonido", "343 m/s en el aire a 20°C"),
+    ],
+)
+def test_encuentra_temas_conocidos(base, consulta, esperado):
+    assert base.consultar(consulta) == esperado
+
+
+@pytest.mark.parametrize(
+    "consulta",
+    [
+        "temperatura de Marte",
+        "gravedad de la luna",
+        "distancia tierra marte",
+        "velocidad del viento",
+        "capital de Francia",
+    ],
+)
+def test_no_responde_con_otro_tema(base, consulta):
+    assert base.consultar(consulta) is None
@@ -0,0 +1,31 @@
+"""Lectura de la respuesta del clasificador por lotes: lo válido se toma, lo demás falta"""
+
+import pytest
+
+from clasificacion_lote import _interpretar
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [
+        ('[{"id": 0, "categoria": "TECNICO"}, {"id": 1, "categoria": "GENERAL"}]', {0: "TECNICO", 1: "GENERAL"}),
+        ('[{"id": "0", "categoria": "tecnico"}, {"id": " 1 ", "categoria": "GENERAL"}]', {0: "TECNICO", 1: "GENERAL"}),
+        ('Aquí va:\n```json\n[{"id": 1, "categoria": "FACTURACION"}]\n```', {1: "FACTURACION"}),
+        ('["TECNICO", "FACTURACION"]', {0: "TECNICO", 1: "FACTURACION"}),
+    ],
+)
+def test_interpreta_respuestas_validas(texto, esperado):
+    assert _interpretar(texto, [0, 1]) == esperado
+
+
+@pytest.mark.parametrize(
+    "texto",
+    [
+        "No sabría clasificarlas",
+        '[{"id": "cero", "categoria": "TECNICO"}, {"id": null, "categoria": "GENERAL"}]',
+        '[{"id": 7, "categoria": "TECNICO"}, {"id": 0, "categoria": "OTRA"}]',
+        '[{"id": 0, "categoria": "TECNICO"',
+    ],
+)
+def test_descarta_lo_que_no_se_entiende(texto):
+    assert _interpretar(texto, [0, 1]) == {}
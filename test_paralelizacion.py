@@ -0,0 +1,44 @@
+"""Fan-out con tiempo límite: ninguna rama espera más de la cuenta, ni siquiera en cola"""
+
+import threading
+import time
+
+from paralelizacion import ejecutar_en_paralelo
+from politica_llamadas import plazo
+
+
+def test_ramas_sin_timeout_conservan_su_resultado():
+    resultados = ejecutar_en_paralelo([(str(i), lambda i=i: i * 2) for i in range(5)], max_concurrencia=2)
+    assert [r.valor for r in resultados] == [0, 2, 4, 6, 8]
+    assert all(r.ok for r in resultados)
+
+
+def test_rama_en_cola_tras_ramas_colgadas_se_agota():
+    liberar = threading.Event()
+    ramas = [
+        ("colgada 1", lambda: liberar.wait(15)),
+        ("colgada 2", lambda: liberar.wait(15)),
+        ("trivial", lambda: "hecho"),
+    ]
+    inicio = time.perf_counter()
+    try:
+        resultados = ejecutar_en_paralelo(ramas, max_concurrencia=2, timeout=0.5)
+    finally:
+        liberar.set()
+    assert time.perf_counter() - inicio < 2
+    assert [r.agotado for r in resultados] == [True, True, True]
+    assert resultados[2].latencia == 0.0
+
+
+def test_plazo_del_flujo_corta_tambien_las_ramas_en_cola():
+    liberar = threading.Event()
+    inicio = time.perf_counter()
+    try:
+        with plazo(0.3):
+            resultados = ejecutar_en_paralelo(
+                [("colgada", lambda: liberar.wait(15)), ("trivial", lambda: "hecho")], max_concurrencia=1
+            )
+    finally:
+        liberar.set()
+    assert time.perf_counter() - inicio < 2
+    assert all(r.agotado for r in resultados)
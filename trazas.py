@@ -0,0 +1,387 @@
+"""
+TRAZAS DE LOS FLUJOS (latencia, tokens y coste por llamada)
+
+Cada paso de un flujo ("Paso 1: Generando contenido", "Paso 2: Traduciendo")
+abre un span; las llamadas al modelo hechas dentro (llamadas.py) cuelgan de
+él como spans hijos con:
+
+- tiempo de pared y tiempo hasta el primer token (streaming)
+- tokens de entrada / salida y coste estimado
+- reintentos por cuota y espera en el limitador
+- llamadas a herramientas
+
+El span actual vive en una contextvar, así que el anidamiento funciona con
+hilos (paralelizacion.py copia el contexto) y con asyncio.
+
+Exportación:
+- LLM_TRAZAS=trazas.jsonl          cada span terminado se añade como una línea
+- LLM_TRAZAS_OTLP=trazas.json      volcar() escribe el formato JSON de OTLP
+  (el que aceptan los colectores de OpenTelemetry en /v1/traces)
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import configuracion  # noqa: F401 (carga .env antes de leer las variables LLM_*)
+
+# Precio por millón de tokens (USD); por defecto, la tarifa de Gemini Flash
+PRECIO_ENTRADA = float(os.getenv("LLM_PRECIO_ENTRADA", "0.30"))
+PRECIO_SALIDA = float(os.getenv("LLM_PRECIO_SALIDA", "2.50"))
+PRECIO_ENTRADA_CACHE = float(os.getenv("LLM_PRECIO_ENTRADA_CACHE", "0.075"))
+
+# Otros modelos (entrada, salida, entrada cacheada); los no listados usan la tarifa de arriba
+PRECIOS_MODELO = {
+    "models/gemini-flash-lite-latest": (0.10, 0.40, 0.025),
+    "models/gemini-pro-latest": (1.25, 10.00, 0.31),
+}
+
+
+def coste_estimado(
+    tokens_entrada: int, tokens_salida: int, tokens_cacheados: int = 0, modelo: Optional[str] = None
+) -> float:
+    """Los tokens de entrada servidos desde la caché de contexto se cobran más baratos"""
+    entrada, salida, cache = PRECIOS_MODELO.get(modelo, (PRECIO_ENTRADA, PRECIO_SALIDA, PRECIO_ENTRADA_CACHE))
+    return (
+        (tokens_entrada - tokens_cacheados) * entrada
+        + tokens_cacheados * cache
+        + tokens_salida * salida
+    ) / 1e6
+
+
+@dataclass
+class Span:
+    nombre: str
+    traza_id: str
+    span_id: str
+    padre_id: Optional[str] = None
+    inicio_ns: int = field(default_factory=time.time_ns)
+    fin_ns: Optional[int] = None
+    atributos: dict = field(default_factory=dict)
+    eventos: list = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def duracion(self) -> float:
+        fin = self.fin_ns if self.fin_ns is not None else time.time_ns()
+        return (fin - self.inicio_ns) / 1e9
+
+    def fijar(self, **atributos) -> None:
+        self.atributos.update({k: v for k, v in atributos.items() if v is not None})
+
+    def sumar(self, clave: str, valor: float) -> None:
+        self.atributos[clave] = self.atributos.get(clave, 0) + valor
+
+    def evento(self, nombre: str, **atributos) -> None:
+        self.eventos.append({"nombre": nombre, "tiempo_ns": time.time_ns(), **atributos})
+
+    def a_dict(self) -> dict:
+        return {
+            "nombre": self.nombre,
+            "traza_id": self.traza_id,
+            "span_id": self.span_id,
+            "padre_id": self.padre_id,
+            "inicio_ns": self.inicio_ns,
+            "fin_ns": self.fin_ns,
+            "duracion": self.duracion,
+            "atributos": self.atributos,
+            "eventos": self.eventos,
+            "error": self.error,
+        }
+
+
+_span_actual: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "span_actual", default=None
+)
+
+
+def span_actual() -> Optional[Span]:
+    return _span_actual.get()
+
+
+def _id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trazador:
+    """Crea spans, guarda los últimos en memoria y los exporta"""
+
+    def __init__(
+        self,
+        ruta_jsonl: Optional[str] = None,
+        ruta_otlp: Optional[str] = None,
+        max_spans: int = 10000,
+        servicio: str = "agentes-simples",
+    ):
+        self.ruta_jsonl = ruta_jsonl
+        self.ruta_otlp = ruta_otlp
+        self.servicio = servicio
+        self._terminados: deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls) -> "Trazador":
+        return cls(
+            ruta_jsonl=os.getenv("LLM_TRAZAS") or None,
+            ruta_otlp=os.getenv("LLM_TRAZAS_OTLP") or None,
+        )
+
+    # --- creación de spans ---
+
+    def iniciar(self, nombre: str, **atributos) -> Span:
+        """Crea un span hijo del actual sin convertirlo en el actual (ver activar)"""
+        padre = _span_actual.get()
+        span = Span(
+            nombre,
+            traza_id=padre.traza_id if padre else _id(128),
+            span_id=_id(64),
+            padre_id=padre.span_id if padre else None,
+        )
+        span.fijar(**atributos)
+        return span
+
+    def terminar(self, span: Span, error: Optional[BaseException] = None) -> None:
+        if span.fin_ns is not None:
+            return
+        span.fin_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        with self._lock:
+            self._terminados.append(span)
+            if self.ruta_jsonl:
+                with open(self.ruta_jsonl, "a", encoding="utf-8") as archivo:
+                    archivo.write(json.dumps(span.a_dict(), ensure_ascii=False, default=str) + "\n")
+
+    @contextlib.contextmanager
+    def activar(self, span: Span) -> Iterator[Span]:
+        """Hace de `span` el actual dentro del bloque (no lo termina)"""
+        token = _span_actual.set(span)
+        try:
+            yield span
+        finally:
+            _span_actual.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, nombre: str, **atributos) -> Iterator[Span]:
+        """Abre un span, lo hace actual y lo termina al salir (también sirve como decorador)"""
+        span = self.iniciar(nombre, **atributos)
+        token = _span_actual.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.terminar(span, e)
+            raise
+        finally:
+            _span_actual.reset(token)
+            self.terminar(span)
+
+    # --- consulta ---
+
+    def spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._terminados)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._terminados.clear()
+
+    def resumen(self) -> dict[str, dict]:
+        """
+        Por nombre de span: veces, tiempo total y medio, tokens y coste.
+        Los tokens y el coste de las llamadas se suman también a sus pasos padre.
+        """
+        spans = self.spans()
+        por_id = {s.span_id: s for s in spans}
+        acumulado: dict[str, list] = defaultdict(lambda: [0, 0.0])
+        for span in spans:
+            tokens = span.atributos.get("tokens_total", 0)
+            coste = span.atributos.get("coste_usd", 0.0)
+            actual: Optional[Span] = span
+            while actual is not None and (tokens or coste):
+                acumulado[actual.span_id][0] += tokens
+                acumulado[actual.span_id][1] += coste
+                actual = por_id.get(actual.padre_id)
+
+        grupos: dict[str, dict] = defaultdict(
+            lambda: {"veces": 0, "tiempo": 0.0, "tokens": 0, "coste": 0.0}
+        )
+        for span in spans:
+            g = grupos[span.nombre]
+            g["veces"] += 1
+            g["tiempo"] += span.duracion
+            g["tokens"] += acumulado[span.span_id][0]
+            g["coste"] += acumulado[span.span_id][1]
+        for g in grupos.values():
+            g["media"] = g["tiempo"] / g["veces"]
+        return dict(sorted(grupos.items(), key=lambda kv: -kv[1]["tiempo"]))
+
+    def arbol(self, traza_id: Optional[str] = None) -> str:
+        """Representación indentada de una traza (por defecto, la última)"""
+        spans = self.spans()
+        if not spans:
+            return ""
+        traza_id = traza_id or spans[-1].traza_id
+        spans = sorted((s for s in spans if s.traza_id == traza_id), key=lambda s: s.inicio_ns)
+        hijos = defaultdict(list)
+        for s in spans:
+            hijos[s.padre_id].append(s)
+        ids = {s.span_id for s in spans}
+
+        lineas = []
+
+        def _pintar(span: Span, nivel: int) -> None:
+            extra = ", ".join(
+                f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}"
+                for k, v in span.atributos.items()
+            )
+            lineas.append(f"{'  ' * nivel}{span.nombre} {span.duracion * 1e3:.1f} ms  {extra}".rstrip())
+            for hijo in hijos[span.span_id]:
+                _pintar(hijo, nivel + 1)
+
+        for raiz in (s for s in spans if s.padre_id not in ids):
+            _pintar(raiz, 0)
+        return "\n".join(lineas)
+
+    # --- exportación ---
+
+    def exportar_jsonl(self, ruta: str) -> int:
+        spans = self.spans()
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            for span in spans:
+                archivo.write(json.dumps(span.a_dict(), ensure_ascii=False, default=str) + "\n")
+        return len(spans)
+
+    def a_otlp(self) -> dict:
+        """Los spans en el formato JSON de OTLP (ExportTraceServiceRequest)"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _atributos_otlp({"service.name": self.servicio})},
+                "scopeSpans": [{
+                    "scope": {"name": "trazas"},
+                    "spans": [_span_otlp(s) for s in self.spans()],
+                }],
+            }]
+        }
+
+    def exportar_otlp(self, ruta: str) -> int:
+        datos = self.a_otlp()
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo, ensure_ascii=False)
+        return len(datos["resourceSpans"][0]["scopeSpans"][0]["spans"])
+
+    def volcar(self) -> None:
+        """Escribe el archivo OTLP si LLM_TRAZAS_OTLP está configurado"""
+        if self.ruta_otlp:
+            self.exportar_otlp(self.ruta_otlp)
+
+
+def _valor_otlp(valor: Any) -> dict:
+    if isinstance(valor, bool):
+        return {"boolValue": valor}
+    if isinstance(valor, int):
+        return {"intValue": str(valor)}
+    if isinstance(valor, float):
+        return {"doubleValue": valor}
+    if isinstance(valor, (list, tuple)):
+        return {"arrayValue": {"values": [_valor_otlp(v) for v in valor]}}
+    return {"stringValue": str(valor)}
+
+
+def _atributos_otlp(atributos: dict) -> list[dict]:
+    return [{"key": k, "value": _valor_otlp(v)} for k, v in atributos.items()]
+
+
+def _span_otlp(span: Span) -> dict:
+    datos = {
+        "traceId": span.traza_id,
+        "spanId": span.span_id,
+        "name": span.nombre,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.inicio_ns),
+        "endTimeUnixNano": str(span.fin_ns or span.inicio_ns),
+        "attributes": _atributos_otlp(span.atributos),
+        "events": [
+            {
+                "timeUnixNano": str(e["tiempo_ns"]),
+                "name": e["nombre"],
+                "attributes": _atributos_otlp(
+                    {k: v for k, v in e.items() if k not in ("nombre", "tiempo_ns")}
+                ),
+            }
+            for e in span.eventos
+        ],
+        # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.padre_id:
+        datos["parentSpanId"] = span.padre_id
+    return datos
+
+
+# Trazador compartido por ambos scripts
+TRAZADOR = Trazador.desde_entorno()
+
+
+def traza(nombre: str, **atributos):
+    """Atajo: `with traza("Paso 1: Generando contenido"):` o `@traza("flujo")`"""
+    return TRAZADOR.span(nombre, **atributos)
+
+
+def evento(nombre: str, **atributos) -> None:
+    """Añade un evento al span actual, si lo hay"""
+    span = _span_actual.get()
+    if span is not None:
+        span.evento(nombre, **atributos)
+
+
+def sumar(clave: str, valor: float) -> None:
+    """Acumula un contador en el span actual, si lo hay"""
+    span = _span_actual.get()
+    if span is not None:
+        span.sumar(clave, valor)
+
+
+def imprimir_resumen(limite: int = 8) -> None:
+    """Los pasos que más tiempo se llevaron en esta ejecución"""
+    resumen = TRAZADOR.resumen()
+    if not resumen:
+        return
+    print("🧭 Trazas (pasos por tiempo total):")
+    for nombre, g in list(resumen.items())[:limite]:
+        print(
+            f"  {nombre:<40} {g['veces']:>3}× {g['tiempo']:6.2f}s "
+            f"(media {g['media']:.2f}s) {g['tokens']:>6} tokens ${g['coste']:.5f}"
+        )
+    print()
+
+
+if __name__ == "__main__":
+    # Una cadena de dos pasos contra el backend simulado: ¿qué paso domina?
+    from backends import BackendMock, latencia_lognormal, usar_backend
+    from llamadas import generar, generar_stream
+    from limitador import LIMITADOR
+    from registro_modelos import obtener_modelo
+    # llamadas.py usa el módulo importado, no este __main__
+    from trazas import TRAZADOR, imprimir_resumen, traza  # noqa: F811
+
+    usar_backend(BackendMock(latencia=latencia_lognormal(0.2, 0.4)))
+    LIMITADOR.configurar(rpm=100000)
+    modelo = obtener_modelo()
+
+    with traza("Flujo de ejemplo"):
+        with traza("Paso 1: Generando contenido"):
+            flujo = generar_stream(modelo, "Escribe un párrafo sobre reciclaje", usar_cache=False)
+            texto = "".join(flujo)
+        with traza("Paso 2: Traduciendo"):
+            generar(modelo, f"Traduce al inglés: {texto}", usar_cache=False)
+            generar(modelo, f"Revisa la traducción: {texto}", usar_cache=False)
+
+    print(TRAZADOR.arbol(), "\n")
+    imprimir_resumen()